@@ -0,0 +1,230 @@
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+from subprocess import CompletedProcess, PIPE
+
+# Verifies states and transitions by running spin, gcc and pan as asyncio subprocesses, without a shell.
+# The number of processes running at once is bounded by a semaphore, and more jobs than that are kept in flight
+# so that the stages of different jobs overlap: one job's model is compiled while another's is searched.
+class AsyncVerifier:
+
+    def __init__(self, controller, concurrency=None, workspace_root=None):
+        self.controller = controller
+        self.concurrency = concurrency or os.cpu_count()
+        self.workspace_root = workspace_root or os.path.join(controller.workspace_root, "async")
+
+        # Directory of the run under way, holding its jobs' workspaces and, when the controller runs precompiled,
+        # the pan binaries shared by every job. Removed when the run ends.
+        self.run_workspace = None
+        self.precompiled_workspace = None
+
+    # Runs one stage of a job once a process slot is free, timing it as the stage and as time the slot was busy ("job").
+    # Returns: the completed process, with its output decoded.
+    async def run_stage(self, stage, program, args, cwd, env=None):
+
+        async with self.process_slots:
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(program, *args, cwd=cwd, env=env, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = await process.communicate()
+            seconds = time.perf_counter() - start
+
+        self.controller.record_timing(stage, seconds)
+        self.controller.record_timing("job", seconds)
+
+        return CompletedProcess([program, *args], process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+    # Generates, compiles and searches a model in a job's workspace, escalating through the controller's profiles like SpinController.run_spin.
+    # Returns: True if pan found the counterexample, False if not, None if a stage failed.
+    async def run_spin(self, model_file, job_workspace, check=None):
+
+        controller = self.controller
+        profiles = controller.profiles_for(controller.check_template_path(check[0]))
+
+        try:
+            # Generate PAN verifier from promela specification
+            pan_gen = await self.run_stage("spin", "spin", ["-a", model_file], job_workspace)
+            if pan_gen.returncode != 0:
+                print(f"Error running SPIN: {pan_gen.stderr}")
+                return
+
+            for position, profile in enumerate(profiles):
+                # Compile PAN verifier
+                gcc_arguments = profile.gcc_arguments()
+                pan_comp = await self.run_stage("gcc", gcc_arguments[0], gcc_arguments[1:], job_workspace)
+                if pan_comp.returncode != 0:
+                    print(f"Error compiling PAN: {pan_comp.stderr}")
+                    return
+
+                # Run PAN verifier with the same search options as SpinController.run_spin
+                pan_search = await self.run_stage("pan", os.path.abspath(os.path.join(job_workspace, "pan")), profile.pan_arguments(), job_workspace)
+                verdict = controller.interpret_pan_output(pan_search, check, profile)
+
+                if not controller.escalates(profiles, position, verdict, pan_search, check):
+                    return verdict
+
+        except OSError as e:
+            print(f"An error occurred while running SPIN: {e}")
+
+    # Runs the precompiled verifiers of a model with the given valuation, escalating through the controller's profiles.
+    # Returns: True if pan found the counterexample, False if not, None if pan failed.
+    async def run_precompiled_pan(self, model_name, valuation, job_workspace, check=None):
+
+        controller = self.controller
+        profiles = controller.profiles_for(controller.check_template_path(check[0]))
+
+        env = dict(os.environ)
+        env[controller.valuation_variable] = valuation
+
+        try:
+            for position, profile in enumerate(profiles):
+                verifier = os.path.abspath(os.path.join(self.precompiled_workspace, f"{model_name}_{profile.name}"))
+                pan_search = await self.run_stage("pan", verifier, profile.pan_arguments(), job_workspace, env)
+                verdict = controller.interpret_pan_output(pan_search, check, profile)
+
+                if not controller.escalates(profiles, position, verdict, pan_search, check):
+                    return verdict
+
+        except OSError as e:
+            print(f"An error occurred while running PAN: {e}")
+
+    # Checks one task, ("state", state) or ("transition", previous_state, next_state), in its own workspace
+    # Returns: the verdict, stored in the controller's tables and cache like any other SPIN check.
+    async def verify(self, task):
+
+        controller = self.controller
+        job_workspace = tempfile.mkdtemp(prefix=f"{task[0]}_", dir=self.run_workspace)
+
+        try:
+            if task[0] == "state":
+                state = controller.get_state_from_index(int(task[1]))
+
+                if self.state_template is None:
+                    self.state_template = controller.compiled_template(controller.state_template_path, ["REACHABLE"])
+
+                with controller.timed("render"), open(os.path.join(job_workspace, "hydro_state.pml"), 'w') as output:
+                    output.write(self.state_template.render(int(task[1])))
+
+                if controller.uses_precompiled("pan_state"):
+                    state_reachable = await self.run_precompiled_pan("pan_state", controller.state_valuation(state), job_workspace, task)
+                else:
+                    state_reachable = await self.run_spin("hydro_state.pml", job_workspace, task)
+
+                with controller.timed("memo"):
+                    return controller.store_state_verdict(state, state_reachable, job_workspace)
+
+            elif task[0] == "transition":
+                prev_state = controller.get_state_from_index(int(task[1]))
+                next_state = controller.get_state_from_index(int(task[2]))
+
+                with controller.timed("render"), open(os.path.join(job_workspace, "hydro_transition.pml"), 'w') as output:
+                    output.write(self.transition_template.render(int(task[1]), int(task[2])))
+
+                if controller.uses_precompiled("pan_transition"):
+                    valid_transition = await self.run_precompiled_pan("pan_transition", controller.transition_valuation(prev_state, next_state), job_workspace, task)
+                else:
+                    valid_transition = await self.run_spin("hydro_transition.pml", job_workspace, task)
+
+                with controller.timed("memo"):
+                    return controller.store_transition_verdict(prev_state, next_state, valid_transition, job_workspace)
+
+            else:
+                print(f"Unrecognised task: {task[0]}")
+
+        finally:
+            shutil.rmtree(job_workspace, ignore_errors=True)
+
+    # Verifies every task, answering those already known to the controller without running SPIN.
+    # Tasks are taken from the iterable as job runners free up, so a stream of tasks is only read as fast as it is checked.
+    # Each verdict is stored in the controller's tables and passed to on_verdict(task, verdict) as it completes,
+    # only the tasks in flight are held here.
+    # Returns: the number of tasks verified.
+    async def verify_many(self, tasks, on_verdict=None):
+
+        self.process_slots = asyncio.Semaphore(self.concurrency)
+
+        os.makedirs(self.workspace_root, exist_ok=True)
+        self.run_workspace = tempfile.mkdtemp(prefix="run_", dir=self.workspace_root)
+        self.precompiled_workspace = os.path.join(self.run_workspace, "precompiled")
+
+        try:
+            # Parse the templates before any job starts, so a bad placeholder stops the run rather than every job.
+            # The state template is parsed by the first state job, as not every run has one.
+            self.state_template = None
+            self.transition_template = self.controller.compiled_template(self.controller.transition_template_path, ["START", "END"])
+
+            # Build the verifiers once before taking any work
+            if self.controller.precompiled:
+                os.makedirs(self.precompiled_workspace, exist_ok=True)
+                if not self.controller.prepare_precompiled_workspace(self.precompiled_workspace):
+                    print(f"Error: Precompiled verifiers unavailable in '{self.precompiled_workspace}', falling back to compiling each check.")
+                    self.controller.precompiled = False
+
+            remaining = iter(tasks)
+            # Verifications of canonical tasks that are running, shared by the equivalent tasks that wait for them
+            running = {}
+            in_flight = 0
+            verified = 0
+
+            # Each job runner takes the next task once its previous one finishes. Twice as many runners as process
+            # slots keeps a job ready for every slot that frees up, so the stages of different jobs overlap.
+            async def run_jobs():
+                nonlocal in_flight, verified
+                for task in remaining:
+                    # A task answered by an equivalent canonical task is verified as that task, unless its own verdict is already known
+                    canonical = self.controller.canonical_task(task)
+                    verdict = self.controller.check_known_task(task) if canonical != task else None
+
+                    if verdict is None:
+                        in_flight += 1
+                        if self.controller.metrics is not None:
+                            self.controller.metrics.set_queue(in_flight, self.concurrency)
+
+                        verdict = await self.verify_canonical(canonical, running)
+
+                        in_flight -= 1
+                        if self.controller.metrics is not None:
+                            self.controller.metrics.set_queue(in_flight, self.concurrency)
+
+                        if canonical != task:
+                            self.controller.record_equivalent(task, canonical, verdict)
+
+                    verified += 1
+                    if on_verdict is not None:
+                        on_verdict(task, verdict)
+
+            await asyncio.gather(*(run_jobs() for _ in range(2 * self.concurrency)))
+
+            return verified
+
+        finally:
+            # Nothing of a run is kept, and on tmpfs its verifiers would hold memory until reboot
+            shutil.rmtree(self.run_workspace, ignore_errors=True)
+            try:
+                os.rmdir(self.workspace_root)
+            except OSError:
+                pass
+
+    # Verifies a canonical task once, a task already being verified waits for that verification's verdict.
+    # A task verified earlier is answered from the controller's tables.
+    # Returns: the verdict.
+    async def verify_canonical(self, task, running):
+
+        if task in running:
+            return await asyncio.shield(running[task])
+
+        verdict = self.controller.check_known_task(task)
+        if verdict is None:
+            running[task] = asyncio.ensure_future(self.verify(task))
+            try:
+                verdict = await running[task]
+            finally:
+                del running[task]
+
+        return verdict
+
+    # Runs verify_many from synchronous code
+    # Returns: the number of tasks verified.
+    def verify_all(self, tasks, on_verdict=None):
+        return asyncio.run(self.verify_many(tasks, on_verdict))
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+# Rows read from a dataset at a time
+CHUNK_SIZE = 10000
+
+# Some datasets name the end state of a transition new_state
+NEXT_STATE_COLUMNS = ["next_state", "new_state"]
+
+
+# Reads the state ids of a dataset of states a chunk at a time, so a file of any size is read in constant memory.
+# Returns: generator of int64 arrays of state ids.
+def read_state_chunks(path, chunk_size=CHUNK_SIZE):
+
+    for chunk in pd.read_csv(path, usecols=["state"], dtype={"state": np.int64}, chunksize=chunk_size):
+        yield chunk["state"].values
+
+
+# Reads the transitions of a dataset a chunk at a time, so a file of any size is read in constant memory.
+# Returns: generator of (previous_states, next_states) int64 arrays.
+def read_transition_chunks(path, chunk_size=CHUNK_SIZE):
+
+    columns = pd.read_csv(path, nrows=0).columns
+    next_column = next((column for column in NEXT_STATE_COLUMNS if column in columns), None)
+    if "previous_state" not in columns or next_column is None:
+        raise ValueError(f"'{path}' has no previous_state and next_state columns.")
+
+    for chunk in pd.read_csv(path, usecols=["previous_state", next_column], dtype=np.int64, chunksize=chunk_size):
+        yield chunk["previous_state"].values, chunk[next_column].values
+
@@ -0,0 +1,63 @@
+import sys
+import glob
+import argparse
+import pandas as pd
+from hydro_engine import HydroBranchEngine, TEMPLATE_SHA256
+
+# Transition verdicts recorded by SPIN evaluations of the branch template, <dataset>_transitions.csv files written by spin_controller
+RECORDED_VERDICTS = "evaluation_files/results/*_transitions.csv"
+
+
+# Compares the native engine's verdicts with the SPIN verdicts recorded in the given files.
+# Transitions SPIN could not check (no verdict) and the -1 previous state of a recording's first row are left out.
+# Returns: number of transitions compared, and DataFrame of the transitions where the engine and SPIN disagree.
+def compare_with_recorded(engine, property_mask, paths):
+
+    compared = 0
+    mismatches = []
+
+    for path in paths:
+        recorded = pd.read_csv(path)
+        recorded = recorded[recorded["valid"].notna() & (recorded["previous_state"] >= 0)]
+
+        spin_verdicts = recorded["valid"].map(lambda valid: str(valid).strip().lower() in ("true", "1")).values
+        engine_verdicts = engine.is_transition(recorded["previous_state"].values, recorded["next_state"].values, property_mask)
+
+        disagree = engine_verdicts != spin_verdicts
+        compared += len(recorded)
+        if disagree.any():
+            mismatch = recorded[disagree][["previous_state", "next_state"]].copy()
+            mismatch["spin"] = spin_verdicts[disagree]
+            mismatch["engine"] = engine_verdicts[disagree]
+            mismatch["file"] = path
+            mismatches.append(mismatch)
+
+    return compared, pd.concat(mismatches, ignore_index=True) if mismatches else pd.DataFrame(columns=["previous_state", "next_state", "spin", "engine", "file"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Checks the native engine against the transition verdicts recorded by SPIN.")
+    parser.add_argument("--results", dest="results", nargs="+", default=None, help=f"Recorded transition verdicts to compare with, {RECORDED_VERDICTS} by default.")
+    parser.add_argument("--template", dest="template", type=str, default="spin_models/templates/branch_template.pml", help="Transition template whose ltl property gives the variables compared.")
+    args = parser.parse_args()
+
+    from spin_controller import SpinController
+    from verdict_cache import template_hash
+
+    paths = args.results or sorted(glob.glob(RECORDED_VERDICTS))
+    if not paths:
+        print(f"Error: No recorded verdicts found at '{RECORDED_VERDICTS}'.")
+        sys.exit(2)
+
+    if template_hash(args.template) != TEMPLATE_SHA256:
+        print(f"Warning: '{args.template}' is not the version of the branch template the engine implements, verdicts recorded from it may differ.")
+
+    controller = SpinController()
+    controller.transition_template_path = args.template
+
+    compared, mismatches = compare_with_recorded(HydroBranchEngine(), controller.transition_property_mask(), paths)
+
+    print(f"Conformance: {compared - len(mismatches)}/{compared} recorded transitions agree between SPIN and the native engine, from {len(paths)} files.")
+    if len(mismatches):
+        print(mismatches.to_string(index=False))
+        sys.exit(1)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Types of transition by which of its states are baseline states, in the order of the Transition_Type column:
+#   0 - false_positive, neither state is a baseline state
+#   1 - base_fab, from a baseline state to a fabricated one
+#   2 - fab_base, from a fabricated state to a baseline state
+#   3 - baseline, both states are baseline states
+TRANSITION_TYPES = ["false_positive", "base_fab", "fab_base", "baseline"]
+
+# Verdict categories of a transition, and the flips of a variable between its two states, indexed by 2 * start value + end value
+CATEGORIES = ["valid", "error"]
+FLIPS = ["0_to_0", "0_to_1", "1_to_0", "1_to_1"]
+
+
+# Returns: (states, variables) array of the value of each variable in each state id, variables in state_columns order
+def decode_bits(state_ids, num_bits):
+
+    shifts = np.arange(num_bits - 1, -1, -1, dtype=np.int64)
+    return (np.asarray(state_ids, dtype=np.int64)[:, None] >> shifts) & 1
+
+
+# Returns: the type of each transition (see TRANSITION_TYPES), from whether its states are baseline states
+def transition_types(previous_states, next_states, baseline_states):
+
+    baseline_states = np.asarray(list(baseline_states) if isinstance(baseline_states, (set, frozenset)) else baseline_states, dtype=np.int64)
+    start_in_baseline = np.isin(previous_states, baseline_states)
+    end_in_baseline = np.isin(next_states, baseline_states)
+
+    return np.where(start_in_baseline, np.where(end_in_baseline, 3, 1), np.where(end_in_baseline, 2, 0))
+
+
+# Counts how often each variable flips 0->0, 0->1, 1->0 and 1->1 in the transitions of each type and verdict category,
+# the values being read from the bits of the state ids.
+# Returns: (transition types, variables, categories, flips) array of counts.
+def flip_counts(previous_states, next_states, valid, types, num_bits):
+
+    flips = 2 * decode_bits(previous_states, num_bits) + decode_bits(next_states, num_bits)
+    categories = np.where(valid, 0, 1)
+
+    # One bin per (type, category, variable, flip)
+    groups = (types * len(CATEGORIES) + categories)[:, None] * num_bits + np.arange(num_bits)
+    counts = np.bincount((groups * len(FLIPS) + flips).ravel(), minlength=len(TRANSITION_TYPES) * len(CATEGORIES) * num_bits * len(FLIPS))
+
+    return counts.reshape(len(TRANSITION_TYPES), len(CATEGORIES), num_bits, len(FLIPS)).transpose(0, 2, 1, 3)
+
+
+# Returns: DataFrame of flip counts with one row per transition type and variable, and a valid_ and error_ column per flip
+def flip_frame(counts, state_columns):
+
+    num_types, num_variables = counts.shape[:2]
+    frame = pd.DataFrame(counts.reshape(num_types * num_variables, -1), columns=[f"{category}_{flip}" for category in CATEGORIES for flip in FLIPS])
+    frame.insert(0, "Variable", np.tile(state_columns, num_types))
+    frame.insert(0, "Transition_Type", np.repeat(np.arange(num_types), num_variables))
+
+    return frame
+
+
+# Analyses the variable flips of checked transitions against the baseline states.
+# valid holds each transition's verdict, transitions where SPIN failed (None or NaN) are left out.
+# Returns: DataFrame of flip counts (see flip_frame()), and dictionary of false_positive, base_fab and fab_base -> DataFrame
+# of the (previous_state, new_state) transitions of that type.
+def analyse_transitions(previous_states, next_states, valid, baseline_states, state_columns):
+
+    checked = pd.notna(np.asarray(valid, dtype=object))
+    previous_states = np.asarray(previous_states, dtype=np.int64)[checked]
+    next_states = np.asarray(next_states, dtype=np.int64)[checked]
+    valid = np.asarray(valid, dtype=object)[checked].astype(bool)
+
+    types = transition_types(previous_states, next_states, baseline_states)
+    counts = flip_counts(previous_states, next_states, valid, types, len(state_columns))
+
+    transitions_by_type = {
+        name: pd.DataFrame({"previous_state": previous_states[types == index], "new_state": next_states[types == index]})
+        for index, name in enumerate(TRANSITION_TYPES[:3])
+    }
+
+    return flip_frame(counts, state_columns), transitions_by_type
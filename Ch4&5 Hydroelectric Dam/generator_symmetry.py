@@ -0,0 +1,105 @@
+import numpy as np
+
+
+# Swap of the two generators: every Gen_A_ variable exchanges its value with the Gen_B_ variable of the same name.
+# A state and its swap are checked as one when the swap is proven to preserve the verdicts of a template,
+# the canonical state of the pair (the smaller id) is verified and its verdict is used for both.
+class GeneratorSymmetry:
+
+    def __init__(self, state_columns):
+        num_bits = len(state_columns)
+        bits = {column: 1 << (num_bits - 1 - i) for i, column in enumerate(state_columns)}
+
+        # (Gen_A bit, Gen_B bit) of each pair of generator variables
+        self.pairs = [(bits[column], bits["Gen_B_" + column[len("Gen_A_"):]]) for column in state_columns if column.startswith("Gen_A_")]
+        self.swapped_bits = sum(bit_a | bit_b for bit_a, bit_b in self.pairs)
+
+        # SHA-256 of the templates whose verdicts the swap is proven to preserve, set by the prove_ methods
+        self.transitions_proven = None
+        self.states_proven = None
+
+    # Returns: the state id, or array of state ids, with the two generators exchanged
+    def swap(self, state_ids):
+
+        if isinstance(state_ids, np.ndarray):
+            state_ids = state_ids.astype(np.uint32)
+            swapped = state_ids & np.uint32(~self.swapped_bits & 0xFFFFFFFF)
+            for bit_a, bit_b in self.pairs:
+                swapped |= np.where(state_ids & np.uint32(bit_a), np.uint32(bit_b), np.uint32(0))
+                swapped |= np.where(state_ids & np.uint32(bit_b), np.uint32(bit_a), np.uint32(0))
+            return swapped
+
+        state_id = int(state_ids)
+        swapped = state_id & ~self.swapped_bits
+        for bit_a, bit_b in self.pairs:
+            if state_id & bit_a:
+                swapped |= bit_b
+            if state_id & bit_b:
+                swapped |= bit_a
+        return swapped
+
+    # Returns: True if a property mask constrains both generators alike
+    def preserves_mask(self, property_mask):
+        return self.swap(int(property_mask)) == int(property_mask)
+
+    # Returns: the id checked in place of a state
+    def canonical_state(self, state_id):
+        return min(int(state_id), self.swap(state_id))
+
+    # Returns: the (previous_state, next_state) pair checked in place of a transition
+    def canonical_transition(self, previous_state, next_state):
+        return min((int(previous_state), int(next_state)), (self.swap(previous_state), self.swap(next_state)))
+
+    # Proves the swap preserves the verdict of every transition check, from the native engine's model of the transition template.
+    # The engine represents the successors of a start state as overlays that only depend on the start's READ_COLUMNS, so the
+    # swap preserves every verdict exactly when it maps each class's overlays onto those of the swapped class, and the
+    # template's ltl property compares both generators alike. The engine's agreement with the template is checked by --conformance,
+    # so the proof only holds for the template the engine was written from: template_hash is the SHA-256 of the template checked.
+    # Returns: True if the proof holds.
+    def prove_transitions(self, engine, property_mask, template_hash):
+
+        if template_hash != engine.template_hash:
+            print("Symmetry: the transition template differs from the one the native engine implements, the proof does not apply to it.")
+            return False
+
+        if not self.preserves_mask(property_mask):
+            print("Symmetry: the transition property does not treat both generators alike.")
+            return False
+
+        for class_index in range(len(engine.overlay_masks)):
+            representative = 0
+            for position, bit in enumerate(engine.read_bits):
+                if class_index >> position & 1:
+                    representative |= bit
+
+            swapped_class = int(engine.class_of([self.swap(representative)])[0])
+            overlays = {(self.swap(mask), self.swap(value)) for mask, value in zip(engine.overlay_masks[class_index], engine.overlay_values[class_index])}
+            swapped_overlays = {(int(mask), int(value)) for mask, value in zip(engine.overlay_masks[swapped_class], engine.overlay_values[swapped_class])}
+
+            if overlays != swapped_overlays:
+                print(f"Symmetry: transitions from class {class_index} of the transition template change when the generators are swapped.")
+                return False
+
+        self.transitions_proven = template_hash
+        return True
+
+    # Proves the swap preserves the verdict of every state check, from the reachable set of the state template whose SHA-256 is template_hash.
+    # The bitmap must have been built from that template (see ReachabilityBitmap.template_hash).
+    # Returns: True if the reachable set is closed under the swap and the template's ltl property compares both generators alike.
+    def prove_states(self, reachability, property_mask, template_hash):
+
+        if reachability.template_hash != template_hash:
+            print("Symmetry: the reachability bitmap was not built from the state template checked, the proof does not apply to it.")
+            return False
+
+        if not self.preserves_mask(property_mask):
+            print("Symmetry: the state property does not treat both generators alike.")
+            return False
+
+        reachable = reachability.state_ids()
+        if not np.array_equal(np.sort(self.swap(reachable)), np.sort(reachable)):
+            print("Symmetry: the reachable set of the state template is not closed under swapping the generators.")
+            return False
+
+        self.states_proven = template_hash
+        return True
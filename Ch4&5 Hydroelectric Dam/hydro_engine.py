@@ -0,0 +1,388 @@
+import numpy as np
+from collections import namedtuple
+
+# Order of the state variables within a 23-bit state id, most significant bit first (as in SpinController.state_columns)
+state_columns = [
+    'Flood_Gate_Valve',
+    'Flood_Pump',
+    'Sump_Valve',
+    'Sump_Pump_1',
+    'Sump_Pump_2',
+    'Activated_Flood_Control',
+    'Return_Water_Supply_Control',
+    'Gen_A_Status',
+    'Gen_B_Status',
+    'Gen_A_Active',
+    'Gen_A_Fan',
+    'Gen_A_Pump',
+    'Gen_A_Valve',
+    'Gen_A_RedLED',
+    'Gen_A_GreenLED',
+    'Gen_B_Active',
+    'Gen_B_Fan',
+    'Gen_B_Pump',
+    'Gen_B_Valve',
+    'Gen_B_RedLED',
+    'Gen_B_GreenLED',
+    'Tag_2',
+    'HMI_Return_Feed'
+]
+
+NUM_BITS = len(state_columns)
+ALL_BITS = (1 << NUM_BITS) - 1
+BIT = {column: 1 << (NUM_BITS - 1 - i) for i, column in enumerate(state_columns)}
+
+# The only state variables whose values steer the branch model: every other variable is only ever overwritten with constants.
+# Two start states that agree on these variables therefore take exactly the same paths through the model.
+READ_COLUMNS = ['Gen_A_Active', 'Gen_B_Active', 'HMI_Return_Feed', 'Tag_2']
+
+# States whose successors are computed at once by HydroBranchEngine.successors(), bounding its working memory to a few hundred MB
+SUCCESSOR_CHUNK_SIZE = 1 << 16
+
+# One configuration of the branch model: the state variables, which of them have been written since the start,
+# the PLC modes and OperatorAction flag, and the position of init and the three proctypes (None until run).
+Configuration = namedtuple("Configuration", ["values", "written", "generator_mode", "control_mode", "operator_action", "init", "hmi", "generator", "control"])
+
+# Values written by the d_step of each generator outcome in hydro_generator, followed by the statuses assigned after it
+def generator_outputs(a_on, a_red, b_on, b_red):
+    outputs = {}
+    for prefix, on, red in (("Gen_A", a_on, a_red), ("Gen_B", b_on, b_red)):
+        for suffix in ("Active", "Valve", "Pump", "GreenLED", "Fan"):
+            outputs[f"{prefix}_{suffix}"] = on
+        outputs[f"{prefix}_RedLED"] = red
+    return outputs
+
+GENERATOR_STOP = generator_outputs(False, False, False, False)
+
+# (Gen_A_Active, Gen_B_Active) when the outcome is chosen -> (d_step values, (Gen_A_Status, Gen_B_Status))
+GENERATOR_OUTCOMES = {
+    (True, False): (generator_outputs(True, False, False, True), (True, False)),
+    (False, True): (generator_outputs(False, True, True, False), (False, True)),
+    (True, True): (generator_outputs(True, False, True, False), (True, True)),
+    (False, False): (generator_outputs(False, True, False, True), (False, False)),
+}
+
+CONTROL_STOP = {column: False for column in ['Sump_Valve', 'Sump_Pump_1', 'Sump_Pump_2', 'Return_Water_Supply_Control', 'HMI_Return_Feed',
+                                               'Gen_A_Status', 'Gen_B_Status', 'Flood_Gate_Valve', 'Flood_Pump', 'Activated_Flood_Control', 'Tag_2']}
+SUMP_OFF = {'Sump_Valve': False, 'Sump_Pump_1': False, 'Sump_Pump_2': False}
+SUMP_ON = {'Sump_Valve': True, 'Sump_Pump_1': True, 'Sump_Pump_2': True}
+
+
+# SHA-256 of the branch template this engine implements. Proofs made with the engine (see generator_symmetry.py) only hold
+# for this version of the template: after changing it, update the engine, check it with --conformance and update the hash.
+TEMPLATE_SHA256 = "563d9a14b842e85ede036758d3d528eab777ff2874056581e9374c9151c0d1d9"
+
+
+# Explicit-state version of the branch model (spin_models/templates/branch_template.pml).
+#
+# A branch check asks whether an end state is visited by any execution of the model started from a start state.
+# Every assignment in the model writes a constant, apart from the Status <- Active copy, and control flow only depends
+# on READ_COLUMNS. So each state reachable from a start state is the start state with some bits overwritten, and the
+# set of (written bits, written values) pairs depends only on the start's READ_COLUMNS. Those overlays are enumerated
+# once per combination of READ_COLUMNS by exploring the model's interleavings, after which successor sets and
+# transition checks for any number of state ids are a handful of NumPy bit operations.
+class HydroBranchEngine:
+
+    def __init__(self):
+
+        self.template_hash = TEMPLATE_SHA256
+        self.read_bits = [BIT[column] for column in READ_COLUMNS]
+
+        # Overlays for each combination of READ_COLUMNS, indexed by class_of()
+        self.overlay_masks = []
+        self.overlay_values = []
+
+        for class_index in range(1 << len(self.read_bits)):
+            representative = 0
+            for position, bit in enumerate(self.read_bits):
+                if class_index >> position & 1:
+                    representative |= bit
+
+            # Writing a read variable with the value every member of the class already has is the same as not writing it
+            read_mask = sum(self.read_bits)
+            overlays = set()
+            for mask, value in self.explore(representative):
+                unchanged = read_mask & mask & ~(value ^ representative)
+                overlays.add((mask & ~unchanged, value & ~unchanged))
+
+            overlays = sorted(overlays)
+            self.overlay_masks.append(np.array([mask for mask, _ in overlays], dtype=np.uint32))
+            self.overlay_values.append(np.array([value for _, value in overlays], dtype=np.uint32))
+
+    # Index of the READ_COLUMNS combination of each state id
+    def class_of(self, states):
+        states = np.asarray(states, dtype=np.uint32)
+        classes = np.zeros(states.shape, dtype=np.intp)
+        for position, bit in enumerate(self.read_bits):
+            classes |= ((states & bit) != 0).astype(np.intp) << position
+        return classes
+
+    # Enumerates every state visited from a start state, including states inside atomic sequences (the ltl property sees those too).
+    # Returns: set of (written bits, written values) overlays.
+    def explore(self, start):
+
+        initial = Configuration(start, 0, False, False, False, "select_modes", None, None, None)
+
+        observed = {(0, 0)}
+        seen = {initial}
+        frontier = [initial]
+
+        while frontier:
+            configuration = frontier.pop()
+
+            for successor, intermediate in self.steps(configuration):
+                for visited in intermediate + [successor]:
+                    observed.add((visited.written, visited.values & visited.written))
+
+                if successor not in seen:
+                    seen.add(successor)
+                    frontier.append(successor)
+
+        return observed
+
+    # Assigns state variables of a configuration, recording them as written
+    def assign(self, configuration, assignments, **fields):
+        values = configuration.values
+        written = configuration.written
+        for column, value in assignments.items():
+            values = values | BIT[column] if value else values & ~BIT[column]
+            written |= BIT[column]
+        return configuration._replace(values=values, written=written, **fields)
+
+    def value(self, configuration, column):
+        return bool(configuration.values & BIT[column])
+
+    # All steps that can be taken from a configuration.
+    # Returns: list of (next configuration, list of configurations passed through without interleaving).
+    def steps(self, configuration):
+        return self.init_steps(configuration) + self.hmi_steps(configuration) + self.generator_steps(configuration) + self.control_steps(configuration)
+
+    def init_steps(self, configuration):
+
+        # Since we do not have PLC mode data the PLC modes are chosen non-deterministically
+        if configuration.init == "select_modes":
+            return [(configuration._replace(generator_mode=generator_mode, control_mode=control_mode, init="run_hmi"), [])
+                    for generator_mode in (True, False) for control_mode in (True, False)]
+
+        if configuration.init == "run_hmi":
+            return [(configuration._replace(init="end", hmi="run_generator"), [])]
+
+        return []
+
+    def hmi_steps(self, configuration):
+
+        if configuration.hmi == "run_generator":
+            return [(configuration._replace(hmi="run_control", generator="sync"), [])]
+
+        if configuration.hmi == "run_control":
+            return [(configuration._replace(hmi="send_instruction", control="check_mode"), [])]
+
+        if configuration.hmi == "send_instruction":
+            a_active = self.value(configuration, 'Gen_A_Active')
+            b_active = self.value(configuration, 'Gen_B_Active')
+            return_feed = self.value(configuration, 'HMI_Return_Feed')
+
+            # Each option of the atomic block as the state variable assignments made in order, and the PLC mode changed
+            options = [
+                ([{'Gen_A_Active': not a_active}], {}),
+                ([{'Gen_B_Active': not b_active}], {}),
+                ([], {'generator_mode': not configuration.generator_mode}),
+                ([], {'control_mode': not configuration.control_mode}),
+                ([{'HMI_Return_Feed': not return_feed}], {}),
+                # Operator takes no action
+                ([], {}),
+            ]
+            if a_active and b_active:
+                options.append(([{'Gen_A_Active': False}, {'Gen_B_Active': True}], {}))
+            if not a_active and not b_active:
+                options.append(([{'Gen_A_Active': True}, {'Gen_B_Active': True}], {}))
+
+            steps = []
+            for assignments, modes in options:
+                current = configuration._replace(hmi="check_action", **modes)
+                intermediate = []
+                for i, assignment in enumerate(assignments):
+                    # Other processes cannot run inside the atomic block, but the property still observes these states
+                    if i > 0:
+                        intermediate.append(current)
+                    current = self.assign(current, assignment)
+                steps.append((current, intermediate))
+            return steps
+
+        if configuration.hmi == "check_action":
+            # If only one action has been taken, optionally take another action
+            if not configuration.operator_action:
+                return [(configuration._replace(operator_action=True, hmi="send_instruction"), [])]
+            return [(configuration._replace(hmi="end"), [])]
+
+        return []
+
+    def generator_steps(self, configuration):
+
+        position = configuration.generator
+
+        if position == "sync":
+            # Update Gen_Status variables with Gen_Active variables
+            return [(self.assign(configuration, {'Gen_A_Status': self.value(configuration, 'Gen_A_Active'),
+                                                 'Gen_B_Status': self.value(configuration, 'Gen_B_Active')}, generator="check_mode"), [])]
+
+        if position == "check_mode":
+            return [(configuration._replace(generator="select" if configuration.generator_mode else "stop"), [])]
+
+        if position == "stop":
+            return [(self.assign(configuration, GENERATOR_STOP, generator="end"), [])]
+
+        if position == "select":
+            outcome = (self.value(configuration, 'Gen_A_Active'), self.value(configuration, 'Gen_B_Active'))
+            return [(configuration._replace(generator=("outputs", outcome)), [])]
+
+        if position is None or position == "end":
+            return []
+
+        stage, outcome = position
+        outputs, (a_status, b_status) = GENERATOR_OUTCOMES[outcome]
+
+        if stage == "outputs":
+            return [(self.assign(configuration, outputs, generator=("statuses", outcome)), [])]
+
+        # The two statuses are assigned one at a time, in either order
+        if stage == "statuses":
+            return [(self.assign(configuration, {'Gen_A_Status': a_status}, generator=("status_b", outcome)), []),
+                    (self.assign(configuration, {'Gen_B_Status': b_status}, generator=("status_a", outcome)), [])]
+
+        if stage == "status_a":
+            return [(self.assign(configuration, {'Gen_A_Status': a_status}, generator="end"), [])]
+
+        if stage == "status_b":
+            return [(self.assign(configuration, {'Gen_B_Status': b_status}, generator="end"), [])]
+
+        return []
+
+    def control_steps(self, configuration):
+
+        position = configuration.control
+
+        if position == "check_mode":
+            return [(configuration._replace(control="check_feed" if configuration.control_mode else "stop"), [])]
+
+        if position == "stop":
+            return [(self.assign(configuration, CONTROL_STOP, control="end"), [])]
+
+        if position == "check_feed":
+            return [(configuration._replace(control="manual_return" if self.value(configuration, 'HMI_Return_Feed') else "run_water_control"), [])]
+
+        if position == "manual_return":
+            return [(self.assign(configuration, SUMP_ON, control="end"), [])]
+
+        # The water return may or may not be running while the control is operating
+        if position == "run_water_control":
+            return [(self.assign(configuration, {'Return_Water_Supply_Control': False}, control="water_return_off"), []),
+                    (self.assign(configuration, {'Return_Water_Supply_Control': True}, control="water_return_on"), [])]
+
+        # Tag_2 prevents the feed turning off or on
+        if position in ("water_return_off", "water_return_on"):
+            if self.value(configuration, 'Tag_2'):
+                return [(configuration._replace(control="end"), [])]
+            return [(configuration._replace(control=position + "_pumps"), [])]
+
+        if position == "water_return_off_pumps":
+            return [(self.assign(configuration, SUMP_OFF, control="water_return_off_reset"), [])]
+
+        if position == "water_return_on_pumps":
+            return [(self.assign(configuration, SUMP_ON, control="water_return_on_reset"), [])]
+
+        if position == "water_return_off_reset":
+            return [(self.assign(configuration, {'Return_Water_Supply_Control': True}, control="end"), [])]
+
+        if position == "water_return_on_reset":
+            return [(self.assign(configuration, {'Return_Water_Supply_Control': False}, control="end"), [])]
+
+        return []
+
+    # Computes the set of states visited by the branch model from each state.
+    # The states are processed SUCCESSOR_CHUNK_SIZE at a time (see successor_chunks()), so the working memory does not grow with their number.
+    # Returns: CSR arrays (offsets, successors) where the successors of states[i] are successors[offsets[i]:offsets[i + 1]], sorted.
+    def successors(self, states):
+
+        states = np.asarray(states, dtype=np.uint32)
+        offsets = np.zeros(len(states) + 1, dtype=np.int64)
+        chunks = []
+
+        for start, chunk_offsets, chunk_successors in self.successor_chunks(states):
+            offsets[start + 1:start + len(chunk_offsets)] = chunk_offsets[1:] + offsets[start]
+            chunks.append(chunk_successors)
+
+        return offsets, np.concatenate(chunks) if chunks else np.empty(0, dtype=np.uint32)
+
+    # Computes the successors of the states a chunk at a time, e.g. to go through the whole state space without holding every successor.
+    # Returns: generator of (index of the chunk's first state, offsets, successors), the CSR arrays of successors() for the chunk.
+    def successor_chunks(self, states, chunk_size=SUCCESSOR_CHUNK_SIZE):
+
+        states = np.asarray(states, dtype=np.uint32)
+        for start in range(0, len(states), chunk_size):
+            yield (start, *self.chunk_successors(states[start:start + chunk_size]))
+
+    # Computes the CSR successor arrays of a chunk of states, every overlay of a state's class applied to it at once
+    def chunk_successors(self, states):
+
+        classes = self.class_of(states)
+
+        counts = np.zeros(len(states), dtype=np.int64)
+        rows = [None] * (1 << len(self.read_bits))
+
+        for class_index in range(len(rows)):
+            members = np.nonzero(classes == class_index)[0]
+            if len(members) == 0:
+                continue
+
+            # Every overlay of the class applied to every member, duplicates removed per row
+            candidates = (states[members, None] & ~self.overlay_masks[class_index]) | self.overlay_values[class_index]
+            candidates.sort(axis=1)
+            distinct = np.ones(candidates.shape, dtype=bool)
+            distinct[:, 1:] = candidates[:, 1:] != candidates[:, :-1]
+
+            counts[members] = distinct.sum(axis=1)
+            rows[class_index] = (members, candidates, distinct)
+
+        offsets = np.zeros(len(states) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        successors = np.empty(offsets[-1], dtype=np.uint32)
+
+        for row in rows:
+            if row is None:
+                continue
+            members, candidates, distinct = row
+            # Position of each kept candidate within its member's slice
+            rank = np.cumsum(distinct, axis=1, dtype=np.int32) - 1
+            destination = offsets[members, None] + rank
+            successors[destination[distinct]] = candidates[distinct]
+
+        return offsets, successors
+
+    # Checks whether each end state is visited by the branch model from the matching start state,
+    # comparing only the bits in property_mask (the variables constrained by the template's ltl property).
+    # Returns: boolean array, one verdict per pair.
+    def is_transition(self, previous_states, next_states, property_mask=ALL_BITS):
+
+        previous_states = np.asarray(previous_states, dtype=np.uint32)
+        next_states = np.asarray(next_states, dtype=np.uint32)
+        property_mask = np.uint32(property_mask)
+
+        classes = self.class_of(previous_states)
+        valid = np.zeros(len(previous_states), dtype=bool)
+
+        for class_index in range(len(self.overlay_masks)):
+            members = np.nonzero(classes == class_index)[0]
+            if len(members) == 0:
+                continue
+
+            previous = previous_states[members]
+            target = next_states[members] & property_mask
+            reached = np.zeros(len(members), dtype=bool)
+
+            for mask, value in zip(self.overlay_masks[class_index], self.overlay_values[class_index]):
+                reached |= (((previous & ~mask) | value) & property_mask) == target
+
+            valid[members] = reached
+
+        return valid
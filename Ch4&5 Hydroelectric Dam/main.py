@@ -1,8 +1,11 @@
 from price_simulator import PriceSimulator
-from spin_controller import SpinController
-import threading
-import queue
+from spin_controller import SpinController, default_workspace_root
+from transition_index import TransitionIndex
+from spin_executor import SpinExecutor
+from dataset_stream import read_transition_chunks
+from verification_profiles import PROFILE_NAMES, DEFAULT_HASH_SIZE
 import os
+import threading
 from datetime import datetime, timedelta
 import pytz
 import time
@@ -10,7 +13,6 @@ import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 from influxdb_client import InfluxDBClient, Point
-import shutil
 
 class StateNotFoundException(Exception):
     def __init__(self, Exception):
@@ -260,6 +262,10 @@ def derive_state_index(system_state):
     return int(binary_string, 2)
 
 def predict_transition(transitions, current_state):
+
+    # The index holds the successors of every state, already sorted
+    if transition_index is not None:
+        return transition_index.successors(current_state).tolist()
     
     # Look up all transitions that are expected to occur out of the current state.
     expected_transitions = transitions[(transitions['previous_state'] == current_state)]
@@ -285,45 +291,17 @@ def record_transition(previous_state_index, new_state_index):
 
 def validate_transition(transitions, previous_state_index, new_state_index):
 
-    if new_state_index in transitions.query(f'previous_state == {previous_state_index}').loc[:,"new_state"].tolist():
+    if transition_index is not None:
+        valid = transition_index.is_valid(previous_state_index, new_state_index)
+    else:
+        valid = new_state_index in transitions.query(f'previous_state == {previous_state_index}').loc[:,"new_state"].tolist()
+
+    if valid:
         print(f'Valid transition:\t{previous_state_index} -> {new_state_index}')
         return True
     else:
         raise InvalidTransitionException(f'Invalid transition:\t{previous_state_index} -> {new_state_index}')
 
-def spin_processor(thread_workspace):
-    if not os.path.exists(thread_workspace):
-        os.makedirs(thread_workspace)
-
-    transition_template_path = "C:/Users/dfraser/Documents/SpinHydro/transition models/updated models/noloop_hydro_cc_template.pml"
-    state_template_path = "C:/Users/dfraser/Documents/SpinHydro/state space models/hydro_state_template.pml"
-
-
-    # Copy over spin model for thread to use locally
-    shutil.copy(state_template_path,  f"{thread_workspace}/hydro_state_template.pml")
-    shutil.copy(transition_template_path,  f"{thread_workspace}/hydro_transition_template.pml")
-
-    while True:
-        try:
-            # Get data from the queue, waiting for data to be available
-            transition = spin_input.get()
-            print("New data received by SPIN worker")
-            # Check if it's the stop signal
-            if transition is None:
-                print("Spin processing thread received stop signal.")
-                spin_input.task_done()
-                break  # Exit the loop to terminate the thread
-
-            # Process data with SpinController
-            prev_state_result = spin_controller.check_state(transition["previous_state"], thread_workspace)
-            new_state_result = spin_controller.check_state(transition["next_state"], thread_workspace)
-            transition_result = spin_controller.check_transition(transition["previous_state"], transition["next_state"], thread_workspace)
-
-            print(f"\nSPIN Results: {prev_state_result} ---{transition_result}---> {new_state_result}")
-
-        except Exception as e:
-            print(f"Error processing data: {e}")
-
 def transition_handler(previous_state, new_state):
 
     print("Transition handler called")
@@ -339,11 +317,9 @@ def transition_handler(previous_state, new_state):
             if type(new_state) is pd.DataFrame:
                 new_state = new_state.to_dict('index').get(0)
 
-            print("TH Putting data")
-            spin_input.put({
-                "previous_state": previous_state,
-                "next_state": new_state
-            })
+            print("TH Submitting data")
+            # Live checks are taken by the next free worker, ahead of any warm-up or batch checks
+            spin_executor.submit(("both", previous_state["state_id"], new_state["state_id"]), "live")
         else:
             try: 
                 validate_transition(transitions, previous_state["state_id"], new_state["state_id"])
@@ -354,6 +330,24 @@ def transition_handler(previous_state, new_state):
                 else:
                     raise e
 
+# Yields tasks until stop is set, so a stream of tasks can be ended early
+def until_stopped(tasks, stop):
+    for task in tasks:
+        if stop.is_set():
+            return
+        yield task
+
+# Checks the transitions of a dataset as batch work, streamed to the workers as they have room for it.
+# Stops reading the dataset once stop is set, the checks already queued are finished.
+def background_evaluation(file, stop):
+
+    counts = {"read": 0, "queued": 0}
+    tasks, mirrored = spin_controller.transition_tasks(spin_controller.unchecked_transitions(read_transition_chunks(file), counts))
+    spin_executor.run_tasks(until_stopped(tasks, stop), "batch")
+    spin_controller.record_mirrored_transitions(mirrored)
+
+    print(f"Background evaluation of {file} complete: {counts['queued']}/{counts['read']} transitions checked in Spin.")
+
 def write_to_influx(influx_fields):
     # Empty dictionary is false -> if something has been added, write it to influx
     if influx_fields:
@@ -513,6 +507,10 @@ def main():
                         # Add data to flux datapoint, appears in format future_state_<index>
                         influx_fields[f'future_state_{i}'] = state
 
+                        # Verify the predicted transition while the workers are idle, so it is already known if it is observed
+                        if using_spin and args.warm_up:
+                            spin_executor.submit(("transition", system_state["state_id"], state), "warmup")
+
                                     # Write data if data has been added to the output point
            
             # Write any flux_field data to influx database           
@@ -541,16 +539,15 @@ def main():
 
 
         if using_spin:
-            spin_input.put(None)  # Use None as a stop signal
-            spin_input.put(None)  # Use None as a stop signal
-            spin_input.put(None)  # Use None as a stop signal
-            spin_input.put(None)  # Use None as a stop signal
+            # Stop the background evaluation submitting work before the workers are shut down
+            if background_thread is not None:
+                background_stop.set()
+                background_thread.join()
 
-            # Wait for the spin threads to finish
-            spin_thread_1.join()
-            spin_thread_2.join()
-            spin_thread_3.join()
-            spin_thread_4.join()
+            # Wait for the spin workers to finish
+            spin_executor.shutdown()
+            spin_controller.close_model_archive()
+            spin_controller.close_metrics()
 
             spin_controller.generate_state_space_diagram()
             print(f"\nStates:\n\t{len(spin_controller.states)-spin_controller.state_errors}/{len(spin_controller.states)} recognised states. \n\t{spin_controller.state_errors}/{len(spin_controller.states)} state errors.")
@@ -609,6 +606,27 @@ parser.add_argument("--loop", dest='loop_sim', action='store_true', help="Loop s
 parser.add_argument("--nosim", dest='energy_sim', action='store_false', help="Deactivate energy simulation components.")
 parser.add_argument("--recording", dest='recording', action='store_true', help="For recording a new transition file.")
 parser.add_argument("--nospin", dest='spin', action='store_false', help="Use Spin model checker.")
+parser.add_argument("--native_engine", dest='native_engine', action='store_true', help="Check transitions with the native implementation of the Spin transition model.")
+parser.add_argument("--workers", dest='workers', help="Number of worker processes running Spin checks, defaults to the number of cores.", default=os.cpu_count(), type=int)
+parser.add_argument("--workspace_root", dest='workspace_root', help="Directory for the Spin worker workspaces, on tmpfs (/dev/shm) by default when available.", default=default_workspace_root(), type=str)
+parser.add_argument("--retention", dest='retention', help="Which checked models to keep in the model archive.", choices=["none", "errors", "sampled", "all"], default="all", type=str)
+parser.add_argument("--retention_sample_rate", dest='retention_sample_rate', help="Fraction of checked models kept with --retention sampled.", default=0.01, type=float)
+parser.add_argument("--model_archive", dest='model_archive', help="Kept models are written to a new compressed archive per run, named after this path and the time the run started.", default="spin_models/generated_models.zip", type=str)
+parser.add_argument("--precompiled", dest='precompiled', action='store_true', help="Compile one pan verifier per template and worker, passing state values to it at run time.")
+parser.add_argument("--profiles", dest='profiles', help="Spin verification profiles to check with, each one after the first only verifying the checks the one before it left inconclusive.", nargs="+", choices=PROFILE_NAMES, default=["exhaustive"], type=str)
+parser.add_argument("--hash_size", dest='hash_size', help="Log2 of the number of bits in a bitstate search's hash table.", default=DEFAULT_HASH_SIZE, type=int)
+parser.add_argument("--search_cores", dest='search_cores', help="Cores the Spin search of each state check may use, or 'auto' to share the cores between the checks running at once.", default="1", type=str)
+parser.add_argument("--multicore_mode", dest='multicore_mode', help="Search state checks on several cores with Spin's multi-core pan or a swarm of differently seeded searches.", choices=["ncore", "swarm"], default="ncore", type=str)
+parser.add_argument("--transition_index", dest='transition_index', help="Location of a transition index to predict and validate transitions with, created from the transitions file if it does not exist.", default=None, type=str)
+parser.add_argument("--verdict_cache", dest='verdict_cache', help="Location of an SQLite database of Spin verdicts to reuse between runs.", default=None, type=str)
+parser.add_argument("--no_projection", dest='projection', action='store_false', help="Check every state as given, rather than once per set of states that render to the same Spin model.")
+parser.add_argument("--symmetry_reduction", dest='symmetry_reduction', action='store_true', help="Check a state or transition and its generator A/B swap once, for the Spin templates proven symmetric.")
+parser.add_argument("--metrics_prometheus", dest='metrics_prometheus', help="Export stage timing histograms, queue depth and worker utilisation to this Prometheus text-format file.", default=None, type=str)
+parser.add_argument("--metrics_csv", dest='metrics_csv', help="Append the stage timings, queue depth and worker utilisation to this CSV time series.", default=None, type=str)
+parser.add_argument("--metrics_interval", dest='metrics_interval', help="Float(in seconds) duration between metrics exports.", default=15, type=float)
+parser.add_argument("--warm_up", dest='warm_up', action='store_true', help="Check the predicted next transitions in Spin at low priority, so they are already verified if observed.")
+parser.add_argument("--background_transitions", dest='background_transitions', help="Location of a transitions .csv file to evaluate on the Spin workers in the background, behind the live checks.", default=None, type=str)
+parser.add_argument("--reachability_bitmap", dest='reachability_bitmap', help="Answer state checks from this reachability bitmap, building it with Spin first if the file does not exist.", default=None, type=str)
 args = parser.parse_args()
 
 # Enforce minimum refresh rate
@@ -622,6 +640,17 @@ print("------------------- Initialising Digital Twin -------------------")
 #states = load_states_csv(args.states, args.labels)
 labels = load_labels_csv(args.labels)
 transitions = load_transitions_csv(args.transitions_file)
+
+# Index of the transition relation, shared with the Spin controller
+if args.transition_index and not args.recording:
+    if not os.path.exists(args.transition_index):
+        # Rows starting from the -1 sentinel record the first state seen, not a transition
+        indexed = transitions[transitions["previous_state"] >= 0]
+        TransitionIndex.create(args.transition_index, indexed["previous_state"].values, indexed["new_state"].values)
+    transition_index = TransitionIndex(args.transition_index)
+    print(f'Loaded {len(transition_index)} transitions from index: {args.transition_index}')
+else:
+    transition_index = None
 using_spin = args.spin
 energy_sim = args.energy_sim
 
@@ -651,32 +680,44 @@ if energy_sim:
     price_simulator = PriceSimulator("electric_prices_26_3_2024.csv", 1400, args.duration, args.loop_sim)
 
 if using_spin:
-    # Queue of data to be processed by spin
-    spin_input = queue.Queue(maxsize=100)
     spin_controller = SpinController()
+    spin_controller.precompiled = args.precompiled
+    spin_controller.workspace_root = args.workspace_root
+    spin_controller.retention = args.retention
+    spin_controller.retention_sample_rate = args.retention_sample_rate
+    spin_controller.use_model_archive(args.model_archive)
+    if args.profiles != ["exhaustive"] or args.hash_size != DEFAULT_HASH_SIZE:
+        spin_controller.use_verification_profiles(args.profiles, args.hash_size)
+    if args.search_cores != "1":
+        spin_controller.use_multicore_search(args.search_cores, args.multicore_mode)
+    if args.metrics_prometheus or args.metrics_csv:
+        spin_controller.use_metrics(args.metrics_prometheus, args.metrics_csv, args.metrics_interval)
+    if args.native_engine:
+        spin_controller.use_native_engine()
+    if args.verdict_cache:
+        spin_controller.use_verdict_cache(args.verdict_cache)
+    if args.reachability_bitmap:
+        spin_controller.use_reachability_bitmap(args.reachability_bitmap)
+    if transition_index is not None:
+        spin_controller.use_transition_index(args.transition_index)
+    spin_controller.projection = args.projection
+    if args.symmetry_reduction:
+        spin_controller.use_symmetry_reduction()
+
+    # Worker processes that check the transitions passed to transition_handler
+    spin_executor = SpinExecutor(spin_controller, args.workers)
+    spin_executor.start()
+
+    # Evaluation run on the same workers as the live checks, which are taken ahead of it
+    background_stop = threading.Event()
+    background_thread = None
+    if args.background_transitions:
+        background_thread = threading.Thread(target=background_evaluation, args=(args.background_transitions, background_stop), daemon=True)
+        background_thread.start()
 else:
     spin_controller = None 
 
 print("------------------- Initialisation Complete   -------------------")
 
-# Start the consumer threads
-spin_thread_1 = threading.Thread(target=spin_processor, name="Thread 1", kwargs={"thread_workspace":"spin_models/thread_working_directory/thread_1"})
-spin_thread_1.daemon = True  # Daemonize thread to close with main program
-
-spin_thread_2 = threading.Thread(target=spin_processor, name="Thread 2", kwargs={"thread_workspace":"spin_models/thread_working_directory/thread_2"})
-spin_thread_2.daemon = True  # Daemonize thread to close with main program
-
-spin_thread_3 = threading.Thread(target=spin_processor, name="Thread 3", kwargs={"thread_workspace":"spin_models/thread_working_directory/thread_3"})
-spin_thread_3.daemon = True  # Daemonize thread to close with main program
-
-spin_thread_4 = threading.Thread(target=spin_processor, name="Thread 4", kwargs={"thread_workspace":"spin_models/thread_working_directory/thread_4"})
-spin_thread_4.daemon = True  # Daemonize thread to close with main program
-
-
-spin_thread_1.start()
-spin_thread_2.start()
-spin_thread_3.start()
-spin_thread_4.start()
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import os
+import random
+import itertools
+import threading
+import zipfile
+from datetime import datetime, timezone
+
+# Which generated models are kept after they have been checked
+#   none    - no models are kept
+#   errors  - only models of invalid transitions, unreachable states and failed checks
+#   sampled - a random fraction of all models
+#   all     - every model
+RETENTION_POLICIES = ["none", "errors", "sampled", "all"]
+
+
+# Returns: True if a model should be kept under the retention policy
+def should_retain(policy, error, sample_rate):
+
+    if policy == "all":
+        return True
+    if policy == "errors":
+        return error
+    if policy == "sampled":
+        return random.random() < sample_rate
+    return False
+
+
+# Returns: the path of a run's archive, the given path with the run's start time added to its name
+def run_archive_path(path, run_name):
+    stem, extension = os.path.splitext(path)
+    return f"{stem}_{run_name}{extension or '.zip'}"
+
+
+# Compressed archive holding the models kept during a run, replacing one file per model.
+# Each run writes its own archive named after the time it was opened (see run_archive_path()). A zip's central directory
+# is only written when it is closed, so a run that is killed loses the models of its own archive but never an earlier run's.
+class ModelArchive:
+
+    def __init__(self, path):
+        run_name = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+        self.lock = threading.Lock()
+
+        # Runs started in the same second get numbered archives rather than sharing one
+        for attempt in itertools.count():
+            self.path = run_archive_path(path, run_name if attempt == 0 else f"{run_name}_{attempt}")
+            try:
+                self.archive = zipfile.ZipFile(self.path, 'x', compression=zipfile.ZIP_DEFLATED)
+                break
+            except FileExistsError:
+                continue
+        self.count = 0
+
+    # Adds a model to the archive
+    def add(self, name, model_text):
+        with self.lock:
+            self.archive.writestr(name, model_text)
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            self.archive.close()
+        print(f"{self.count} models saved to '{self.path}'.")
@@ -0,0 +1,81 @@
+import re
+import pandas as pd
+
+# Figures read from the report pan prints at the end of a search, and the pattern each one is read with
+PAN_STATISTICS = {
+    "state_vector_bytes": r"State-vector (\d+) byte",
+    "depth_reached": r"depth reached (\d+)",
+    "errors": r"errors: (\d+)",
+    "states_stored": r"([\d.e+]+) states, stored",
+    "states_matched": r"([\d.e+]+) states, matched",
+    "transitions": r"([\d.e+]+) transitions \(= stored\+matched\)",
+    "atomic_steps": r"([\d.e+]+) atomic steps",
+    "hash_factor": r"hash factor: ([\d.e+-]+)",
+    "memory_mb": r"([\d.]+)\s+total actual memory usage",
+    "elapsed_seconds": r"pan: elapsed time ([\d.e+]+) seconds",
+}
+
+# Columns identifying the check a search belongs to. state is the state checked, or the start state of a transition.
+# A batch search is identified by its first transition and answers "checks" transitions.
+# profile is the verification profile searched with, coverage its estimate of the fraction of the state space searched.
+CHECK_COLUMNS = ["check", "state", "next_state", "checks", "verdict", "profile", "coverage"]
+
+# Figures summarised for a run, and the one used to rank the most expensive searches
+SUMMARY_STATISTICS = ["states_stored", "transitions", "depth_reached", "memory_mb", "elapsed_seconds"]
+WORST_OFFENDER_STATISTIC = "states_stored"
+
+
+# Reads the search statistics from pan's output.
+# Returns: dictionary of statistic -> value, None for any figure missing from the output.
+def parse_pan_output(stdout):
+
+    statistics = {}
+    for statistic, pattern in PAN_STATISTICS.items():
+        match = re.search(pattern, stdout)
+        statistics[statistic] = float(match.group(1)) if match else None
+
+    return statistics
+
+
+# Returns: text summary of a run's searches, with percentiles of each figure and the searches that stored the most states
+def summarise_statistics(statistics, worst=10):
+
+    if statistics.empty:
+        return "No pan searches were run.\n"
+
+    lines = [f"Pan statistics for {len(statistics)} searches answering {int(statistics['checks'].sum())} checks"]
+
+    percentiles = pd.DataFrame({
+        "p50": statistics[SUMMARY_STATISTICS].quantile(0.5),
+        "p90": statistics[SUMMARY_STATISTICS].quantile(0.9),
+        "p99": statistics[SUMMARY_STATISTICS].quantile(0.99),
+        "max": statistics[SUMMARY_STATISTICS].max(),
+        "total": statistics[SUMMARY_STATISTICS].sum(),
+    })
+    lines.append(percentiles.to_string(float_format=lambda value: f"{value:.6g}"))
+
+    # Escalated checks are searched once per profile they reach
+    if statistics["profile"].notna().any():
+        profiles = statistics.groupby("profile").agg(searches=("check", "size"), min_coverage=("coverage", "min"))
+        lines.append("\nSearches by verification profile:")
+        lines.append(profiles.to_string(float_format=lambda value: f"{value:.6g}"))
+
+    lines.append(f"\nLargest searches by {WORST_OFFENDER_STATISTIC}:")
+    offenders = statistics.sort_values(WORST_OFFENDER_STATISTIC, ascending=False).head(worst)
+    lines.append(offenders[CHECK_COLUMNS + SUMMARY_STATISTICS].to_string(index=False))
+
+    return "\n".join(lines) + "\n"
+
+
+# Writes the statistics of every search in a run next to its results, with a summary of the run.
+# Returns: the summary text.
+def write_statistics(records, prefix):
+
+    statistics = pd.DataFrame(records, columns=CHECK_COLUMNS + list(PAN_STATISTICS))
+    statistics.to_csv(f"{prefix}_pan_statistics.csv", index=False)
+
+    summary = summarise_statistics(statistics)
+    with open(f"{prefix}_pan_summary.txt", 'w') as output:
+        output.write(summary)
+
+    return summary
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import zlib
+
+# Stand-in for spin, gcc and pan, so the orchestration of checks can be benchmarked without SPIN installed.
+# verification_benchmark.py installs it as executables named spin, gcc, pan, pan_state and pan_transition, each of which runs
+#   python pan_stub.py <tool> <arguments>
+# Every tool sleeps for the seconds in PAN_STUB_<TOOL>_SECONDS (0 by default) to stand in for the real tool's work.
+# pan's verdict and statistics are derived from a hash of the model it was built from, or of the valuation a precompiled
+# verifier is given, so a check always gets the same verdict. PAN_STUB_ERROR_RATE sets the fraction of checks that find
+# the counterexample (0.5 by default). Batch models never report BATCH_REACHED, so every transition of a batch is invalid.
+
+VALUATION_VARIABLE = "HYDRO_VALUATION"
+
+PAN_REPORT = """(Spin Version 6.5.2 -- 6 December 2019, pan stub)
+	+ Partial Order Reduction
+
+Full statespace search for:
+	never claim         	+ (ltl_property)
+	assertion violations	+ (if within scope of claim)
+	acceptance   cycles 	- (not selected)
+	invalid end states	- (disabled by never claim)
+
+State-vector {state_vector} byte, depth reached {depth}, errors: {errors}
+{stored:>8} states, stored
+{matched:>8} states, matched
+{transitions:>8} transitions (= stored+matched)
+{atomic:>8} atomic steps
+hash conflicts:         0 (resolved)
+
+Stats on memory usage (in Megabytes):
+    0.000	equivalent memory usage for states (stored*(State-vector + overhead))
+    0.287	actual memory usage for states
+  128.000	memory used for hash table (-w24)
+    0.534	memory used for DFS stack (-m10000)
+  {memory:.3f}	total actual memory usage
+
+
+pan: elapsed time {elapsed:.2f} seconds
+"""
+
+
+def stub_delay(tool):
+    time.sleep(float(os.environ.get(f"PAN_STUB_{tool.upper()}_SECONDS", 0)))
+
+
+# spin -a <model>: "generates" pan.c as a copy of the model, which pan's verdict is read from
+def spin(args):
+
+    stub_delay("spin")
+
+    model = args[-1]
+    if not os.path.exists(model):
+        print(f"spin: cannot open {model}", file=sys.stderr)
+        return 1
+
+    with open(model, 'r') as input_file, open("pan.c", 'w') as output:
+        output.write(input_file.read())
+    return 0
+
+
+# gcc ... -o <verifier> pan.c: "compiles" the verifier as an executable that runs the stub's pan under the verifier's name
+def gcc(args):
+
+    stub_delay("gcc")
+
+    if not os.path.exists("pan.c"):
+        print("gcc: error: pan.c: No such file or directory", file=sys.stderr)
+        return 1
+
+    verifier = args[args.index("-o") + 1] if "-o" in args else "a.out"
+    tool = "pan" if verifier in ("pan", "a.out") else os.path.basename(verifier)
+    with open(verifier, 'w') as output:
+        output.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" {tool} "$@"\n')
+    os.chmod(verifier, 0o755)
+    return 0
+
+
+# pan, pan_state or pan_transition: prints a search report with a verdict read from the model's hash
+def pan(tool):
+
+    stub_delay("pan")
+
+    if tool != "pan":
+        # A precompiled verifier searches the model of the valuation it is given
+        valuation = os.environ.get(VALUATION_VARIABLE)
+        if valuation is None:
+            print(f"pan: {VALUATION_VARIABLE} must hold the placeholder values")
+            return 1
+        digest = zlib.crc32(f"{tool}:{valuation}".encode())
+    else:
+        if not os.path.exists("pan.c"):
+            print("pan: not found", file=sys.stderr)
+            return 127
+        with open("pan.c", 'rb') as input_file:
+            digest = zlib.crc32(input_file.read())
+
+    errors = int(digest % 1000 < 1000 * float(os.environ.get("PAN_STUB_ERROR_RATE", 0.5)))
+    stored = 1000 + digest % 50000
+    matched = digest % 20000
+
+    print(PAN_REPORT.format(
+        state_vector=44,
+        depth=10 + digest % 90,
+        errors=errors,
+        stored=stored,
+        matched=matched,
+        transitions=stored + matched,
+        atomic=digest % 100,
+        memory=128.8 + stored * 64 / 2**20,
+        elapsed=float(os.environ.get("PAN_STUB_PAN_SECONDS", 0)),
+    ))
+    return 0
+
+
+def main(argv):
+
+    tool, args = argv[1], argv[2:]
+
+    if tool == "spin":
+        return spin(args)
+    if tool == "gcc":
+        return gcc(args)
+    return pan(tool)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,186 @@
+import os
+import csv
+import bisect
+import threading
+import time
+
+# Stages of a check that are timed
+#   render - writing the model instance from its template
+#   spin   - spin -a, generating pan.c
+#   gcc    - compiling pan
+#   pan    - the search
+#   parse  - reading the verdict and statistics from pan's output
+#   memo   - storing the verdict in the controller's tables, cache and archive
+#   merge  - adding a worker's verdicts to the main process's tables
+#   job    - the whole check, the time a worker (or process slot) is busy with it
+STAGES = ["render", "spin", "gcc", "pan", "parse", "memo", "merge", "job"]
+
+# Classes of checks, highest priority first, and the time their checks wait in the queue is kept for (see SpinExecutor)
+#   live   - checks of the transitions observed by main.py
+#   warmup - checks of the transitions main.py predicts will be observed next
+#   batch  - evaluations of test datasets
+QUEUE_CLASSES = ["live", "warmup", "batch"]
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+
+# Histograms of stage timings, with the queue depth and worker utilisation of the run.
+# The metrics are exported every interval seconds, as a Prometheus text-format file that is replaced each time
+# (for node_exporter's textfile collector) and/or as a row appended to a CSV time series.
+# With keep_samples, every observation is also kept, so exact percentiles can be taken from samples (see verification_benchmark.py).
+class PipelineMetrics:
+
+    def __init__(self, prometheus_path=None, csv_path=None, interval=15, keep_samples=False):
+        self.prometheus_path = prometheus_path
+        self.csv_path = csv_path
+        self.interval = interval
+        self.lock = threading.Lock()
+
+        # Per stage: count of observations in each bucket (the last for those above every bound), total seconds and count
+        self.buckets = {stage: [0] * (len(BUCKETS) + 1) for stage in STAGES}
+        self.sums = {stage: 0.0 for stage in STAGES}
+        self.counts = {stage: 0 for stage in STAGES}
+        self.samples = {stage: [] for stage in STAGES} if keep_samples else None
+
+        # Per class: the same figures for the time checks waited in the queue before a worker took them
+        self.queue_buckets = {queue_class: [0] * (len(BUCKETS) + 1) for queue_class in QUEUE_CLASSES}
+        self.queue_sums = {queue_class: 0.0 for queue_class in QUEUE_CLASSES}
+        self.queue_counts = {queue_class: 0 for queue_class in QUEUE_CLASSES}
+
+        self.queue_depth = 0
+        self.workers = 1
+
+        # Busy time of the workers since the last export, from the "job" stage
+        self.busy_seconds = 0.0
+        self.utilisation = 0.0
+        self.last_export = time.monotonic()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.buckets[stage][bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.sums[stage] += seconds
+            self.counts[stage] += 1
+            if self.samples is not None:
+                self.samples[stage].append(seconds)
+            if stage == "job":
+                self.busy_seconds += seconds
+
+    # Records the time a check of a class waited in the queue
+    def observe_queue(self, queue_class, seconds):
+        with self.lock:
+            self.queue_buckets[queue_class][bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.queue_sums[queue_class] += seconds
+            self.queue_counts[queue_class] += 1
+
+    # Adds a list of (stage, seconds) timings, e.g. those returned by a worker
+    def observe_many(self, timings):
+        for stage, seconds in timings:
+            self.observe(stage, seconds)
+
+    # Sets the number of checks queued or running and the number of workers taking them
+    def set_queue(self, queue_depth, workers):
+        with self.lock:
+            self.queue_depth = queue_depth
+            self.workers = workers
+
+    # Exports the metrics if the interval has passed since the last export
+    def export_if_due(self):
+        if time.monotonic() - self.last_export >= self.interval:
+            self.export()
+
+    def export(self):
+
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_export
+            if elapsed > 0:
+                self.utilisation = min(1.0, self.busy_seconds / (self.workers * elapsed))
+            self.busy_seconds = 0.0
+            self.last_export = now
+
+        if self.prometheus_path is not None:
+            self.write_prometheus()
+        if self.csv_path is not None:
+            self.append_csv()
+
+    # Writes the metrics in the Prometheus text format, replacing the file in one step so it is never read half-written
+    def write_prometheus(self):
+
+        lines = [
+            "# HELP hydro_spin_stage_seconds Time taken by each stage of a SPIN check.",
+            "# TYPE hydro_spin_stage_seconds histogram",
+        ]
+
+        with self.lock:
+            for stage in STAGES:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, self.buckets[stage]):
+                    cumulative += count
+                    lines.append(f'hydro_spin_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'hydro_spin_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {self.counts[stage]}')
+                lines.append(f'hydro_spin_stage_seconds_sum{{stage="{stage}"}} {self.sums[stage]}')
+                lines.append(f'hydro_spin_stage_seconds_count{{stage="{stage}"}} {self.counts[stage]}')
+
+            lines += [
+                "# HELP hydro_spin_queue_seconds Time checks of each class waited in the queue.",
+                "# TYPE hydro_spin_queue_seconds histogram",
+            ]
+            for queue_class in QUEUE_CLASSES:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, self.queue_buckets[queue_class]):
+                    cumulative += count
+                    lines.append(f'hydro_spin_queue_seconds_bucket{{class="{queue_class}",le="{bound}"}} {cumulative}')
+                lines.append(f'hydro_spin_queue_seconds_bucket{{class="{queue_class}",le="+Inf"}} {self.queue_counts[queue_class]}')
+                lines.append(f'hydro_spin_queue_seconds_sum{{class="{queue_class}"}} {self.queue_sums[queue_class]}')
+                lines.append(f'hydro_spin_queue_seconds_count{{class="{queue_class}"}} {self.queue_counts[queue_class]}')
+
+            lines += [
+                "# HELP hydro_spin_queue_depth Checks queued or running.",
+                "# TYPE hydro_spin_queue_depth gauge",
+                f"hydro_spin_queue_depth {self.queue_depth}",
+                "# HELP hydro_spin_workers Workers taking checks.",
+                "# TYPE hydro_spin_workers gauge",
+                f"hydro_spin_workers {self.workers}",
+                "# HELP hydro_spin_worker_utilisation Fraction of worker time spent on checks since the previous export.",
+                "# TYPE hydro_spin_worker_utilisation gauge",
+                f"hydro_spin_worker_utilisation {self.utilisation}",
+            ]
+
+        temporary_path = f"{self.prometheus_path}.tmp"
+        with open(temporary_path, 'w') as output:
+            output.write("\n".join(lines) + "\n")
+        os.replace(temporary_path, self.prometheus_path)
+
+    # Appends one row to the CSV time series: the queue, utilisation and running totals of each stage
+    def append_csv(self):
+
+        with self.lock:
+            row = {"time": time.time(), "queue_depth": self.queue_depth, "workers": self.workers, "worker_utilisation": self.utilisation}
+            for stage in STAGES:
+                row[f"{stage}_count"] = self.counts[stage]
+                row[f"{stage}_seconds"] = self.sums[stage]
+            for queue_class in QUEUE_CLASSES:
+                row[f"queue_{queue_class}_count"] = self.queue_counts[queue_class]
+                row[f"queue_{queue_class}_seconds"] = self.queue_sums[queue_class]
+
+        new_file = not os.path.exists(self.csv_path)
+        with open(self.csv_path, 'a', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=list(row))
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+    # Returns: text table of the count, mean and total time of each stage, and of the queue wait of each class of check
+    def summary(self):
+
+        lines = [f"{'stage':<14}{'count':>10}{'mean (s)':>12}{'total (s)':>12}"]
+        with self.lock:
+            for stage in STAGES:
+                mean = self.sums[stage] / self.counts[stage] if self.counts[stage] else 0.0
+                lines.append(f"{stage:<14}{self.counts[stage]:>10}{mean:>12.4f}{self.sums[stage]:>12.2f}")
+            for queue_class in QUEUE_CLASSES:
+                if self.queue_counts[queue_class]:
+                    mean = self.queue_sums[queue_class] / self.queue_counts[queue_class]
+                    lines.append(f"{'queue ' + queue_class:<14}{self.queue_counts[queue_class]:>10}{mean:>12.4f}{self.queue_sums[queue_class]:>12.2f}")
+        return "\n".join(lines)
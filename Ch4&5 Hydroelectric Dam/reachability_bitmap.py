@@ -0,0 +1,81 @@
+import os
+import numpy as np
+
+# Number of bits in a state id (see SpinController.state_columns)
+NUM_BITS = 23
+
+
+# Returns: the path of the file holding the SHA-256 of the template a bitmap was built from
+def template_hash_path(path):
+    return f"{path}.sha256"
+
+
+# One bit per state id recording whether the trunk model reaches that state.
+# Stored as a plain 2^23-bit (1 MiB) file and memory-mapped, so loading it costs nothing and a lookup is a single byte read.
+# Bit i of the file is bit (i & 7) of byte (i >> 3).
+# The SHA-256 of the template the bitmap was built from is kept next to it (see template_hash_path()), None if it is unknown.
+class ReachabilityBitmap:
+
+    def __init__(self, path, num_bits=NUM_BITS):
+        self.path = path
+        self.num_bits = num_bits
+        self.bits = np.memmap(path, dtype=np.uint8, mode='r', shape=(1 << num_bits) // 8)
+
+        self.template_hash = None
+        if os.path.exists(template_hash_path(path)):
+            with open(template_hash_path(path), 'r') as hash_file:
+                self.template_hash = hash_file.read().strip()
+
+    # Writes a bitmap in which exactly the given state ids are set, and the hash of the template they were found in,
+    # replacing any existing files.
+    # Returns: the bitmap, opened for reading.
+    @classmethod
+    def create(cls, path, state_ids, num_bits=NUM_BITS, template_hash=None):
+
+        flags = np.zeros(1 << num_bits, dtype=bool)
+        flags[np.asarray(state_ids, dtype=np.int64)] = True
+
+        # Write to temporary files first so a reader never sees a partial bitmap.
+        # The old hash is removed before the bitmap is replaced, so a bitmap is never paired with another template's hash.
+        temporary_path = f"{path}.tmp"
+        np.packbits(flags, bitorder='little').tofile(temporary_path)
+        if os.path.exists(template_hash_path(path)):
+            os.remove(template_hash_path(path))
+        os.replace(temporary_path, path)
+
+        if template_hash is not None:
+            with open(f"{template_hash_path(path)}.tmp", 'w') as hash_file:
+                hash_file.write(template_hash + "\n")
+            os.replace(f"{template_hash_path(path)}.tmp", template_hash_path(path))
+
+        return cls(path, num_bits)
+
+    # Returns: True if the state id is reachable
+    def contains(self, state_id):
+        state_id = int(state_id)
+        return bool(self.bits[state_id >> 3] >> (state_id & 7) & 1)
+
+    # Returns: boolean array with the reachability of each state id
+    def contains_many(self, state_ids):
+        state_ids = np.asarray(state_ids, dtype=np.int64)
+        return (self.bits[state_ids >> 3] >> (state_ids & 7) & 1).astype(bool)
+
+    # Returns: sorted array of every reachable state id
+    def state_ids(self):
+        return np.nonzero(np.unpackbits(np.asarray(self.bits), bitorder='little'))[0]
+
+    def __len__(self):
+        return int(np.unpackbits(np.asarray(self.bits)).sum())
+
+
+# Adds to a set of state ids every state that differs from one of them only in the bits outside property_mask.
+# Those variables are not compared by the reachability property, so such states share the same verdict.
+def expand_dont_care_bits(state_ids, property_mask, num_bits=NUM_BITS):
+
+    state_ids = np.unique(np.asarray(state_ids, dtype=np.int64) & property_mask)
+
+    for bit in range(num_bits):
+        if not property_mask >> bit & 1:
+            state_ids = np.concatenate([state_ids, state_ids | (1 << bit)])
+
+    return np.unique(state_ids)
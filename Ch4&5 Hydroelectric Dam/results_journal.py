@@ -0,0 +1,88 @@
+import os
+import csv
+import threading
+
+# Columns of a journal entry. state is the state checked, or the start state of a transition.
+JOURNAL_COLUMNS = ["check", "state", "next_state", "verdict"]
+
+
+# Append-only record of an evaluation's verdicts, written as the verdicts arrive so a run that stops part way can be resumed.
+# Each write is flushed to the file before it returns, so a crash loses at most the entries being written.
+# A journal left with an entry cut short is repaired when it is reopened, and the partial entry is skipped when it is read.
+class ResultsJournal:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = 0
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        ends_in_newline = new_file or self.ends_in_newline(path)
+
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+        if new_file:
+            self.writer.writerow(JOURNAL_COLUMNS)
+        elif not ends_in_newline:
+            # Start the next entry on a new line, after the one cut short
+            self.file.write("\n")
+        self.file.flush()
+
+    @staticmethod
+    def ends_in_newline(path):
+        with open(path, 'rb') as input_file:
+            input_file.seek(-1, os.SEEK_END)
+            return input_file.read(1) == b"\n"
+
+    # Appends verdicts to the journal, from a dictionary of state id (or (previous_state, next_state) for transitions) -> verdict.
+    # check is "state" or "transition". Verdicts of None, checks where SPIN failed, are left out so they are checked again.
+    def write(self, check, verdicts):
+
+        rows = []
+        for ids, verdict in verdicts.items():
+            if verdict is None:
+                continue
+            ids = ids if isinstance(ids, tuple) else (ids,)
+            rows.append([check, int(ids[0]), int(ids[1]) if len(ids) > 1 else "", bool(verdict)])
+
+        if not rows:
+            return
+
+        with self.lock:
+            self.writer.writerows(rows)
+            self.file.flush()
+            self.entries += len(rows)
+
+    def close(self):
+
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+    # Reads the verdicts recorded in a journal, later entries for a check replacing earlier ones.
+    # Returns: dictionary of state id -> verdict, and dictionary of (previous_state, next_state) -> verdict.
+    @staticmethod
+    def read(path):
+
+        states = {}
+        transitions = {}
+
+        with open(path, 'r', newline='') as input_file:
+            for row in csv.reader(input_file):
+                # Skips the header, and any entry cut short by a crash
+                if len(row) != len(JOURNAL_COLUMNS) or row[3] not in ("True", "False"):
+                    continue
+
+                check, state, next_state, verdict = row
+                try:
+                    if check == "state":
+                        states[int(state)] = verdict == "True"
+                    elif check == "transition":
+                        transitions[(int(state), int(next_state))] = verdict == "True"
+                except ValueError:
+                    continue
+
+        return states, transitions
@@ -0,0 +1,180 @@
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+import pandas as pd
+from datetime import datetime, timezone
+from template_renderer import CompiledTemplate
+from pan_statistics import CHECK_COLUMNS, PAN_STATISTICS
+
+# Placeholder prefixes the model of each kind of check is rendered with
+TEMPLATE_PREFIXES = {"state": ["REACHABLE"], "transition": ["START", "END"]}
+
+# Columns of the pan statistics table. check is a keyword in SQL, so the kind of check is stored as kind.
+STATISTICS_COLUMNS = ["kind"] + CHECK_COLUMNS[1:] + list(PAN_STATISTICS)
+STATISTICS_TYPES = {"kind": "TEXT", "profile": "TEXT", "state": "INTEGER", "next_state": "INTEGER", "checks": "INTEGER", "verdict": "INTEGER"}
+
+
+# Results of every evaluation in one SQLite database, in place of a Promela file per check.
+# Each evaluation of a dataset is a run, and every table is keyed by run, so the results of a dataset or run are a query.
+# A run keeps the hashes of the templates it checked with, and the templates themselves are stored once per hash,
+# so the model of any check can be rendered again from its state ids (see render_model()).
+class ResultsStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        statistics_columns = ", ".join(f"{column} {STATISTICS_TYPES.get(column, 'REAL')}" for column in STATISTICS_COLUMNS)
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            "template_hash TEXT PRIMARY KEY, path TEXT NOT NULL, text TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id INTEGER PRIMARY KEY AUTOINCREMENT, dataset TEXT NOT NULL, finished TEXT NOT NULL, "
+            "state_template_hash TEXT, transition_template_hash TEXT, state_columns TEXT NOT NULL, settings TEXT);"
+            "CREATE INDEX IF NOT EXISTS runs_by_dataset ON runs (dataset, run_id);"
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "run_id INTEGER NOT NULL, kind TEXT NOT NULL, state INTEGER NOT NULL, next_state INTEGER, verdict INTEGER);"
+            "CREATE INDEX IF NOT EXISTS verdicts_by_run ON verdicts (run_id, kind, state, next_state);"
+            f"CREATE TABLE IF NOT EXISTS pan_statistics (run_id INTEGER NOT NULL, {statistics_columns});"
+            "CREATE INDEX IF NOT EXISTS pan_statistics_by_run ON pan_statistics (run_id, kind);"
+        )
+        self.connection.commit()
+
+    # Keeps the text of a template under its hash, the same hash as the verdict cache's, once.
+    # Returns: the hash, None if the template does not exist.
+    def add_template(self, template_path):
+
+        if not os.path.exists(template_path):
+            return None
+
+        with open(template_path, 'rb') as input_file:
+            template_bytes = input_file.read()
+        template_hash = hashlib.sha256(template_bytes).hexdigest()
+
+        self.connection.execute("INSERT OR IGNORE INTO templates VALUES (?, ?, ?)", (template_hash, template_path, template_bytes.decode()))
+        return template_hash
+
+    # Stores the results of an evaluation of a dataset as a new run.
+    # states and transitions are the controller's exported tables, statistics its pan statistics records.
+    # Returns: the id of the run.
+    def add_run(self, dataset, state_template_path, transition_template_path, state_columns, states, transitions, statistics, settings=None):
+
+        with self.lock:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (dataset, finished, state_template_hash, transition_template_hash, state_columns, settings) VALUES (?, ?, ?, ?, ?, ?)",
+                (dataset, datetime.now(timezone.utc).isoformat(), self.add_template(state_template_path), self.add_template(transition_template_path),
+                 json.dumps(state_columns), json.dumps(settings or {}))
+            ).lastrowid
+
+            self.connection.executemany(
+                "INSERT INTO verdicts VALUES (?, 'state', ?, NULL, ?)",
+                [(run_id, int(state), None if pd.isna(reachable) else int(bool(reachable))) for state, reachable in zip(states["state"], states["reachable"])])
+            self.connection.executemany(
+                "INSERT INTO verdicts VALUES (?, 'transition', ?, ?, ?)",
+                [(run_id, int(previous_state), int(next_state), None if pd.isna(valid) else int(bool(valid)))
+                 for previous_state, next_state, valid in zip(transitions["previous_state"], transitions["next_state"], transitions["valid"])])
+            self.connection.executemany(
+                f"INSERT INTO pan_statistics VALUES (?, {', '.join('?' for _ in STATISTICS_COLUMNS)})",
+                [(run_id, record.get("check"), *[record.get(column) for column in STATISTICS_COLUMNS[1:]]) for record in statistics])
+
+            self.connection.commit()
+
+        return run_id
+
+    # Returns: the id of the latest run, of a dataset if one is given, None if there is none
+    def latest_run(self, dataset=None):
+
+        if dataset is None:
+            row = self.connection.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        else:
+            row = self.connection.execute("SELECT MAX(run_id) FROM runs WHERE dataset = ?", (dataset,)).fetchone()
+        return row[0]
+
+    # Returns: DataFrame of every run, with its number of checks and errors (invalid transitions or unreachable states)
+    def runs(self):
+
+        return pd.read_sql_query(
+            "SELECT runs.run_id, dataset, finished, COUNT(verdicts.kind) AS checks, SUM(verdicts.verdict = 0) AS errors "
+            "FROM runs LEFT JOIN verdicts ON verdicts.run_id = runs.run_id GROUP BY runs.run_id ORDER BY runs.run_id", self.connection)
+
+    # Returns: DataFrame of a run's verdicts of one kind, the latest run of the dataset (or of all runs) by default.
+    # State verdicts have the columns state, reachable and transition verdicts previous_state, next_state, valid, as in the CSV results.
+    def verdicts(self, kind, run_id=None, dataset=None):
+
+        run_id = run_id if run_id is not None else self.latest_run(dataset)
+
+        if kind == "state":
+            frame = pd.read_sql_query("SELECT state, verdict AS reachable FROM verdicts WHERE run_id = ? AND kind = 'state'", self.connection, params=(run_id,))
+        else:
+            frame = pd.read_sql_query("SELECT state AS previous_state, next_state, verdict AS valid FROM verdicts WHERE run_id = ? AND kind = 'transition'", self.connection, params=(run_id,))
+
+        verdict_column = frame.columns[-1]
+        frame[verdict_column] = frame[verdict_column].map({1: True, 0: False})
+        return frame
+
+    # Returns: DataFrame of a run's pan statistics, the latest run of the dataset (or of all runs) by default
+    def statistics(self, run_id=None, dataset=None):
+
+        run_id = run_id if run_id is not None else self.latest_run(dataset)
+        return pd.read_sql_query("SELECT * FROM pan_statistics WHERE run_id = ?", self.connection, params=(run_id,))
+
+    # Renders the model a run checked for a state ("state", state_id) or a transition ("transition", previous_state, next_state),
+    # from the template the run used.
+    # Returns: the text of the model.
+    def render_model(self, run_id, kind, *state_ids):
+
+        if kind not in TEMPLATE_PREFIXES:
+            raise ValueError(f"Unknown kind of check '{kind}', expected one of {list(TEMPLATE_PREFIXES)}.")
+
+        row = self.connection.execute(
+            f"SELECT templates.text, templates.path, runs.state_columns FROM runs "
+            f"JOIN templates ON templates.template_hash = runs.{kind}_template_hash WHERE runs.run_id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Run {run_id} has no {kind} template in '{self.path}'.")
+
+        text, template_path, state_columns = row
+        return CompiledTemplate(text, json.loads(state_columns), TEMPLATE_PREFIXES[kind], template_path).render(*state_ids)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Results store.")
+    parser.add_argument("--store", dest="store", type=str, default="spin_models/results.sqlite", help="Results store to read.")
+    parser.add_argument("--runs", dest="runs", action="store_true", help="List the runs in the store.")
+    parser.add_argument("--run", dest="run", type=int, default=None, help="Run to read, the latest run of --dataset by default.")
+    parser.add_argument("--dataset", dest="dataset", type=str, default=None, help="Dataset whose latest run is read.")
+    parser.add_argument("--export", dest="export", type=str, default=None, help="Write the run's state and transition verdicts and pan statistics to CSV files with this prefix.")
+    parser.add_argument("--render", dest="render", nargs="+", default=None, metavar="KIND_OR_ID", help="Render a checked model: state <state_id> or transition <previous_state> <next_state>.")
+    parser.add_argument("--output", dest="output", type=str, default=None, help="File to write the rendered model to, printed by default.")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    run_id = args.run if args.run is not None else store.latest_run(args.dataset)
+
+    if args.runs:
+        print(store.runs().to_string(index=False))
+
+    if args.export:
+        store.verdicts("state", run_id).to_csv(f"{args.export}_states.csv", index=False)
+        store.verdicts("transition", run_id).to_csv(f"{args.export}_transitions.csv", index=False)
+        store.statistics(run_id).to_csv(f"{args.export}_pan_statistics.csv", index=False)
+        print(f"Exported run {run_id} to '{args.export}_*.csv'.")
+
+    if args.render:
+        kind, state_ids = args.render[0], [int(state_id) for state_id in args.render[1:]]
+        model_text = store.render_model(run_id, kind, *state_ids)
+        if args.output:
+            with open(args.output, 'w') as output:
+                output.write(model_text)
+        else:
+            print(model_text)
+
+    store.close()
@@ -1,14 +1,32 @@
 import pandas as pd
+import numpy as np
 import os
 import re
-from subprocess import run, SubprocessError, PIPE
-import generate_dot
 import shutil
+from subprocess import run, Popen, CompletedProcess, SubprocessError, PIPE
+import generate_dot
 import argparse
 import threading
-import queue
-from datetime import datetime, timedelta
+import itertools
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from verdict_store import VerdictStore
+from template_renderer import CompiledTemplate
+from pan_statistics import parse_pan_output, write_statistics
+from dataset_stream import read_state_chunks, read_transition_chunks
+from verification_profiles import PROFILE_NAMES, DEFAULT_HASH_SIZE, make_profiles, is_safety_property
+
+# Seconds between checks of whether a search of a swarm has finished
+SWARM_POLL_SECONDS = 0.01
+
+# Workspaces go on tmpfs when it is available, so generated models, pan sources and binaries never touch the disk
+def default_workspace_root():
+
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm/hydro_spin"
+    return "spin_models/thread_working_directory"
 
 class SpinController:
 
@@ -16,7 +34,30 @@ class SpinController:
 
         # Initialize lock for thread synchronization
         self.lock = threading.Lock()
-        self.stop_threads = threading.Event()
+
+        # Number of worker processes running SPIN checks
+        self.workers = os.cpu_count()
+
+        # When set, state and transition checks run as asyncio subprocesses in this process instead of on worker processes
+        self.async_pipeline = False
+
+        # Directory holding the workspace of every worker
+        self.workspace_root = default_workspace_root()
+
+        # Which checked models are kept (see model_archive.RETENTION_POLICIES), and the fraction kept when sampled.
+        # Kept models are added to the archive opened by use_model_archive(), or held until a worker returns them to the parent.
+        self.retention = "all"
+        self.retention_sample_rate = 0.01
+        self.model_archive = None
+        self.retained_models = []
+
+        # Statistics of each pan search since the last call to take_check_statistics(), see pan_statistics.CHECK_COLUMNS
+        self.check_statistics = []
+
+        # Stage timings go to the metrics opened by use_metrics(), or are held as (stage, seconds) until a worker returns them
+        self.metrics = None
+        self.collect_timings = False
+        self.stage_timings = []
 
         self.transition_template_path = "spin_models/templates/branch_template.pml"
         self.state_template_path = "spin_models/templates/trunk_template.pml"
@@ -30,8 +71,8 @@ class SpinController:
         self.non_threaded_workspace = "spin_models"
         self.transition_promela_path = "spin_models/hydro_transition.pml"
         self.state_promela_path = "spin_models/hydro_state.pml"
-        self.transitions = pd.DataFrame(columns=["previous_state", "next_state", "valid"])
-        self.states = pd.DataFrame(columns=["state", "reachable"])
+        self.transition_verdicts = VerdictStore(["previous_state", "next_state"], "valid")
+        self.state_verdicts = VerdictStore(["state"], "reachable")
         self.labels = pd.DataFrame(columns=["state_id", "label"])
         self.state_errors = 0
         self.transition_errors = 0
@@ -62,6 +103,91 @@ class SpinController:
             'HMI_Return_Feed'
         ]
 
+        # Placeholders filled per check, in the order their values appear in the valuation string passed to a precompiled pan
+        self.transition_placeholders = [f"START_{column}" for column in self.state_columns] + [f"END_{column}" for column in self.state_columns]
+        self.state_placeholders = [f"REACHABLE_{column}" for column in self.state_columns]
+
+        # Templates parsed by compiled_template(), keyed by path
+        self.compiled_templates = {}
+
+        # When set, each workspace compiles one pan per template and the state values are read by pan at start-up
+        self.precompiled = False
+        self.valuation_variable = "HYDRO_VALUATION"
+        # Verifiers built by prepare_precompiled_workspace(), each kind of check falls back to compiling per check when its own is missing
+        self.precompiled_ready = {"pan_state": False, "pan_transition": False}
+
+        # pan verification profiles every check is run with, in order: each one after the first only runs when the search before
+        # it was inconclusive (see verification_profiles.py). Bitstate searches use 2^hash_size bits.
+        self.verification_profiles = ["exhaustive"]
+        self.hash_size = DEFAULT_HASH_SIZE
+        # Profiles of each template, built by profiles_for()
+        self.template_profiles = {}
+
+        # Cores the pan search of a state check may use, the trunk template's reachability search being the longest a check runs.
+        # "auto" shares the machine's cores between the checks running at once, counted in running_checks by the worker processes.
+        # Searches use SPIN's multi-core pan (-DNCORE) or, with "swarm", that many differently seeded searches stopping at the first verdict.
+        self.search_cores = 1
+        self.multicore_mode = "ncore"
+        self.running_checks = None
+
+        # Number of transitions verified together by one batch model, 0 checks each transition separately
+        self.batch_size = 0
+
+        # Most checks queued or running on the worker processes at once, 16 per worker by default
+        self.max_pending = None
+
+        # Native implementation of the transition template, loaded by use_native_engine()
+        self.engine = None
+        self.engine_property_mask = None
+
+        # Reachable set of the state template, loaded by use_reachability_bitmap()
+        self.reachability = None
+
+        # Verdicts kept between runs, loaded by use_verdict_cache()
+        self.verdict_cache = None
+        self.transition_template_hash = None
+        self.state_template_hash = None
+
+        # Index of transitions already verified as valid, loaded by use_transition_index()
+        self.transition_index = None
+        self.transition_index_path = None
+
+        # When set, states are checked as their projection onto the variables their template is rendered from (see projection_masks())
+        self.projection = True
+
+        # When set, a state or transition and its generator A/B swap are verified once, enabled by use_symmetry_reduction().
+        # Each holds the SHA-256 of the template proven symmetric, and the reduction is dropped if the template checked has a different hash.
+        self.symmetric_states = None
+        self.symmetric_transitions = None
+        self.symmetry = None
+
+        # Store the results of every evaluation are added to, opened by use_results_store()
+        self.results_store = None
+
+        # Work queue that run_tasks() hands jobs to instead of local worker processes, opened by use_work_queue()
+        self.work_queue = None
+
+        # Journal of the current evaluation's verdicts, opened by open_journal(). With resume, an evaluation continues from its journal.
+        self.journal = None
+        self.resume = False
+
+    # Memoisation tables, exported as DataFrames. Assigning a DataFrame replaces the table's contents.
+    @property
+    def transitions(self):
+        return self.transition_verdicts.to_frame()
+
+    @transitions.setter
+    def transitions(self, frame):
+        self.transition_verdicts = VerdictStore.from_frame(frame, ["previous_state", "next_state"], "valid")
+
+    @property
+    def states(self):
+        return self.state_verdicts.to_frame()
+
+    @states.setter
+    def states(self, frame):
+        self.state_verdicts = VerdictStore.from_frame(frame, ["state"], "reachable")
+
     def load_states_csv(self, states_path, labels_path):
 
         # Read the CSV file into a pandas DataFrame
@@ -109,243 +235,1084 @@ class SpinController:
         state_dict["state_id"] = state_int
         return state_dict
 
-    # Constructs dictionary of state values associated with the placeholders in the Promela model
-    def generate_transition_dictionary(self, start_state, end_state):
-        
-        # Helper function
-        def get_value(state, key):
-            value = state.get(key)
-
-            if type(value) == bool or (isinstance(value, float) and value in {0.0, 1.0}):
-                return int(value)
-            if value == None:
-                return "VALUE NOT FOUND"
-
-        # Create the dictionary
-        return {
-            # START values
-            # Control
-            "START_Flood_Gate_Valve" : get_value(start_state, "Flood_Gate_Valve"),
-            "START_Flood_Pump" : get_value(start_state, "Flood_Pump"),
-            "START_Sump_Valve" : get_value(start_state, "Sump_Valve"),
-            "START_Sump_Pump_1" : get_value(start_state, "Sump_Pump_1"),
-            "START_Sump_Pump_2" : get_value(start_state, "Sump_Pump_2"),
-            "START_Activated_Flood_Control" : get_value(start_state, "Activated_Flood_Control"),
-            "START_Return_Water_Supply_Control" : get_value(start_state, "Return_Water_Supply_Control"),
-            "START_Gen_A_Status" : get_value(start_state, "Gen_A_Status"),
-            "START_Gen_B_Status" : get_value(start_state, "Gen_B_Status"),
-            "START_Tag_2" : get_value(start_state, "Tag_2"),
-            "START_HMI_Return_Feed" : get_value(start_state, "HMI_Return_Feed"),
-            
-            # Generator
-            "START_Gen_A_Active" : get_value(start_state, "Gen_A_Active"),
-            "START_Gen_A_Fan" : get_value(start_state, "Gen_A_Fan"),
-            "START_Gen_A_GreenLED" : get_value(start_state, "Gen_A_GreenLED"),
-            "START_Gen_A_Pump" : get_value(start_state, "Gen_A_Pump"),
-            "START_Gen_A_RedLED" : get_value(start_state, "Gen_A_RedLED"),
-            "START_Gen_A_Valve" : get_value(start_state, "Gen_A_Valve"),
-
-            "START_Gen_B_Active" : get_value(start_state, "Gen_B_Active"),
-            "START_Gen_B_Fan" : get_value(start_state, "Gen_B_Fan"),
-            "START_Gen_B_GreenLED" : get_value(start_state, "Gen_B_GreenLED"),
-            "START_Gen_B_Pump" : get_value(start_state, "Gen_B_Pump"),
-            "START_Gen_B_RedLED" : get_value(start_state, "Gen_B_RedLED"),
-            "START_Gen_B_Valve" : get_value(start_state, "Gen_B_Valve"),
-
-            # END values
-            # Control
-            "END_Flood_Gate_Valve" : get_value(end_state, "Flood_Gate_Valve"),
-            "END_Flood_Pump" : get_value(end_state, "Flood_Pump"),
-            "END_Sump_Valve" : get_value(end_state, "Sump_Valve"),
-            "END_Sump_Pump_1" : get_value(end_state, "Sump_Pump_1"),
-            "END_Sump_Pump_2" : get_value(end_state, "Sump_Pump_2"),
-            "END_Activated_Flood_Control" : get_value(end_state, "Activated_Flood_Control"),
-            "END_Return_Water_Supply_Control" : get_value(end_state, "Return_Water_Supply_Control"),
-            "END_Gen_A_Status" : get_value(end_state, "Gen_A_Status"),
-            "END_Gen_B_Status" : get_value(end_state, "Gen_B_Status"),
-            "END_Tag_2" : get_value(end_state, "Tag_2"),
-            "END_HMI_Return_Feed" : get_value(end_state, "HMI_Return_Feed"),
-            
-            # Generator
-            "END_Gen_A_Active" : get_value(end_state, "Gen_A_Active"),
-            "END_Gen_A_Fan" : get_value(end_state, "Gen_A_Fan"),
-            "END_Gen_A_GreenLED" : get_value(end_state, "Gen_A_GreenLED"),
-            "END_Gen_A_Pump" : get_value(end_state, "Gen_A_Pump"),
-            "END_Gen_A_RedLED" : get_value(end_state, "Gen_A_RedLED"),
-            "END_Gen_A_Valve" : get_value(end_state, "Gen_A_Valve"),
-        
-            "END_Gen_B_Active" : get_value(end_state, "Gen_B_Active"),
-            "END_Gen_B_Fan" : get_value(end_state, "Gen_B_Fan"),
-            "END_Gen_B_GreenLED" : get_value(end_state, "Gen_B_GreenLED"),
-            "END_Gen_B_Pump" : get_value(end_state, "Gen_B_Pump"),
-            "END_Gen_B_RedLED" : get_value(end_state, "Gen_B_RedLED"),
-            "END_Gen_B_Valve" : get_value(end_state, "Gen_B_Valve")
-            
-        }
-
-    # Constructs dictionary of state values associated with the placeholders in the Promela model
-    def generate_reachable_dictionary(self, state):
-        
-        # Helper function
-        def get_value(state, key):
-            value = state.get(key)
-
-            if type(value) == bool or (isinstance(value, float) and value in {0.0, 1.0}):
-                return int(value)
-            if value == None:
-                return "VALUE NOT FOUND"
-
-        # Create the dictionary
-        dictionary = {
-            # Reachable values
-            # Control
-            "REACHABLE_Flood_Gate_Valve" : get_value(state, "Flood_Gate_Valve"),
-            "REACHABLE_Flood_Pump" : get_value(state, "Flood_Pump"),
-            "REACHABLE_Sump_Valve" : get_value(state, "Sump_Valve"),
-            "REACHABLE_Sump_Pump_1" : get_value(state, "Sump_Pump_1"),
-            "REACHABLE_Sump_Pump_2" : get_value(state, "Sump_Pump_2"),
-            "REACHABLE_Activated_Flood_Control" : get_value(state, "Activated_Flood_Control"),
-            "REACHABLE_Return_Water_Supply_Control" : get_value(state, "Return_Water_Supply_Control"),
-            "REACHABLE_Gen_A_Status" : get_value(state, "Gen_A_Status"),
-            "REACHABLE_Gen_B_Status" : get_value(state, "Gen_B_Status"),
-            "REACHABLE_Tag_2" : get_value(state, "Tag_2"),
-            "REACHABLE_HMI_Return_Feed" : get_value(state, "HMI_Return_Feed"),
-            
-            # Generator
-            "REACHABLE_Gen_A_Active" : get_value(state, "Gen_A_Active"),
-            "REACHABLE_Gen_A_Fan" : get_value(state, "Gen_A_Fan"),
-            "REACHABLE_Gen_A_GreenLED" : get_value(state, "Gen_A_GreenLED"),
-            "REACHABLE_Gen_A_Pump" : get_value(state, "Gen_A_Pump"),
-            "REACHABLE_Gen_A_RedLED" : get_value(state, "Gen_A_RedLED"),
-            "REACHABLE_Gen_A_Valve" : get_value(state, "Gen_A_Valve"),
-
-            "REACHABLE_Gen_B_Active" : get_value(state, "Gen_B_Active"),
-            "REACHABLE_Gen_B_Fan" : get_value(state, "Gen_B_Fan"),
-            "REACHABLE_Gen_B_GreenLED" : get_value(state, "Gen_B_GreenLED"),
-            "REACHABLE_Gen_B_Pump" : get_value(state, "Gen_B_Pump"),
-            "REACHABLE_Gen_B_RedLED" : get_value(state, "Gen_B_RedLED"),
-            "REACHABLE_Gen_B_Valve" : get_value(state, "Gen_B_Valve")
-        }
-        return dictionary
-
-    def replace_values(self, filedata, dictionary):
-
-        # For every value in the dictionary, replace the key with the associated value
-        for key in dictionary:
+    # Returns: the compiled form of a template, parsed the first time it is used
+    def compiled_template(self, template_path, prefixes):
 
-            filedata = filedata.replace(key, str(dictionary[key]))
+        if template_path not in self.compiled_templates:
+            self.compiled_templates[template_path] = CompiledTemplate.from_file(template_path, self.state_columns, prefixes)
 
-        return filedata
+        return self.compiled_templates[template_path]
 
     def adjust_transition_template(self, start_state, end_state, thread_workspace):
 
         output_file = f"{thread_workspace}/hydro_transition.pml"
 
-        try:
-            with open(f"{thread_workspace}/hydro_transition_template.pml", 'r') as input_file:
-                filedata = input_file.read()
-
-            # Create dictionary of values to replace
-            replacement_dict = self.generate_transition_dictionary(start_state, end_state)
-
-            # Insert new values into promela model text
-            adjusted_model = self.replace_values(filedata, replacement_dict)
+        # Insert the values of both states into the promela model text
+        template = self.compiled_template(self.transition_template_path, ["START", "END"])
 
-            with open(output_file, 'w') as output:
-                output.write(adjusted_model)
+        try:
+            with self.timed("render"), open(output_file, 'w') as output:
+                output.write(template.render(start_state.get('state_id'), end_state.get('state_id')))
 
-        except Exception as e:
+        except OSError as e:
                 print(f"An error occurred while generating updated transition model: {e}")
 
     def adjust_state_template(self, state, thread_workspace):
 
         output_file = f"{thread_workspace}/hydro_state.pml"
 
-        try:
-            with open(f"{thread_workspace}/hydro_state_template.pml", 'r') as input_file:
-                filedata = input_file.read()
-
-            # Create dictionary of values to replace
-            replacement_dict = self.generate_reachable_dictionary(state)
+        # Insert the values of the state into the promela model text
+        template = self.compiled_template(self.state_template_path, ["REACHABLE"])
 
-            # Insert new values into promela model text
-            adjusted_model = self.replace_values(filedata, replacement_dict)
-
-            with open(output_file, 'w') as output:
-                output.write(adjusted_model)
+        try:
+            with self.timed("render"), open(output_file, 'w') as output:
+                output.write(template.render(state.get('state_id')))
 
-        except Exception as e:
+        except OSError as e:
                 print(f"An error occurred while generating updated state model: {e}")
 
     # Executes promela file at given path using SPIN through the command line.
-    # Matches output using regex to determine if transition is valid.
+    # Matches output using regex to determine if transition is valid, keeping pan's statistics for the check if one is given.
     # Returns: True if transition is valid, False if not.
-    def run_spin(self, file, thread_workspace):
+    def run_spin(self, file, thread_workspace, check=None):
 
         if not os.path.exists(os.path.join(thread_workspace, file)):
             print(f"Error: The file '{file}' does not exist.")
 
+        # Checks without a check are conformance runs of the transition template
+        profiles = self.profiles_for(self.check_template_path(check[0] if check is not None else "transition"))
+
         # Run subprocess command to execute SPIN from the command line
         try:
             # Generate PAN verifier from promela specification
-            pan_gen = run(["spin", "-a", file], cwd=thread_workspace, capture_output=True) 
-
-            # Compile PAN verifier
-            pan_comp = run(["gcc", "-DMEMLIM=4096", "-O2", "-w", "-o", "pan", "pan.c"], cwd=thread_workspace) 
-            # Run PAN verifier with options for max search depth, weak fairness and set memory limit.
-            pan_search = run(["pan", "-m100000"], capture_output=True, shell=True, text=True, cwd=thread_workspace) 
-            # Check if pan subprocess was successful
-            if pan_search.returncode != 0:
-                print(f"Error running PAN: {pan_search.stderr}")
-                return
-            else:
+            with self.timed("spin"):
+                pan_gen = run(["spin", "-a", file], cwd=thread_workspace, capture_output=True) 
+
+            # Compile and run the PAN verifier with each profile until a search is conclusive
+            for position, profile in enumerate(profiles):
+                cores = self.search_cores_for(check)
+                with self.timed("gcc"):
+                    pan_comp = run(profile.gcc_arguments(extra_defines=self.multicore_defines(cores)), cwd=thread_workspace) 
+                # Run PAN verifier with the profile's options for max search depth and hash size
+                with self.timed("pan"):
+                    if cores > 1 and self.multicore_mode == "swarm":
+                        pan_search = self.run_swarm("pan", profile, cores, thread_workspace)
+                    else:
+                        pan_search = run(["./pan", *profile.pan_arguments()], capture_output=True, text=True, cwd=thread_workspace)
+                verdict = self.interpret_pan_output(pan_search, check, profile)
+
+                if not self.escalates(profiles, position, verdict, pan_search, check):
+                    return verdict
+
+        except SubprocessError as e:
+            print(e.stderr)
+
+    # Reads the verdict from a completed pan search, and its statistics if the search was for a check.
+    # check is ("state", state_id) or ("transition", previous_state_id, next_state_id), profile the VerificationProfile searched with.
+    # Returns: True if pan found the counterexample, False if not, None if pan failed.
+    def interpret_pan_output(self, pan_search, check=None, profile=None):
+
+        # Check if pan subprocess was successful
+        if pan_search.returncode != 0:
+            print(f"Error running PAN: {pan_search.stderr}")
+            return
+        else:
+            with self.timed("parse"):
                 # Search SPIN output for the absence of error trails
                 # SPIN generates an error (the counterexample that we want) if the state was reached
                 result = re.search("errors: 1", pan_search.stdout)
                 #print(pan_search.stdout)
 
-                # Therefore if an error is found then the transition is valid
-                if result:
-                    return True
-                else:
-                    return False
+                if check is not None:
+                    self.record_pan_statistics(check, bool(result), pan_search.stdout, profile)
+
+            # Therefore if an error is found then the transition is valid
+            if result:
+                return True
+            else:
+                return False
+
+    # Keeps the statistics of a pan search with the check it answered.
+    # check is ("state", state_id), ("transition", previous_state_id, next_state_id) or ("batch", previous_state_id, next_state_id, size)
+    # for a batch identified by its first transition. The record keeps the profile searched with and its estimated coverage.
+    def record_pan_statistics(self, check, verdict, pan_stdout, profile=None):
+
+        record = {
+            "check": check[0],
+            "state": int(check[1]),
+            "next_state": int(check[2]) if len(check) > 2 else None,
+            "checks": int(check[3]) if len(check) > 3 else 1,
+            "verdict": verdict,
+        }
+        record.update(parse_pan_output(pan_stdout))
+        record["profile"] = profile.name if profile is not None else None
+        record["coverage"] = profile.coverage(record) if profile is not None else None
+
+        with self.lock:
+            self.check_statistics.append(record)
+
+    # Returns: the statistics recorded since the last call, so a worker can send them to the main process
+    def take_check_statistics(self):
+
+        with self.lock:
+            statistics = self.check_statistics
+            self.check_statistics = []
+        return statistics
+
+    # Writes the statistics of the pan searches recorded since the last call next to a file's results, and prints their summary.
+    # With a results store, the evaluation's verdicts and statistics are also added to it as a run of the file.
+    def write_check_statistics(self, file):
+
+        statistics = self.take_check_statistics()
+        summary = write_statistics(statistics, file)
+        print(summary)
+
+        if self.results_store is not None:
+            self.store_results(file, statistics)
+
+    # Adds the verdicts in the tables and the statistics of an evaluation of a file to the results store
+    def store_results(self, file, statistics):
+
+        settings = {
+            "verification_profiles": self.verification_profiles,
+            "precompiled": self.precompiled,
+            "batch_size": self.batch_size,
+            "projection": self.projection,
+            "native_engine": self.engine is not None,
+            "reachability_bitmap": self.reachability is not None,
+        }
+        run_id = self.results_store.add_run(os.path.basename(file), self.state_template_path, self.transition_template_path, self.state_columns,
+                                            self.states, self.transitions, statistics, settings)
+
+        print(f"Results of {file} stored as run {run_id} in '{self.results_store.path}'.")
+
+    # Writes a copy of the template where the placeholders are read by pan at start-up instead of being substituted into the text.
+    # START_ placeholders become the initial value of the variable they are named after, all other placeholders
+    # (END_, REACHABLE_) are declared as global variables that keep their value for the whole search.
+    # The assignments are written to a C file that pan includes in its initialisation of globals through -DPROV.
+    def generate_parametric_model(self, template_path, placeholders, model_name, thread_workspace):
+
+        with open(template_path, 'r') as input_file:
+            filedata = input_file.read()
+
+        declarations = []
+        assignments = []
+
+        for index, placeholder in enumerate(placeholders):
+            # Templates only use some of the placeholders, e.g. the trunk template has no START_ values
+            if re.search(rf"\b{placeholder}\b", filedata) is None:
+                continue
+
+            prefix, variable = placeholder.split("_", 1)
+
+            if prefix == "START":
+                # Global initialisers must be constants, the real value is assigned before the search starts
+                filedata = re.sub(rf"\b{placeholder}\b", "0", filedata)
+                assignments.append(f"\tnow.{variable} = valuation[{index}] - '0';")
+            else:
+                declarations.append(f"bool {placeholder};")
+                assignments.append(f"\tnow.{placeholder} = valuation[{index}] - '0';")
+
+        with open(os.path.join(thread_workspace, f"{model_name}.pml"), 'w') as output:
+            output.write("/* Placeholder values, assigned by pan at start-up */\n" + "\n".join(declarations) + "\n\n" + filedata)
+
+        provisioning = (
+            f"/* Reads the values of the model placeholders from {self.valuation_variable}, one character ('0' or '1') per placeholder */\n"
+            "{\n"
+            f"\tchar *valuation = getenv(\"{self.valuation_variable}\");\n"
+            f"\tif (valuation == NULL || strlen(valuation) != {len(placeholders)})\n"
+            "\t{\n"
+            f"\t\tprintf(\"pan: {self.valuation_variable} must hold {len(placeholders)} values\\n\");\n"
+            "\t\texit(1);\n"
+            "\t}\n"
+            + "\n".join(assignments) + "\n"
+            "}\n"
+        )
+
+        with open(os.path.join(thread_workspace, f"{model_name}_valuation.c"), 'w') as output:
+            output.write(provisioning)
+
+    # Generates and compiles a pan verifier for a template once, so that each check only needs to run it.
+    # One verifier is built per verification profile, named {model_name}_{profile}.
+    # Returns: True if the verifiers were built.
+    def precompile_pan(self, template_path, placeholders, model_name, thread_workspace):
+
+        try:
+            self.generate_parametric_model(template_path, placeholders, model_name, thread_workspace)
+
+            # Generate PAN verifier from promela specification
+            pan_gen = run(["spin", "-a", f"{model_name}.pml"], cwd=thread_workspace, capture_output=True)
+
+            # Compile PAN verifiers, including the code that loads the valuation at start-up
+            # State verifiers are built for the most cores a search may get, as the core count of -DNCORE is fixed when compiled
+            cores = self.max_search_cores() if model_name == "pan_state" else 1
+            pan_comps = [
+                run(profile.gcc_arguments(f"{model_name}_{profile.name}", [f'-DPROV="{model_name}_valuation.c"', *self.multicore_defines(cores)]), cwd=thread_workspace)
+                for profile in self.profiles_for(template_path)
+            ]
+
+            if pan_gen.returncode != 0 or any(pan_comp.returncode != 0 for pan_comp in pan_comps):
+                print(f"Error: Could not build precompiled verifier '{model_name}' from '{template_path}'.")
+                return False
+            return True
+
+        except (OSError, SubprocessError) as e:
+            print(f"An error occurred while precompiling '{template_path}': {e}")
+            return False
+
+    # Builds the state and transition verifiers used by a workspace when running precompiled.
+    # Each verifier is tracked on its own in precompiled_ready, so a missing template only affects its own kind of check.
+    # Returns: True if any verifier was built.
+    def prepare_precompiled_workspace(self, thread_workspace):
+
+        models = [
+            ("pan_state", self.state_template_path, self.state_placeholders),
+            ("pan_transition", self.transition_template_path, self.transition_placeholders),
+        ]
+
+        # The verifiers are compiled one after another as both generate pan.c in the workspace
+        for model_name, template_path, placeholders in models:
+            if not os.path.exists(template_path):
+                print(f"Template '{template_path}' does not exist, {model_name} checks are compiled per check.")
+                self.precompiled_ready[model_name] = False
+            else:
+                self.precompiled_ready[model_name] = self.precompile_pan(template_path, placeholders, model_name, thread_workspace)
+                if not self.precompiled_ready[model_name]:
+                    print(f"Error: Precompiled verifier '{model_name}' unavailable, falling back to compiling each of its checks.")
+
+        return any(self.precompiled_ready.values())
+
+    # Returns: True if checks of a model ("pan_state" or "pan_transition") run its precompiled verifier
+    def uses_precompiled(self, model_name):
+        return self.precompiled and self.precompiled_ready.get(model_name, False)
+
+    # Runs the precompiled verifiers of a model with the given valuation string, escalating through the profiles like run_spin,
+    # and keeps pan's statistics for the check if one is given.
+    # Returns: True if the counterexample was found, False if not, None if pan failed.
+    def run_precompiled_pan(self, model_name, valuation, thread_workspace, check=None):
+
+        # Valuation is passed through the environment so the compiled verifier can be reused for every check
+        env = dict(os.environ)
+        env[self.valuation_variable] = valuation
+
+        profiles = self.profiles_for(self.check_template_path("state" if model_name == "pan_state" else "transition"))
+
+        try:
+            for position, profile in enumerate(profiles):
+                cores = self.search_cores_for(check) if model_name == "pan_state" else 1
+                # Run PAN verifier with the same search options as run_spin
+                with self.timed("pan"):
+                    if cores > 1 and self.multicore_mode == "swarm":
+                        pan_search = self.run_swarm(f"{model_name}_{profile.name}", profile, cores, thread_workspace, env)
+                    else:
+                        pan_search = run([f"./{model_name}_{profile.name}", *profile.pan_arguments()], capture_output=True, text=True, cwd=thread_workspace, env=env)
+                verdict = self.interpret_pan_output(pan_search, check, profile)
+
+                if not self.escalates(profiles, position, verdict, pan_search, check):
+                    return verdict
 
         except SubprocessError as e:
             print(e.stderr)
 
-    # Saves copy of transition promela file using transition indexes
-    def save_transition_model(self, prefix, previous_state, next_state, thread_workspace):
-    
-        saving_path = os.path.join(os.getcwd(), "spin_models", "generated_models", f"_{prefix}_{previous_state.get('state_id')}--{next_state.get('state_id')}.pml")
+    # Flattens the values of a transition's placeholders into the string read by the precompiled transition verifier
+    def transition_valuation(self, start_state, end_state):
+        return self.state_valuation(start_state) + self.state_valuation(end_state)
+
+    # Flattens the values of a state's placeholders into the string read by the precompiled state verifier.
+    # The placeholders are in state_columns order, the same order as the bits of the state id.
+    def state_valuation(self, state):
+        return format(state.get('state_id'), f'0{len(self.state_columns)}b')
 
-        # Check if Promela file exists
-        if not os.path.exists(self.transition_promela_path):
-            print(f"Error: The file '{self.transition_promela_path}' does not exist.")
+    # Sets the pan verification profiles checks are run with, in escalation order, and the bitstate hash size
+    def use_verification_profiles(self, names, hash_size=DEFAULT_HASH_SIZE):
+
+        unknown = [name for name in names if name not in PROFILE_NAMES]
+        if not names or unknown:
+            raise ValueError(f"Unknown verification profiles {unknown}, expected some of {PROFILE_NAMES}.")
+
+        self.verification_profiles = list(names)
+        self.hash_size = hash_size
+        self.template_profiles = {}
+
+        print(f"Verifying with pan profiles: {' -> '.join(self.verification_profiles)}")
+
+    # Returns: the template the models of a check kind ("state", "transition" or "batch") are rendered from
+    def check_template_path(self, kind):
+        return self.state_template_path if kind == "state" else self.transition_template_path
+
+    # The safety profile leaves out the checks a liveness property needs, so it is dropped for a template whose property is not a safety property.
+    # Returns: the VerificationProfiles the models of a template are checked with, in escalation order.
+    def profiles_for(self, template_path):
+
+        if template_path not in self.template_profiles:
+            profiles = make_profiles(self.hash_size)
+            names = self.verification_profiles
+
+            if "safety" in names and os.path.exists(template_path):
+                with open(template_path, 'r') as input_file:
+                    ltl_formula = self.split_ltl_block(input_file.read())[1]
+                if not is_safety_property(ltl_formula):
+                    print(f"Warning: The property of '{template_path}' is not a safety property, its models are not checked with the safety profile.")
+                    names = [name for name in names if name != "safety"] or ["exhaustive"]
+
+            self.template_profiles[template_path] = [profiles[name] for name in names]
+
+        return self.template_profiles[template_path]
+
+    # Decides whether a check's search with profiles[position] is verified again with the next profile
+    # Returns: True if the search was inconclusive and there is a profile left to escalate to.
+    def escalates(self, profiles, position, verdict, pan_search, check):
+
+        if position + 1 >= len(profiles) or not profiles[position].inconclusive(verdict, pan_search.stdout or ""):
+            return False
+
+        print(f"Search of {check} with the {profiles[position].name} profile was inconclusive, verifying with {profiles[position + 1].name}.")
+        return True
+
+    # Verdicts of an escalation that ends with a bitstate or hash-compact search can miss a counterexample
+    # Returns: True if every verdict is exact.
+    def exact_verdicts(self):
+        return make_profiles(self.hash_size)[self.verification_profiles[-1]].exact
+
+    # Sets how many cores the pan search of a state check may use, a number or "auto", and whether they run one multi-core
+    # search ("ncore") or a swarm of diversified searches ("swarm")
+    def use_multicore_search(self, cores, mode="ncore"):
+
+        if mode not in ("ncore", "swarm"):
+            raise ValueError(f"Unknown multi-core search mode '{mode}', expected 'ncore' or 'swarm'.")
+        if cores != "auto" and int(cores) < 1:
+            raise ValueError(f"A search needs at least one core, got {cores}.")
+
+        self.search_cores = cores if cores == "auto" else int(cores)
+        self.multicore_mode = mode
+
+        print(f"State checks search with {'a share of the idle' if cores == 'auto' else self.search_cores} cores ({mode}).")
+
+    # Returns: the most cores a state check's search may use
+    def max_search_cores(self):
+        return (os.cpu_count() or 1) if self.search_cores == "auto" else self.search_cores
+
+    # With "auto", a check gets an equal share of the cores with the other checks running, so a single check in live
+    # monitoring uses every core while a full evaluation keeps one core per worker.
+    # Returns: the number of cores the pan search of a check may use, 1 for anything but a state check.
+    def search_cores_for(self, check):
+
+        if check is None or check[0] != "state" or self.search_cores == 1:
+            return 1
+        if self.search_cores != "auto":
+            return self.search_cores
+
+        running = self.running_checks.value if self.running_checks is not None else 1
+        return max(1, self.max_search_cores() // max(1, running))
+
+    # Counts a check as running while it is checked, for the "auto" share of cores
+    @contextmanager
+    def running_check(self):
+
+        if self.running_checks is None:
+            yield
+            return
+
+        with self.running_checks.get_lock():
+            self.running_checks.value += 1
+        try:
+            yield
+        finally:
+            with self.running_checks.get_lock():
+                self.running_checks.value -= 1
+
+    # Swarm searches are compiled to pick transitions and processes in a random order, seeded by each search's -RS option
+    # Returns: the extra gcc defines of a verifier searching on the given number of cores.
+    def multicore_defines(self, cores):
+
+        if cores <= 1:
+            return []
+        if self.multicore_mode == "swarm":
+            return ["-DT_RAND", "-DP_RAND"]
+        return [f"-DNCORE={cores}"]
+
+    # Runs a swarm of searches of a verifier at once, one per core, each with its own random seed and hash function so they
+    # explore the state space in a different order. The first counterexample found ends the swarm. With an exact profile,
+    # so does the first search to finish without one, as it covered the whole state space.
+    # Returns: the completed search that decides the verdict, or the first to fail if none of them does.
+    def run_swarm(self, verifier, profile, cores, thread_workspace, env=None):
+
+        program = os.path.abspath(os.path.join(thread_workspace or ".", verifier))
+        running = [
+            Popen([program, *profile.pan_arguments(), f"-RS{seed}", f"-h{seed}"], stdout=PIPE, stderr=PIPE, text=True, cwd=thread_workspace, env=env)
+            for seed in range(1, cores + 1)
+        ]
+        completed = []
+
+        try:
+            while running:
+                for search in [search for search in running if search.poll() is not None]:
+                    running.remove(search)
+                    stdout, stderr = search.communicate()
+                    pan_search = CompletedProcess(search.args, search.returncode, stdout, stderr)
+                    completed.append(pan_search)
+
+                    verdict = re.search("errors: 1", stdout) is not None if search.returncode == 0 else None
+                    if not profile.inconclusive(verdict, stdout):
+                        return pan_search
+
+                time.sleep(SWARM_POLL_SECONDS)
+        finally:
+            # The rest of the swarm can only confirm the verdict
+            for search in running:
+                search.kill()
+                search.wait()
+
+        # No search was conclusive: a clean search gives the inexact verdict, otherwise the swarm failed
+        return next((pan_search for pan_search in completed if pan_search.returncode == 0), completed[0])
+
+    # Splits the ltl block from the end of a template.
+    # Returns: the model text without the ltl block, and the text inside the block's braces.
+    def split_ltl_block(self, filedata):
+
+        match = re.search(r"ltl\s+\w+\s*\{", filedata)
+        if match is None:
+            return filedata, ""
+
+        # Find the brace closing the block
+        depth = 0
+        for position in range(match.end() - 1, len(filedata)):
+            if filedata[position] == "{":
+                depth += 1
+            elif filedata[position] == "}":
+                depth -= 1
+                if depth == 0:
+                    return filedata[:match.start()] + filedata[position + 1:], filedata[match.end():position]
+
+        return filedata[:match.start()], filedata[match.end():]
+
+    # Bit mask over state ids of the variables a template's ltl property compares with their placeholder value
+    def property_mask(self, template_path, prefix):
+
+        with open(template_path, 'r') as input_file:
+            _, ltl_body = self.split_ltl_block(input_file.read())
+
+        num_bits = len(self.state_columns)
+        property_mask = 0
+        for i, column in enumerate(self.state_columns):
+            if re.search(rf"\b{column}\s*==\s*{prefix}_{column}\b", ltl_body):
+                property_mask |= 1 << (num_bits - 1 - i)
+
+        return property_mask
+
+    # Bit mask over state ids of the variables the transition template's ltl property compares with their END_ value
+    def transition_property_mask(self):
+
+        return self.property_mask(self.transition_template_path, "END")
+
+    # Bit mask over state ids of the variables the state template's ltl property compares with their REACHABLE_ value
+    def state_property_mask(self):
+
+        return self.property_mask(self.state_template_path, "REACHABLE")
+
+    # C expression packing the current values of the state variables into a state id, in the same bit order as get_state_from_index
+    def state_id_expression(self):
+
+        num_bits = len(self.state_columns)
+        return " | ".join(f"((unsigned int) now.{column} << {num_bits - 1 - i})" for i, column in enumerate(self.state_columns))
+
+    # Writes a single model that checks a whole chunk of transitions.
+    # The distinct start states are embedded as a table and init picks one nondeterministically, so one search covers
+    # every start state. The template's ltl property is replaced by a never claim that compares each visited state
+    # against the end states listed for the chosen start, printing the index of every end state it reaches.
+    # Returns: the start states and, for each of them, the list of end states in the order they are indexed.
+    def generate_batch_transition_model(self, pairs, model_name, thread_workspace):
+
+        with open(self.transition_template_path, 'r') as input_file:
+            filedata = input_file.read()
+
+        filedata, ltl_body = self.split_ltl_block(filedata)
+
+        # Only the variables constrained by the template's property are compared
+        num_bits = len(self.state_columns)
+        property_mask = self.transition_property_mask()
+
+        # Start values are loaded from the table, so the initialisers become constants
+        for column in self.state_columns:
+            filedata = re.sub(rf"\bSTART_{column}\b", "0", filedata)
+
+        # Group end states by start state so every start is explored once
+        ends_by_start = {}
+        for previous_state, next_state in pairs:
+            ends = ends_by_start.setdefault(int(previous_state), [])
+            if int(next_state) not in ends:
+                ends.append(int(next_state))
+
+        starts = list(ends_by_start)
+        offsets = [0]
+        ends = []
+        for start in starts:
+            ends.extend(ends_by_start[start])
+            offsets.append(len(ends))
+
+        load_start = "\n".join(f"\t\t\tnow.{column} = (hydro_starts[now.Start_Index] >> {num_bits - 1 - i}) & 1;" for i, column in enumerate(self.state_columns))
+
+        batch_declarations = (
+            "/* Transition batch, generated by spin_controller.py */\n"
+            "int Start_Index;\n"
+            "bool Start_Loaded = false;\n"
+            "\n"
+            "c_decl {\n"
+            f"\tstatic const unsigned int hydro_starts[{len(starts)}] = {{{', '.join(map(str, starts))}}};\n"
+            f"\tstatic const unsigned int hydro_end_offsets[{len(offsets)}] = {{{', '.join(map(str, offsets))}}};\n"
+            f"\tstatic const unsigned int hydro_ends[{len(ends)}] = {{{', '.join(map(str, ends))}}};\n"
+            f"\tstatic unsigned char hydro_reported[{len(ends)}];\n"
+            "\n"
+            "\t/* Prints each end state of the start state that matches the valuation, once per search */\n"
+            "\tstatic int hydro_batch_check(int start, unsigned int valuation)\n"
+            "\t{\n"
+            "\t\tunsigned int i;\n"
+            "\t\tfor (i = hydro_end_offsets[start]; i < hydro_end_offsets[start + 1]; i++)\n"
+            "\t\t{\n"
+            f"\t\t\tif (!hydro_reported[i] && ((valuation ^ hydro_ends[i]) & {property_mask}u) == 0)\n"
+            "\t\t\t{\n"
+            "\t\t\t\thydro_reported[i] = 1;\n"
+            "\t\t\t\tprintf(\"BATCH_REACHED %u\\n\", i);\n"
+            "\t\t\t}\n"
+            "\t\t}\n"
+            "\t\treturn 0;\n"
+            "\t}\n"
+            "}\n\n"
+        )
+
+        # Pick the start state before any process runs
+        batch_init = (
+            "init{\n"
+            "\tatomic {\n"
+            f"\t\tselect(Start_Index : 0 .. {len(starts) - 1});\n"
+            "\t\tc_code {\n"
+            f"{load_start}\n"
+            "\t\t};\n"
+            "\t\tStart_Loaded = true\n"
+            "\t};\n"
+        )
+        filedata = re.sub(r"init\s*\{", lambda match: batch_init, filedata, count=1)
+
+        # Observes every state of the search in the same way the ltl property would, without ever failing
+        batch_claim = (
+            "\nnever {\n"
+            "\tdo\n"
+            f"\t:: c_expr {{ now.Start_Loaded && hydro_batch_check(now.Start_Index, {self.state_id_expression()}) }} -> skip\n"
+            "\t:: else -> skip\n"
+            "\tod\n"
+            "}\n"
+        )
+
+        with open(os.path.join(thread_workspace, f"{model_name}.pml"), 'w') as output:
+            output.write(batch_declarations + filedata + batch_claim)
+
+        return starts, [ends_by_start[start] for start in starts]
+
+    # Verifies a chunk of transitions with one generated model and one pan search.
+    # Batches are not escalated, they are searched with the last profile so their verdicts are as exact as an escalated check's.
+    # Returns: dictionary of (previous_state, next_state) -> True/False, or None for every pair if pan failed.
+    def run_spin_batch(self, pairs, thread_workspace):
+
+        model_name = "hydro_batch"
+        profile = self.profiles_for(self.check_template_path("batch"))[-1]
+        with self.timed("render"):
+            starts, ends = self.generate_batch_transition_model(pairs, model_name, thread_workspace)
+
+        try:
+            # Generate, compile and run the PAN verifier once for the whole chunk
+            with self.timed("spin"):
+                pan_gen = run(["spin", "-a", f"{model_name}.pml"], cwd=thread_workspace, capture_output=True)
+            with self.timed("gcc"):
+                pan_comp = run(profile.gcc_arguments(), cwd=thread_workspace)
+            with self.timed("pan"):
+                pan_search = run(["./pan", *profile.pan_arguments()], capture_output=True, text=True, cwd=thread_workspace)
+
+        except SubprocessError as e:
+            print(e.stderr)
+            return {(int(previous_state), int(next_state)): None for previous_state, next_state in pairs}
+
+        if pan_search.returncode != 0:
+            print(f"Error running PAN: {pan_search.stderr}")
+            return {(int(previous_state), int(next_state)): None for previous_state, next_state in pairs}
+
+        with self.timed("parse"):
+            reached = {int(index) for index in re.findall(r"BATCH_REACHED (\d+)", pan_search.stdout)}
+            self.record_pan_statistics(("batch", pairs[0][0], pairs[0][1], len(pairs)), None, pan_search.stdout, profile)
+
+        results = {}
+        index = 0
+        for start, start_ends in zip(starts, ends):
+            for end in start_ends:
+                results[(start, end)] = index in reached
+                index += 1
+
+        return results
+
+    # Writes a copy of the state template that enumerates its reachable set in a single search.
+    # The ltl property is replaced by a never claim that packs every visited state into a state id and prints each id
+    # the first time it is seen, so the search never fails and covers the whole state space.
+    def generate_reachable_set_model(self, model_name, thread_workspace):
+
+        with open(self.state_template_path, 'r') as input_file:
+            filedata, _ = self.split_ltl_block(input_file.read())
+
+        num_bits = len(self.state_columns)
+
+        enumeration_declarations = (
+            "/* Reachable set enumeration, generated by spin_controller.py */\n"
+            "c_decl {\n"
+            f"\tstatic unsigned char hydro_seen[{(1 << num_bits) // 8}];\n"
+            "\n"
+            "\t/* Prints a state id the first time the search visits it */\n"
+            "\tstatic int hydro_record_state(unsigned int state_id)\n"
+            "\t{\n"
+            "\t\tif (!(hydro_seen[state_id >> 3] & (1 << (state_id & 7))))\n"
+            "\t\t{\n"
+            "\t\t\thydro_seen[state_id >> 3] |= 1 << (state_id & 7);\n"
+            "\t\t\tprintf(\"STATE_REACHED %u\\n\", state_id);\n"
+            "\t\t}\n"
+            "\t\treturn 0;\n"
+            "\t}\n"
+            "}\n\n"
+        )
+
+        # Observes every state of the search without ever failing
+        enumeration_claim = (
+            "\nnever {\n"
+            "\tdo\n"
+            f"\t:: c_expr {{ hydro_record_state({self.state_id_expression()}) }} -> skip\n"
+            "\t:: else -> skip\n"
+            "\tod\n"
+            "}\n"
+        )
+
+        with open(os.path.join(thread_workspace, f"{model_name}.pml"), 'w') as output:
+            output.write(enumeration_declarations + filedata + enumeration_claim)
+
+    # Runs one search of the state template, collecting the id of every state it visits.
+    # The search uses the last of the state template's profiles, the most exact one, like a batch.
+    # Returns: list of reachable state ids, or None if pan failed.
+    def enumerate_reachable_states(self, thread_workspace):
+
+        model_name = "hydro_reachable"
+        profile = self.profiles_for(self.state_template_path)[-1]
+        self.generate_reachable_set_model(model_name, thread_workspace)
+
+        if not profile.exact:
+            print(f"Warning: Enumerating the reachable set with the {profile.name} profile, states it misses are left out of the bitmap.")
+
+        try:
+            pan_gen = run(["spin", "-a", f"{model_name}.pml"], cwd=thread_workspace, capture_output=True)
+            pan_comp = run(profile.gcc_arguments(), cwd=thread_workspace)
+            pan_search = run(["./pan", *profile.pan_arguments()], capture_output=True, text=True, cwd=thread_workspace)
+
+        except SubprocessError as e:
+            print(e.stderr)
+            return
+
+        if pan_search.returncode != 0:
+            print(f"Error running PAN: {pan_search.stderr}")
+            return
+
+        return [int(state_id) for state_id in re.findall(r"STATE_REACHED (\d+)", pan_search.stdout)]
+
+    # Enumerates the reachable set of the state template with SPIN and saves it as a bitmap over state ids.
+    # Variables the template's property does not compare are set either way, so a lookup gives the same verdict as a check.
+    def build_reachability_bitmap(self, bitmap_path):
+
+        from reachability_bitmap import ReachabilityBitmap, expand_dont_care_bits
+        from verdict_cache import template_hash
+
+        if not os.path.exists(self.state_template_path):
+            print(f"Error: Cannot build a reachability bitmap, '{self.state_template_path}' does not exist.")
+            return
+
+        # The search gets its own workspace, so it never collides with the checks of this or another run
+        build_workspace = os.path.join(self.workspace_root, f"reachability_{os.getpid()}")
+        os.makedirs(build_workspace, exist_ok=True)
+        build_start = datetime.now(timezone.utc)
+
+        try:
+            state_ids = self.enumerate_reachable_states(build_workspace)
+        finally:
+            shutil.rmtree(build_workspace, ignore_errors=True)
+
+        if state_ids is None:
+            print(f"Error: Could not enumerate the reachable states of '{self.state_template_path}'.")
+            return
+
+        # A template instance without REACHABLE_ placeholders compares nothing, so every variable is kept
+        property_mask = self.state_property_mask() or (1 << len(self.state_columns)) - 1
+        verdict_ids = expand_dont_care_bits(state_ids, property_mask, len(self.state_columns))
+        bitmap = ReachabilityBitmap.create(bitmap_path, verdict_ids, len(self.state_columns), template_hash(self.state_template_path))
+
+        print(f"Reachability bitmap: {len(state_ids)} states reached, {len(verdict_ids)} state ids marked reachable, built in {datetime.now(timezone.utc) - build_start}.")
+        return bitmap
+
+    # Loads the reachability bitmap used to answer state checks in place of SPIN, building it first if it does not exist.
+    # A bitmap built from another version of the state template, or whose template is unknown, is built again from the current one.
+    # When the state template is missing, the bitmap cannot be checked against it and is not used.
+    def use_reachability_bitmap(self, bitmap_path):
+
+        from reachability_bitmap import ReachabilityBitmap
+        from verdict_cache import template_hash
+
+        self.reachability = None
+
+        if not os.path.exists(self.state_template_path):
+            print(f"Error: '{self.state_template_path}' does not exist, the reachability bitmap '{bitmap_path}' cannot be checked against it and is not used.")
+            return
+
+        if os.path.exists(bitmap_path):
+            bitmap = ReachabilityBitmap(bitmap_path, len(self.state_columns))
+            if bitmap.template_hash == template_hash(self.state_template_path):
+                self.reachability = bitmap
+                print(f"Loaded reachability bitmap from path: {bitmap_path}")
+                return
+            print(f"Reachability bitmap '{bitmap_path}' was not built from the current '{self.state_template_path}', building it again.")
+
+        self.reachability = self.build_reachability_bitmap(bitmap_path)
+
+    # Proves which templates give the same verdicts when the generators are swapped, and reduces the checks of those templates.
+    # The transition proof uses the native engine, the state proof the reachability bitmap. Templates that are not proven are not reduced.
+    def use_symmetry_reduction(self):
+
+        from generator_symmetry import GeneratorSymmetry
+        from verdict_cache import template_hash
+
+        symmetry = GeneratorSymmetry(self.state_columns)
+
+        if self.engine is not None:
+            engine = self.engine
         else:
-            # No need to check if saving_path exists as we are creating a new file
-            try:
-                shutil.copy(f"{thread_workspace}/hydro_transition.pml", saving_path)
+            from hydro_engine import HydroBranchEngine
+            engine = HydroBranchEngine()
+        symmetry.prove_transitions(engine, self.transition_property_mask(), template_hash(self.transition_template_path))
+
+        if self.reachability is not None:
+            symmetry.prove_states(self.reachability, self.state_property_mask(), template_hash(self.state_template_path))
+        else:
+            print("Symmetry: no reachability bitmap to prove the state template with, state checks are not reduced.")
+
+        # Projected states must stay projected when swapped, so a canonical task is its own canonical task
+        if not all(symmetry.preserves_mask(mask) for mask in self.projection_masks("transition")):
+            print("Symmetry: the transition template's placeholders do not treat both generators alike.")
+            symmetry.transitions_proven = None
+        if not all(symmetry.preserves_mask(mask) for mask in self.projection_masks("state")):
+            print("Symmetry: the state template's placeholders do not treat both generators alike.")
+            symmetry.states_proven = None
+
+        self.enable_symmetry(symmetry.states_proven, symmetry.transitions_proven)
+        print(f"Symmetry reduction: transitions {'reduced' if self.symmetric_transitions else 'not reduced'}, states {'reduced' if self.symmetric_states else 'not reduced'}.")
+
+    # Turns on the reduction for templates already proven symmetric, e.g. in a worker process.
+    # states and transitions are the SHA-256 of the templates the proofs were made for, None if not proven. A template whose file
+    # no longer has that hash is checked without the reduction, as its verdicts may no longer be the same for a state and its swap.
+    def enable_symmetry(self, states, transitions):
+
+        from generator_symmetry import GeneratorSymmetry
+        from verdict_cache import template_hash
+
+        self.symmetric_states = None
+        self.symmetric_transitions = None
+
+        for kind, proven_hash, template_path in (("state", states, self.state_template_path), ("transition", transitions, self.transition_template_path)):
+            if not proven_hash:
+                continue
+            if not os.path.exists(template_path) or template_hash(template_path) != proven_hash:
+                print(f"Symmetry: '{template_path}' has changed since it was proven symmetric, {kind} checks are not reduced.")
+                continue
+            setattr(self, f"symmetric_{kind}s", proven_hash)
+
+        self.symmetry = GeneratorSymmetry(self.state_columns) if self.symmetric_states or self.symmetric_transitions else None
+
+    # Bit masks of the variables that each state id of a template is rendered into, one mask per placeholder prefix.
+    # States that only differ outside the masks render to the same model text, so they have the same verdict.
+    # Returns: the masks, with every bit set if projection is off or the template is missing.
+    def projection_masks(self, kind):
+
+        template_path, prefixes = (self.state_template_path, ["REACHABLE"]) if kind == "state" else (self.transition_template_path, ["START", "END"])
+        all_bits = (1 << len(self.state_columns)) - 1
+
+        if not self.projection or not os.path.exists(template_path):
+            return [all_bits] * len(prefixes)
+
+        return self.compiled_template(template_path, prefixes).dependency_masks()
+
+    # Returns: the task that is verified in place of a task, ("state", state) or ("transition", previous_state, next_state) with the canonical ids.
+    # The ids are projected onto the variables the template depends on, then replaced by their generator swap if that is smaller.
+    def canonical_task(self, task):
+
+        if task[0] == "state":
+            state_mask, = self.projection_masks("state")
+            state = int(task[1]) & state_mask
+            if self.symmetric_states:
+                state = self.symmetry.canonical_state(state)
+            return ("state", state)
+
+        if task[0] == "transition":
+            start_mask, end_mask = self.projection_masks("transition")
+            previous_state, next_state = int(task[1]) & start_mask, int(task[2]) & end_mask
+            if self.symmetric_transitions:
+                previous_state, next_state = self.symmetry.canonical_transition(previous_state, next_state)
+            return ("transition", previous_state, next_state)
+
+        return task
+
+    # Answers a task without running SPIN, see check_known_state and check_known_transition
+    def check_known_task(self, task):
+
+        if task[0] == "state":
+            return self.check_known_state(self.get_state_from_index(int(task[1])))
+        return self.check_known_transition(self.get_state_from_index(int(task[1])), self.get_state_from_index(int(task[2])))
+
+    # Stores the verdict of a task answered by verifying its canonical task, counting errors like a checked task
+    def record_equivalent(self, task, canonical, verdict):
+
+        if task[0] == "state":
+            store, ids = self.state_verdicts, (int(task[1]),)
+            print(f"\n--------------------------------------------------------------------------------\nChecked reachability of state: {ids[0]}\n\t\t Verdict taken from equivalent state {canonical[1]}: {verdict}.")
+        else:
+            store, ids = self.transition_verdicts, (int(task[1]), int(task[2]))
+            print(f"\n--------------------------------------------------------------------------------\nChecked transition: {ids[0]} -> {ids[1]}\n\t\t Verdict taken from equivalent transition {canonical[1]} -> {canonical[2]}: {verdict}.")
 
-                print(f"\tModel instance copied to '{saving_path}' for analysis.")
+        if verdict is not None and not verdict and not store.is_checked(*ids):
+            with self.lock:
+                if task[0] == "state":
+                    self.state_errors += 1
+                else:
+                    self.transition_errors += 1
 
-            except Exception as e:
-                print(f"Error during file copy: {e}")
+        store.record(*ids, verdict=verdict)
+        self.journal_verdicts(task[0], {ids: verdict})
 
-    # Saves copy of states promela file using state index
-    def save_state_model(self, prefix, state, thread_workspace):
-    
-        saving_path = os.path.join(os.getcwd(), "spin_models", "generated_models", f"_{prefix}_{state.get('state_id')}.pml")
+    # Opens the journal of an evaluation's verdicts, <file>_journal.csv next to its results.
+    # With resume, the verdicts already in the journal are loaded into the tables so they are not checked again and new
+    # verdicts are appended. Otherwise an existing journal is kept as <file>_journal.csv.previous and a new one is started.
+    def open_journal(self, file):
+
+        from results_journal import ResultsJournal
+
+        journal_path = f"{file}_journal.csv"
+
+        if os.path.exists(journal_path):
+            if self.resume:
+                states, transitions = ResultsJournal.read(journal_path)
+                self.state_verdicts.update(states)
+                self.transition_verdicts.update(transitions)
+
+                with self.lock:
+                    self.state_errors += sum(1 for state_reachable in states.values() if not state_reachable)
+                    self.transition_errors += sum(1 for valid_transition in transitions.values() if not valid_transition)
+
+                print(f"Resuming {file}: {len(states)} states and {len(transitions)} transitions already checked in '{journal_path}'.")
+            else:
+                os.replace(journal_path, f"{journal_path}.previous")
+                print(f"Starting a new journal for {file}, the previous one is kept as '{journal_path}.previous'.")
+
+        self.journal = ResultsJournal(journal_path)
+
+    def close_journal(self):
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    # Appends verdicts to the journal if one is open, see ResultsJournal.write
+    def journal_verdicts(self, check, verdicts):
+
+        if self.journal is not None:
+            self.journal.write(check, verdicts)
+
+    # Runs an evaluation's tasks and stores the verdicts of the transitions mirrored by them (see transition_tasks()),
+    # closing the evaluation's journal when they finish or the run is interrupted
+    def run_journaled_tasks(self, file, tasks, mirrored=None):
+
+        mirrored = mirrored or {}
+        try:
+            self.run_tasks(tasks)
+            self.record_mirrored_transitions(mirrored)
+        except KeyboardInterrupt:
+            print(f"\nEvaluation of {file} interrupted, {self.journal.entries} new verdicts are kept in '{self.journal.path}'. Run it again with --resume to continue.")
+            raise
+        finally:
+            self.close_journal()
+
+    # Opens the cache of verdicts from earlier runs, entries are looked up by the hash of the current templates
+    def use_verdict_cache(self, cache_path):
+
+        from verdict_cache import VerdictCache, template_hash
+
+        # Verdicts that may have missed a counterexample are kept apart from exact ones, under the profile that produced them
+        profile_suffix = "" if self.exact_verdicts() else f":{self.verification_profiles[-1]}"
+
+        self.verdict_cache = VerdictCache(cache_path)
+        if os.path.exists(self.transition_template_path):
+            self.transition_template_hash = template_hash(self.transition_template_path) + profile_suffix
+        if os.path.exists(self.state_template_path):
+            self.state_template_hash = template_hash(self.state_template_path) + profile_suffix
+
+        print(f"Using verdict cache at path: {cache_path}")
+
+    # Opens the store the results of each evaluation are added to, see results_store.py
+    def use_results_store(self, store_path):
+
+        from results_store import ResultsStore
+
+        self.results_store = ResultsStore(store_path)
+        print(f"Using results store at path: {store_path}")
+
+    # Opens the work queue that checks are handed to, for workers on this and other machines (see work_queue.py).
+    # With serve_address ("host:port"), the queue is also served over TCP to workers that cannot open the database.
+    def use_work_queue(self, queue_path, serve_address=None, authkey=None, lease_seconds=None):
+
+        from work_queue import WorkQueue, serve_work_queue, DEFAULT_LEASE_SECONDS
+
+        self.work_queue = WorkQueue(queue_path, lease_seconds or DEFAULT_LEASE_SECONDS)
+        if serve_address:
+            serve_work_queue(self.work_queue, serve_address, authkey)
 
-        # Check if Promela file exists
-        if not os.path.exists(f"{thread_workspace}/hydro_state.pml"):
-            print(f"Error: The file '{self.state_promela_path}' does not exist.")
+        print(f"Using work queue at path: {queue_path}")
+
+    # Returns: the cached validity of a transition, None if the cache is unused or has no verdict for it
+    def cached_transition(self, prev_state, next_state):
+
+        if self.verdict_cache is None or self.transition_template_hash is None:
+            return None
+        return self.verdict_cache.get_transition(self.transition_template_hash, prev_state.get('state_id'), next_state.get('state_id'))
+
+    # Returns: the cached reachability of a state, None if the cache is unused or has no verdict for it
+    def cached_state(self, state):
+
+        if self.verdict_cache is None or self.state_template_hash is None:
+            return None
+        return self.verdict_cache.get_state(self.state_template_hash, state.get('state_id'))
+
+    # Loads the index of verified transitions used to answer transition checks without SPIN.
+    # If no index exists yet one is created from the valid transitions in the memoisation table.
+    def use_transition_index(self, index_path):
+
+        from transition_index import TransitionIndex
+
+        self.transition_index_path = index_path
+        if os.path.exists(index_path):
+            self.transition_index = TransitionIndex(index_path)
+            print(f"Loaded {len(self.transition_index)} transitions from index: {index_path}")
         else:
-            try:
-                shutil.copy(f"{thread_workspace}/hydro_state.pml", saving_path)
+            self.save_transition_index()
+
+    # Writes the transition index again with every valid transition in the memoisation table added to it
+    def save_transition_index(self):
+
+        from transition_index import TransitionIndex
+
+        valid = [pair for pair, valid_transition in self.transition_verdicts.checked().items() if valid_transition]
+        previous_states = np.array([previous_state for previous_state, _ in valid], dtype=np.int64)
+        next_states = np.array([next_state for _, next_state in valid], dtype=np.int64)
+
+        if self.transition_index is not None:
+            indexed_previous, indexed_next = self.transition_index.pairs()
+            previous_states = np.concatenate([indexed_previous, previous_states])
+            next_states = np.concatenate([indexed_next, next_states])
+
+        self.transition_index = TransitionIndex.create(self.transition_index_path, previous_states, next_states, len(self.state_columns))
+        print(f"Saved {len(self.transition_index)} transitions to index: {self.transition_index_path}")
+
+    # Opens this run's archive that kept models are written to, see model_archive.run_archive_path()
+    def use_model_archive(self, archive_path):
+
+        from model_archive import ModelArchive
+
+        if self.retention != "none":
+            self.model_archive = ModelArchive(archive_path)
+
+    def close_model_archive(self):
+
+        if self.model_archive is not None:
+            self.model_archive.close()
+            self.model_archive = None
+
+    # Times every stage of the checks, exporting the histograms to a Prometheus text file and/or a CSV time series
+    def use_metrics(self, prometheus_path=None, csv_path=None, interval=15, keep_samples=False):
+
+        from pipeline_metrics import PipelineMetrics
+
+        self.metrics = PipelineMetrics(prometheus_path, csv_path, interval, keep_samples)
+        self.collect_timings = True
+
+    # Writes the final metrics and prints the time spent in each stage
+    def close_metrics(self):
+
+        if self.metrics is not None:
+            self.metrics.export()
+            print(f"\nTime per stage:\n{self.metrics.summary()}")
+
+    # Records the time taken by the code inside the block as one observation of a stage (see pipeline_metrics.STAGES)
+    @contextmanager
+    def timed(self, stage):
 
-                print(f"\tFull model instance copied to '{saving_path}' for analysis.")
-            except Exception as e:
-                print(f"An error occurred while saving model: {e}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_timing(stage, time.perf_counter() - start)
+
+    def record_timing(self, stage, seconds):
+
+        if self.metrics is not None:
+            self.metrics.observe(stage, seconds)
+            self.metrics.export_if_due()
+        elif self.collect_timings:
+            with self.lock:
+                self.stage_timings.append((stage, seconds))
+
+    # Returns: the timings recorded since the last call, so a worker can send them to the main process
+    def take_stage_timings(self):
+
+        with self.lock:
+            timings = self.stage_timings
+            self.stage_timings = []
+        return timings
+
+    # Keeps a copy of a checked model if the retention policy asks for it
+    def retain_model(self, name, model_path, error):
+
+        from model_archive import should_retain
+
+        if not should_retain(self.retention, error, self.retention_sample_rate):
+            return
+
+        try:
+            with open(model_path, 'r') as model_file:
+                model_text = model_file.read()
+        except OSError as e:
+            print(f"An error occurred while saving model: {e}")
+            return
+
+        if self.model_archive is not None:
+            self.model_archive.add(name, model_text)
+        else:
+            # Worker processes hand their models to the parent, which owns the archive
+            with self.lock:
+                self.retained_models.append((name, model_text))
+
+    # Returns: the models kept since the last call, clearing the list
+    def take_retained_models(self):
+
+        with self.lock:
+            models = self.retained_models
+            self.retained_models = []
+        return models
+
+    # Saves copy of transition promela file using transition indexes
+    def save_transition_model(self, prefix, previous_state, next_state, thread_workspace):
+
+        self.retain_model(f"_{prefix}_{previous_state.get('state_id')}--{next_state.get('state_id')}.pml", f"{thread_workspace}/hydro_transition.pml", prefix != "valid")
+
+    # Saves copy of states promela file using state index
+    def save_state_model(self, prefix, state, thread_workspace):
+
+        self.retain_model(f"_{prefix}_{state.get('state_id')}.pml", f"{thread_workspace}/hydro_state.pml", prefix != "reachable")
 
     # Outputs transition state in console
     def print_transition_state(self, previous_state, next_state):
@@ -367,11 +1334,22 @@ class SpinController:
         # If not previously checked, then generate a new model file and run SPIN to verify the transition
         self.adjust_transition_template(prev_state, next_state, thread_workspace)
 
+        check = ("transition", prev_state.get('state_id'), next_state.get('state_id'))
+
+        # Precompiled verifiers only need the valuation, the generated model is kept for saving
+        if self.uses_precompiled("pan_transition"):
+            valid_transition = self.run_precompiled_pan("pan_transition", self.transition_valuation(prev_state, next_state), thread_workspace, check)
         # If threading is used, the file will be in a seperate thread workspace
-        if thread_workspace is None:
-            valid_transition = self.run_spin(self.transition_promela_path, thread_workspace)
+        elif thread_workspace is None:
+            valid_transition = self.run_spin(self.transition_promela_path, thread_workspace, check)
         else:
-            valid_transition = self.run_spin(f"hydro_transition.pml", thread_workspace)
+            valid_transition = self.run_spin(f"hydro_transition.pml", thread_workspace, check)
+
+        with self.timed("memo"):
+            return self.store_transition_verdict(prev_state, next_state, valid_transition, thread_workspace)
+
+    # Reports a transition verdict from SPIN, saving a copy of the model in the workspace and storing the verdict in the table and cache
+    def store_transition_verdict(self, prev_state, next_state, valid_transition, thread_workspace):
 
         # If the transition is valid
         if valid_transition:
@@ -385,38 +1363,94 @@ class SpinController:
             #self.print_transition_state(prev_state, next_state)
             self.save_transition_model("error", prev_state, next_state, thread_workspace)
 
-        # Check if the transition already exists in the table
-        with self.lock:
-            matching_transitions = (
-                (self.transitions['previous_state'] == prev_state.get('state_id')) & 
-                (self.transitions['next_state'] == next_state.get('state_id'))
-            )
-
-            if matching_transitions.any():
-                # If a match is found, update the existing row
-                self.transitions.loc[matching_transitions, 'valid'] = valid_transition
-                #print(f"\t\t Updated existing transition in the table.")
-            else:
-                # If no match is found, append a new row
-                new_row = pd.DataFrame([{
-                    "previous_state": prev_state.get('state_id'),
-                    "next_state": next_state.get('state_id'),
-                    "valid": valid_transition
-                }])
-                self.transitions = pd.concat([self.transitions, new_row], ignore_index=True)
-        
+        self.record_transition(prev_state, next_state, valid_transition)
+
+        # Keep the verdict for later runs, unless pan failed
+        if self.verdict_cache is not None and self.transition_template_hash is not None and valid_transition is not None:
+            self.verdict_cache.put_transition(self.transition_template_hash, prev_state.get('state_id'), next_state.get('state_id'), valid_transition)
+
+        return valid_transition
+
+    # Stores the verdict for a transition in the memoisation table
+    def record_transition(self, prev_state, next_state, valid_transition):
+
+        # Updates the existing entry, or adds a new one
+        self.transition_verdicts.record(prev_state.get('state_id'), next_state.get('state_id'), verdict=valid_transition)
+        self.journal_verdicts("transition", {(prev_state.get('state_id'), next_state.get('state_id')): valid_transition})
+
+    # Loads the native engine that answers transition checks in place of SPIN
+    def use_native_engine(self):
+
+        from hydro_engine import HydroBranchEngine
+
+        self.engine = HydroBranchEngine()
+        self.engine_property_mask = self.transition_property_mask()
+
+    # Checks a transition with the native engine rather than SPIN, storing the result like spin_verify_transition
+    def engine_verify_transition(self, prev_state, next_state):
+
+        valid_transition = bool(self.engine.is_transition([prev_state.get('state_id')], [next_state.get('state_id')], self.engine_property_mask)[0])
+
+        if valid_transition:
+            print(f"\n--------------------------------------------------------------------------------\nChecked transition: {prev_state.get('state_id')} -> {next_state.get('state_id')}\n\t\t State transition validated by native engine.")
+        else:
+            print(f"\n--------------------------------------------------------------------------------\nChecked transition: {prev_state.get('state_id')} -> {next_state.get('state_id')}\n\t\t WARNING: State transition NOT valid.")
+            with self.lock:
+                self.transition_errors += 1
+
+        self.record_transition(prev_state, next_state, valid_transition)
         return valid_transition
 
+    # Compares the native engine with SPIN on every transition in a file, reporting any transition where they disagree
+    def check_engine_conformance(self, transitions_path):
+
+        transitions = self.load_transitions_csv(transitions_path)
+        transitions = transitions[transitions["previous_state"] != -1]
+
+        spin_models_dir = Path.cwd() / "spin_models"
+
+        engine_results = self.engine.is_transition(transitions["previous_state"].values, transitions["next_state"].values, self.engine_property_mask)
+
+        mismatches = []
+        for transition, engine_result in zip(transitions.itertuples(), engine_results):
+            prev_state = self.get_state_from_index(transition.previous_state)
+            next_state = self.get_state_from_index(transition.next_state)
+
+            self.adjust_transition_template(prev_state, next_state, spin_models_dir)
+            spin_result = self.run_spin(f"hydro_transition.pml", spin_models_dir)
+
+            if spin_result is None:
+                print(f"SPIN could not check {transition.previous_state} -> {transition.next_state}, skipping.")
+            elif bool(spin_result) != bool(engine_result):
+                mismatches.append((transition.previous_state, transition.next_state, spin_result, bool(engine_result)))
+
+        print(f"\nConformance: {len(transitions) - len(mismatches)}/{len(transitions)} transitions agree between SPIN and the native engine.")
+        for previous_state, next_state, spin_result, engine_result in mismatches:
+            print(f"\t{previous_state} -> {next_state}: SPIN {spin_result}, engine {engine_result}")
+
+        return mismatches
+
     # Sequence code that creates a Promela file that checks if a state is reachable and runs it through SPIN
     def spin_verify_state(self, state, thread_workspace):
         # If not previously checked, then generate a new model file and run SPIN to verify the transition
         self.adjust_state_template(state, thread_workspace)
-        
+
+        check = ("state", state.get('state_id'))
+
+        # Precompiled verifiers only need the valuation, the generated model is kept for saving
+        if self.uses_precompiled("pan_state"):
+            state_reachable = self.run_precompiled_pan("pan_state", self.state_valuation(state), thread_workspace, check)
         # If threading is used, the file will be in a seperate thread workspace
-        if thread_workspace is None:
-            state_reachable = self.run_spin(self.state_promela_path, thread_workspace)
+        elif thread_workspace is None:
+            state_reachable = self.run_spin(self.state_promela_path, thread_workspace, check)
         else:
-            state_reachable = self.run_spin(f"hydro_state.pml", thread_workspace)
+            state_reachable = self.run_spin(f"hydro_state.pml", thread_workspace, check)
+
+        with self.timed("memo"):
+            return self.store_state_verdict(state, state_reachable, thread_workspace)
+
+    # Reports a state verdict from SPIN, saving a copy of the model in the workspace and storing the verdict in the table and cache
+    def store_state_verdict(self, state, state_reachable, thread_workspace):
 
         # Reachable state
         if state_reachable:
@@ -430,70 +1464,209 @@ class SpinController:
             #self.print_state(state)
             self.save_state_model("unreachable", state, thread_workspace)
 
-        # Check if state is located in memoisation table
-        with self.lock:
+        self.record_state(state, state_reachable)
 
-            matching_state = (self.states['state'] == state.get('state_id'))
+        # Keep the verdict for later runs, unless pan failed
+        if self.verdict_cache is not None and self.state_template_hash is not None and state_reachable is not None:
+            self.verdict_cache.put_state(self.state_template_hash, state.get('state_id'), state_reachable)
 
-            if matching_state.any():
-                # If a match is found, update the existing row
-                self.states.loc[matching_state, 'reachable'] = state_reachable
-                print(f"\t\t Updated existing state entry in the table.")
-            else:
-                # If no match is found, append a new row
-                self.states = self.states.append({
-                    "state": state.get('state_id'),
-                    "reachable": state_reachable
-                }, ignore_index=True)
-                print(f"\t\t Added new state entry to the table.")
-
-        print(self.states)
+        print(f"\t\t {len(self.state_verdicts)} states in the table.")
         return state_reachable
 
+    # Checks a state against the reachability bitmap rather than SPIN, storing the result like spin_verify_state
+    def bitmap_verify_state(self, state):
+
+        state_reachable = self.reachability.contains(state.get('state_id'))
+
+        if state_reachable:
+            print(f"\n--------------------------------------------------------------------------------\nChecked reachability of state: {state.get('state_id')}\n\t\t State found in reachability bitmap.")
+        else:
+            print(f"\n--------------------------------------------------------------------------------\nChecked reachability of state: {state.get('state_id')}\n\t\t WARNING: State not recognised by SPIN.")
+            with self.lock:
+                self.state_errors += 1
+
+        self.record_state(state, state_reachable)
+        return state_reachable
+
+    # Stores the verdict for a state in the memoisation table
+    def record_state(self, state, state_reachable):
+
+        # Check if state is located in memoisation table
+        if state.get('state_id') in self.state_verdicts:
+            print(f"\t\t Updated existing state entry in the table.")
+        else:
+            print(f"\t\t Added new state entry to the table.")
+
+        self.state_verdicts.record(state.get('state_id'), verdict=state_reachable)
+        self.journal_verdicts("state", {state.get('state_id'): state_reachable})
+
     # Takes two states as dictionaries and checks if that transition is already recognised, or has already been checked
     # If unrecognised, it passes the states to a method that checks them in SPIN
     # True means it was recognised, false means it was not.
     def check_transition(self, prev_state, next_state, thread_workspace):
 
-        matching_transitions = ((self.transitions['previous_state'] == prev_state.get('state_id')) & 
-                                (self.transitions['next_state'] == next_state.get('state_id')))
+        transition_value = self.check_known_transition(prev_state, next_state)
 
-        # If transition is located in memoisation table
-        if matching_transitions.any():
-            # Get listed value of transition
-            transition_value = self.transitions.loc[matching_transitions, 'valid']
-
-            # If transition is in table but hasn't been checked, check it
-            if transition_value.isna().any() or transition_value.empty:
+        # If transition hasn't been verified previously, or is in the table but hasn't been checked, check it in SPIN
+        if transition_value is None:
+            task = ("transition", prev_state.get('state_id'), next_state.get('state_id'))
+            canonical = self.canonical_task(task)
+            if canonical == task:
                 return self.spin_verify_transition(prev_state, next_state, thread_workspace)
 
-            else:
-                # Pull result from memoisation table
-                return transition_value.values[0]
-                
-        else: 
-            # If transition hasn't been verified previously, check it in SPIN
-            return self.spin_verify_transition(prev_state, next_state, thread_workspace)
+            # Verify the equivalent canonical transition in its place
+            transition_value = self.check_transition(self.get_state_from_index(canonical[1]), self.get_state_from_index(canonical[2]), thread_workspace)
+            self.record_equivalent(task, canonical, transition_value)
+
+        return transition_value
+
+    # Answers a transition check without running SPIN: from the memoisation table, the index, the native engine or the cache.
+    # Returns: the verdict, or None if the transition needs to be checked in SPIN.
+    def check_known_transition(self, prev_state, next_state):
+
+        # Transitions in the index have already been verified
+        if self.transition_index is not None and self.transition_index.is_valid(prev_state.get('state_id'), next_state.get('state_id')):
+            self.record_transition(prev_state, next_state, True)
+            return True
+
+        # Pull result from memoisation table
+        transition_value = self.transition_verdicts.get(prev_state.get('state_id'), next_state.get('state_id'))
+        if transition_value is not None:
+            return transition_value
+
+        if self.engine is not None:
+            return self.engine_verify_transition(prev_state, next_state)
+
+        # Reuse the verdict of an earlier run with the same template
+        valid_transition = self.cached_transition(prev_state, next_state)
+        if valid_transition is not None:
+            print(f"\n--------------------------------------------------------------------------------\nChecked transition: {prev_state.get('state_id')} -> {next_state.get('state_id')}\n\t\t Verdict found in cache: {valid_transition}.")
+            if not valid_transition:
+                with self.lock:
+                    self.transition_errors += 1
+            self.record_transition(prev_state, next_state, valid_transition)
+            return valid_transition
 
     # Returns true if a new state is searched */
     def check_state(self, state, thread_workspace):
-        matching_state = (self.states['state'] == state.get('state_id'))
 
-        # Check if state is located in memoisation table
-        if matching_state.any():
-            state_reachable = self.states.loc[matching_state, 'reachable']
+        state_reachable = self.check_known_state(state)
 
-            # If state is in table but hasn't been checked, check it
-            if state_reachable.isna().any() or state_reachable.empty:
+        # If state hasn't been verified previously, or is in the table but hasn't been checked, check it in SPIN
+        if state_reachable is None:
+            task = ("state", state.get('state_id'))
+            canonical = self.canonical_task(task)
+            if canonical == task:
                 return self.spin_verify_state(state, thread_workspace)
-            else:
-                # Pull result from memoisation table
-                return state_reachable.values[0]
 
-        else:
-            # If state hasn't been verified previously, check it in SPIN
-            return self.spin_verify_state(state, thread_workspace)
+            # Verify the equivalent canonical state in its place
+            state_reachable = self.check_state(self.get_state_from_index(canonical[1]), thread_workspace)
+            self.record_equivalent(task, canonical, state_reachable)
+
+        return state_reachable
+
+    # Answers a state check without running SPIN: from the memoisation table, the reachability bitmap or the cache.
+    # Returns: the verdict, or None if the state needs to be checked in SPIN.
+    def check_known_state(self, state):
+
+        # Pull result from memoisation table
+        state_reachable = self.state_verdicts.get(state.get('state_id'))
+        if state_reachable is not None:
+            return state_reachable
+
+        if self.reachability is not None:
+            return self.bitmap_verify_state(state)
+
+        # Reuse the verdict of an earlier run with the same template
+        state_reachable = self.cached_state(state)
+        if state_reachable is not None:
+            print(f"\n--------------------------------------------------------------------------------\nChecked reachability of state: {state.get('state_id')}\n\t\t Verdict found in cache: {state_reachable}.")
+            if not state_reachable:
+                with self.lock:
+                    self.state_errors += 1
+            self.record_state(state, state_reachable)
+            return state_reachable
+
+
+    # Sequence code that checks a chunk of transitions with a single batch model and stores every verdict
+    def spin_verify_transition_batch(self, pairs, thread_workspace):
+
+        results = self.run_spin_batch(pairs, thread_workspace)
+
+        valid_count = sum(1 for valid_transition in results.values() if valid_transition)
+        print(f"\n--------------------------------------------------------------------------------\nChecked batch of {len(results)} transitions starting at: {pairs[0][0]} -> {pairs[0][1]}\n\t\t {valid_count}/{len(results)} transitions validated by Promela model.")
 
+        # Save a copy of the batch model, counted as an error if any of its transitions is not valid
+        self.retain_model(f"_batch_{pairs[0][0]}--{pairs[0][1]}_{len(results)}.pml", os.path.join(thread_workspace, "hydro_batch.pml"), valid_count < len(results))
+
+        with self.lock:
+            self.transition_errors += sum(1 for valid_transition in results.values() if not valid_transition)
+
+        # Add every verdict to the table in one step, replacing any unchecked entries
+        self.transition_verdicts.update(results)
+
+        # Keep the verdicts for later runs, unless pan failed
+        if self.verdict_cache is not None and self.transition_template_hash is not None:
+            self.verdict_cache.put_transitions(self.transition_template_hash, {pair: valid_transition for pair, valid_transition in results.items() if valid_transition is not None})
+
+        return results
+
+    # Takes a list of (previous_state, next_state) ids and checks those not already in the memoisation table or index as one batch
+    # Returns: dictionary of (previous_state, next_state) -> verdict for every pair.
+    def check_transition_batch(self, pairs, thread_workspace):
+
+        # Transitions in the index have already been verified, they are added to the table as they are found
+        if self.transition_index is not None:
+            previous_states, next_states = zip(*pairs)
+            indexed = self.transition_index.contains_many(previous_states, next_states)
+            for previous_state, next_state, valid_transition in zip(previous_states, next_states, indexed):
+                if valid_transition and not self.transition_verdicts.is_checked(previous_state, next_state):
+                    self.transition_verdicts.record(previous_state, next_state, verdict=True)
+
+        results = {}
+        unchecked = []
+        for previous_state, next_state in pairs:
+            key = (int(previous_state), int(next_state))
+            valid_transition = self.transition_verdicts.get(*key)
+            if valid_transition is not None:
+                results[key] = valid_transition
+            else:
+                unchecked.append(key)
+
+        # Reuse the verdicts of an earlier run with the same template
+        if unchecked and self.verdict_cache is not None and self.transition_template_hash is not None:
+            cached = self.verdict_cache.get_transitions(self.transition_template_hash, unchecked)
+            if cached:
+                with self.lock:
+                    self.transition_errors += sum(1 for valid_transition in cached.values() if not valid_transition)
+                self.transition_verdicts.update(cached)
+                results.update(cached)
+                unchecked = [pair for pair in unchecked if pair not in cached]
+
+        # Transitions equivalent to another are answered by it, only the canonical transitions are verified
+        mirrored = {}
+        if unchecked:
+            for pair in unchecked:
+                canonical = self.canonical_task(("transition", *pair))[1:]
+                if canonical != pair:
+                    mirrored[pair] = canonical
+            unchecked = list(dict.fromkeys(mirrored.get(pair, pair) for pair in unchecked))
+
+            # Canonical transitions may already have verdicts
+            for pair in list(unchecked):
+                valid_transition = self.transition_verdicts.get(*pair)
+                if valid_transition is not None:
+                    results[pair] = valid_transition
+                    unchecked.remove(pair)
+
+        if unchecked:
+            results.update(self.spin_verify_transition_batch(unchecked, thread_workspace))
+
+        for pair, canonical in mirrored.items():
+            results[pair] = results.get(canonical)
+            self.record_equivalent(("transition", *pair), ("transition", *canonical), results[pair])
+
+        return results
 
     # Outputs transitions state space using a set of labels
     # labels in dataframe of format: state(int),label(str)
@@ -520,66 +1693,130 @@ class SpinController:
                     print(f"{row.next_state}:")
                     self.print_state(self.get_state_from_index(row.next_state))
 
-    def spin_processor(self, thread_workspace):
+    # Adds verdicts computed by a worker process to the memoisation tables, counting the errors among new entries
+    def merge_verdicts(self, result):
 
-        if not os.path.exists(thread_workspace):
-            os.makedirs(thread_workspace)
+        with self.timed("merge"):
+            self.merge_worker_result(result)
 
-        # Copy over spin model for thread to use locally
-        shutil.copy(self.state_template_path,  f"{thread_workspace}/hydro_state_template.pml")
-        shutil.copy(self.transition_template_path,  f"{thread_workspace}/hydro_transition_template.pml")
+        if self.metrics is not None:
+            self.metrics.observe_many(result.get("timings", []))
+            self.metrics.export_if_due()
 
-        if thread_workspace == "spin_models/thread_working_directory/thread_1":
-            start_time = datetime.utcnow()
-            total_jobs = spin_input.qsize()
+    def merge_worker_result(self, result):
 
-        while not self.stop_threads.is_set():
-            try:
-                # Get data from the queue, waiting for data to be available
-                task = spin_input.get()
-                
-                if thread_workspace == "spin_models/thread_working_directory/thread_1":
-                    remaining_jobs = spin_input.qsize()
-                    elapsed_time = datetime.utcnow() - start_time
-                    jobs_completed = total_jobs - remaining_jobs
-                    
-                    # Calculate average job time
-                    avg_job_time = elapsed_time / jobs_completed if jobs_completed > 0 else timedelta(0)
-
-                    # Project the end time of the batch
-                    projected_end_time = datetime.utcnow() + avg_job_time * remaining_jobs
-                    
-                    print(f"Thread 1 here! Me and my boys are averaging {avg_job_time.total_seconds()} seconds per job.")
-                    print(f"I'm projecting that this batch will be done around {projected_end_time}. \nRemember: You've got this, you're ready!")
-                    print(f"{spin_input.qsize()} processings remaining for task.")
-                else:
-                    print("Thread got data")
-                    print(f"{spin_input.qsize()} tasks remaining for processing.")
+        for name, model_text in result.get("models", []):
+            if self.model_archive is not None:
+                self.model_archive.add(name, model_text)
 
-                if task is None:
-                    print("Spin processing thread received stop signal.")
-                    spin_input.task_done()
-                    break  # Exit the loop to terminate the thread
-                else:
-                    if task[0] == "state":
-                        state = task[1]
-                        state_result = self.check_state(self.get_state_from_index(state), thread_workspace)
-                    elif task[0] == "both":
-                        previous_state = task[1]
-                        next_state = task[2]
-                        prev_state_result = self.check_state(self.get_state_from_index(previous_state), thread_workspace)
-                        new_state_result = self.check_state(self.get_state_from_index(next_state), thread_workspace)
-                        transition_result = self.check_transition(self.get_state_from_index(previous_state), self.get_state_from_index(next_state), thread_workspace)
-                    elif task[0] == "transition":
-                        previous_state = task[1]
-                        next_state = task[2]
-                        transition_result = self.check_transition(self.get_state_from_index(previous_state), self.get_state_from_index(next_state), thread_workspace)
-                    else:
-                        print(f"Unrecognised task: {task[0]}")
-                #print(f"SPIN Results: {state_result}")
+        with self.lock:
+            self.check_statistics.extend(result.get("statistics", []))
+
+        new_state_errors = sum(1 for state, state_reachable in result["states"].items() if not state_reachable and not self.state_verdicts.is_checked(state))
+        new_transition_errors = sum(1 for pair, valid_transition in result["transitions"].items() if not valid_transition and not self.transition_verdicts.is_checked(*pair))
+
+        with self.lock:
+            self.state_errors += new_state_errors
+            self.transition_errors += new_transition_errors
+
+        self.state_verdicts.update({state: None if state_reachable is None else bool(state_reachable) for state, state_reachable in result["states"].items()})
+        self.transition_verdicts.update({pair: None if valid_transition is None else bool(valid_transition) for pair, valid_transition in result["transitions"].items()})
 
-            except Exception as e:
-                print(f"Error processing data: {e}")
+        self.journal_verdicts("state", result["states"])
+        self.journal_verdicts("transition", result["transitions"])
+
+    # Runs tasks on the worker processes, see SpinExecutor.submit for the task formats
+    def run_tasks(self, tasks):
+
+        # The tasks of an evaluation are all of one kind, so the first says where they run without reading the rest of a stream
+        tasks = iter(tasks)
+        first_task = next(tasks, None)
+        if first_task is None:
+            return
+        tasks = itertools.chain([first_task], tasks)
+
+        # The asyncio pipeline runs single state and transition checks, batches always go to the worker processes
+        if self.async_pipeline and first_task[0] in ("state", "transition"):
+            from async_verifier import AsyncVerifier
+            return AsyncVerifier(self, self.workers).verify_all(tasks)
+
+        from spin_executor import SpinExecutor
+
+        executor = SpinExecutor(self, self.workers, max_pending=self.max_pending, work_queue=self.work_queue)
+        try:
+            return executor.run_tasks(tasks)
+        finally:
+            executor.shutdown()
+
+    # Splits (previous_state, next_state) pairs into the tasks that check them, in chunks of batch_size when batching.
+    # The pairs are read as the tasks are taken, so they can come from a stream (see unchecked_transitions()).
+    # Only canonical transitions are batched, equivalent transitions take their verdicts from record_mirrored_transitions() once the tasks have run.
+    # Returns: generator of the tasks, and dictionary of batched transition -> the canonical transition that answers it, filled as the tasks are taken.
+    def transition_tasks(self, pairs):
+
+        mirrored = {}
+        if self.batch_size > 0:
+            return self.batch_tasks(pairs, mirrored), mirrored
+
+        return (("transition", previous_state, next_state) for previous_state, next_state in pairs), mirrored
+
+    def batch_tasks(self, pairs, mirrored):
+
+        # Canonical transitions of the batch being filled, in order and without repeats
+        batch = {}
+        for pair in pairs:
+            canonical = self.canonical_task(("transition", *pair))[1:]
+            if canonical != pair:
+                mirrored[pair] = canonical
+            batch[canonical] = None
+
+            if len(batch) == self.batch_size:
+                yield ("batch", list(batch))
+                batch = {}
+
+        if batch:
+            yield ("batch", list(batch))
+
+    # Takes the transitions of a stream of (previous_states, next_states) chunks (see dataset_stream.py) that still need checking in SPIN.
+    # Transitions already answered by the tables, the transition index or the verdict cache are stored without being queued.
+    # counts["read"] and counts["queued"] are increased by the transitions read and the transitions passed on.
+    # Returns: generator of (previous_state, next_state) pairs.
+    def unchecked_transitions(self, chunks, counts):
+
+        for previous_states, next_states in chunks:
+            counts["read"] += len(previous_states)
+
+            for previous_state, next_state in zip(previous_states.tolist(), next_states.tolist()):
+                if self.transition_verdicts.is_checked(previous_state, next_state):
+                    continue
+                if self.check_known_transition(self.get_state_from_index(previous_state), self.get_state_from_index(next_state)) is not None:
+                    continue
+
+                counts["queued"] += 1
+                yield previous_state, next_state
+
+    # Takes the states of a stream of state id chunks that still need checking in SPIN, leaving out those in skip.
+    # States already answered by the tables or the verdict cache are stored without being queued.
+    # counts["read"] and counts["queued"] are increased by the states read and the states passed on.
+    # Returns: generator of state ids.
+    def unchecked_states(self, chunks, counts, skip=()):
+
+        for states in chunks:
+            counts["read"] += len(states)
+
+            for state in states.tolist():
+                if state in skip or self.state_verdicts.is_checked(state):
+                    continue
+                if self.check_known_state(self.get_state_from_index(state)) is not None:
+                    continue
+
+                counts["queued"] += 1
+                yield state
+
+    def record_mirrored_transitions(self, mirrored):
+
+        for pair, canonical in mirrored.items():
+            self.record_equivalent(("transition", *pair), ("transition", *canonical), self.transition_verdicts.get(*canonical))
 
     # Test function
     def run(self, check_transitions, check_states, test_states, test_transitions):
@@ -592,39 +1829,49 @@ class SpinController:
 
             self.transitions = self.load_transitions_csv("recorded_transitions_A&B.csv")
 
-            spin_models_dir = Path.cwd() / "spin_models"
-            # Copy over spin model for thread to use locally
-            shutil.copy(self.state_template_path,  f"spin_models/hydro_state_template.pml")
-            shutil.copy(self.transition_template_path,  f"spin_models/hydro_transition_template.pml")
-
-            for transition in self.transitions.itertuples():
-                if transition.previous_state == -1:
-                    continue
+            spin_models_dir = os.path.join(self.workspace_root, "main")
+            if not os.path.exists(spin_models_dir):
+                os.makedirs(spin_models_dir)
 
+            if self.precompiled and not self.prepare_precompiled_workspace(spin_models_dir):
+                print(f"Error: Precompiled verifiers unavailable, falling back to compiling each check.")
+                self.precompiled = False
 
-                if check_transitions:
-                    update = self.check_transition(self.get_state_from_index(transition.previous_state), self.get_state_from_index(transition.next_state), spin_models_dir)
-                    if update:
-                        print(self.transitions)
-                if check_states:
-                    check_state_1 = self.check_state(self.get_state_from_index(transition.previous_state), spin_models_dir)
-                    check_state_2 = self.check_state(self.get_state_from_index(transition.next_state), spin_models_dir)
-                    
-                    if check_state_1 or check_state_2:
-                        print(self.states)
+            self.open_journal("recorded_transitions_A&B.csv")
+            try:
+                for transition in self.transitions.itertuples():
+                    if transition.previous_state == -1:
+                        continue
+
+
+                    if check_transitions:
+                        update = self.check_transition(self.get_state_from_index(transition.previous_state), self.get_state_from_index(transition.next_state), spin_models_dir)
+                        if update:
+                            print(f"{len(self.transition_verdicts)} transitions in the table.")
+                    if check_states:
+                        check_state_1 = self.check_state(self.get_state_from_index(transition.previous_state), spin_models_dir)
+                        check_state_2 = self.check_state(self.get_state_from_index(transition.next_state), spin_models_dir)
+                        
+                        if check_state_1 or check_state_2:
+                            print(f"{len(self.state_verdicts)} states in the table.")
+            finally:
+                self.close_journal()
 
             self.generate_state_space_diagram()
             print(f"\n\n--------------------------------------------------------------------------------\nSummary")
-            print(f"\nStates:\n\t{len(self.states)-self.state_errors}/{len(self.states)} recognised states. \n\t{self.state_errors}/{len(self.states)} state errors.")
+            print(f"\nStates:\n\t{len(self.state_verdicts)-self.state_errors}/{len(self.state_verdicts)} recognised states. \n\t{self.state_errors}/{len(self.state_verdicts)} state errors.")
             print(f"{self.states}")
-            print(f"\nTransitions:\n\t{len(self.transitions)-self.transition_errors}/{len(self.transitions)} valid transitions. \n\t{self.transition_errors}/{len(self.transitions)} transition errors.")
+            print(f"\nTransitions:\n\t{len(self.transition_verdicts)-self.transition_errors}/{len(self.transition_verdicts)} valid transitions. \n\t{self.transition_errors}/{len(self.transition_verdicts)} transition errors.")
             print(f"{self.transitions}")
             self.print_problems()
+            self.write_check_statistics("recorded_transitions_A&B.csv")
+
+            if self.transition_index is not None:
+                self.save_transition_index()
     
         if test_states:
             files = ["evaluation_files/datasets/baseline_states.csv"]#,"test_states_1_step.csv", "test_states_2_steps.csv", "test_states_3_steps.csv", "test_states_4_steps.csv"]
             for file in files:
-                spin_input.queue.clear()
                 test_start = datetime.utcnow()
 
                 # Create a set of states that are valid
@@ -634,162 +1881,189 @@ class SpinController:
                     baseline_states.add(transition.next_state)
                 print(f'# Baseline states = {len(baseline_states)}')
 
-                # Load set of test states from csv
-                test_states = pd.read_csv(file)
-
-                # Remove states that already appear in baseline states
-                test_states_set = set(test_states["state"])
-                remaining_states = test_states_set - baseline_states
-
-                for state in remaining_states:
-                    spin_input.put(("state", state))
-
-                print(f'# Test states = {len(test_states)}')
-                print(f'# Remaining states = {len(remaining_states)}')
-
                 # Reinitialise states and transitions
                 self.transitions = pd.DataFrame(columns=["previous_state", "next_state", "valid"])
                 self.states = pd.DataFrame(columns=["state", "reachable"])
 
-                #for index, row in test_states.iterrows():
-                #    print(f'Checking #{index}/{len(test_states)}:')
-                #    test_state = self.get_state_from_index(row["state"])
-                #    # Check if test state to see if it is reachable, store result in table
-                #    test_states.at[index, "reachable"] = self.check_state(test_state)
-
-                # Set up worker threads
-                spin_thread_1 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_1",), name="Thread 1")
-                spin_thread_1.daemon = True  # Daemonize thread to close with main program
-
-                spin_thread_2 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_2",), name="Thread 2")
-                spin_thread_2.daemon = True  # Daemonize thread to close with main program
-
-                spin_thread_3 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_3",), name="Thread 3")
-                spin_thread_3.daemon = True  # Daemonize thread to close with main program
-
-                spin_thread_4 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_4",), name="Thread 4")
-                spin_thread_4.daemon = True  # Daemonize thread to close with main program
+                if self.reachability is not None:
+                    # The bitmap answers each chunk of the file at once, without worker processes
+                    baseline_ids = np.array(list(baseline_states), dtype=np.int64)
+                    for states in read_state_chunks(file):
+                        states = states[~np.isin(states, baseline_ids)]
+                        self.state_verdicts.update(dict(zip(states.tolist(), self.reachability.contains_many(states).tolist())))
 
-                spin_thread_5 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_5",), name="Thread 5")
-                spin_thread_5.daemon = True  # Daemonize thread to close with main program
-
-                spin_thread_6 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_6",), name="Thread 6")
-                spin_thread_6.daemon = True  # Daemonize thread to close with main program
-
-                threads = [spin_thread_1, spin_thread_2, spin_thread_3, spin_thread_4, spin_thread_5, spin_thread_6]
-                # For each thread started add a terminating None to the processing list
-                for t in threads:
-                    t.start()
-                    spin_input.put(None)
+                    self.write_state_results(file, test_start, datetime.utcnow())
+                    continue
 
-                try:
-                    # Waits for threads to finish
-                    for t in threads:
-                        t.join()
-                except KeyboardInterrupt:
-                    print("\nInterrupt Recieved, shutting down threads...")
-                    # Set the event to notify threads to stop
-                    self.stop_threads.set()
+                # The test states are read a chunk at a time as the workers take them, leaving out the baseline states,
+                # states already in the journal of an interrupted run and states with a cached verdict
+                self.open_journal(file)
+                counts = {"read": 0, "queued": 0}
+                self.run_journaled_tasks(file, (("state", state) for state in self.unchecked_states(read_state_chunks(file), counts, baseline_states)))
 
-                    # Ensure all threads have been stopped
-                    for t in threads:
-                        t.join()
+                print(f'# Test states = {counts["read"]}')
+                print(f'# States checked in SPIN = {counts["queued"]}')
 
                 test_finish = datetime.utcnow()
 
-                with open(f"{file}_results.txt", 'w') as output:
-                    reachable_count = self.states["reachable"].sum()
-                    content = f"Results: {reachable_count}/{len(self.states)} states tested were reachable.\nTest finished at {test_start}\nTest finished at {test_finish}\nTest took {test_finish-test_start}"
-                    output.write(content)
-
-                self.states.to_csv(f"{file}_states.csv", index=False)
-
-                print(f"Evaluation of {file} complete.\n\n--------------------------------------------------------------------------------\n")
+                self.write_state_results(file, test_start, test_finish)
 
         if test_transitions:
             files = ["fn_2step.csv", "fn_1step.csv"]#["test_transitions_baseline_1step.csv", "test_transitions_1step_baseline.csv", "test_transitions_baseline_2step.csv", "test_transitions_2step_baseline.csv"]
             for file in files:
-                spin_input.queue.clear()
-                # Load set of test states from csv
-                test_transitions = pd.read_csv(file)
-                # Iterate over each row in the DataFrame
-                for _, transition in test_transitions.iterrows():
-                    # Access previous_state and next_state columns
-                    spin_input.put(("transition", transition["previous_state"], transition["next_state"]))
-
-                print(f"Queue size: {spin_input.qsize()}")
-                test_start = datetime.utcnow()
-                print(f'# Test transitions = {len(test_transitions)}')
-
                 # Reinitialise states and transitions
                 self.transitions = pd.DataFrame(columns=["previous_state", "next_state", "valid"])
                 self.states = pd.DataFrame(columns=["state", "reachable"])
 
-                #for index, row in test_states.iterrows():
-                #    print(f'Checking #{index}/{len(test_states)}:')
-                #    test_state = self.get_state_from_index(row["state"])
-                #    # Check if test state to see if it is reachable, store result in table
-                #    test_states.at[index, "reachable"] = self.check_state(test_state)
+                test_start = datetime.utcnow()
+
+                if self.engine is not None:
+                    # The native engine checks each chunk of the file at once, without worker processes
+                    test_count = 0
+                    for previous_states, next_states in read_transition_chunks(file):
+                        valid = self.engine.is_transition(previous_states, next_states, self.engine_property_mask)
+                        self.transition_verdicts.update(dict(zip(zip(previous_states.tolist(), next_states.tolist()), valid.tolist())))
+                        test_count += len(previous_states)
+                    print(f'# Test transitions = {test_count}')
 
-                # Set up worker threads
-                spin_thread_1 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_1",), name="Thread 1")
-                spin_thread_1.daemon = True  # Daemonize thread to close with main program
+                    self.write_transition_results(file, test_start, datetime.utcnow())
+                    continue
 
-                spin_thread_2 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_2",), name="Thread 2")
-                spin_thread_2.daemon = True  # Daemonize thread to close with main program
+                # The test transitions are read a chunk at a time as the workers take them, leaving out transitions
+                # already in the journal of an interrupted run and transitions with a cached or indexed verdict
+                self.open_journal(file)
+                counts = {"read": 0, "queued": 0}
+                tasks, mirrored = self.transition_tasks(self.unchecked_transitions(read_transition_chunks(file), counts))
 
-                spin_thread_3 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_3",), name="Thread 3")
-                spin_thread_3.daemon = True  # Daemonize thread to close with main program
+                self.run_journaled_tasks(file, tasks, mirrored)
 
-                spin_thread_4 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_4",), name="Thread 4")
-                spin_thread_4.daemon = True  # Daemonize thread to close with main program
+                print(f'# Test transitions = {counts["read"]}')
+                print(f'# Transitions checked in SPIN = {counts["queued"]}')
 
-                spin_thread_5 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_5",), name="Thread 5")
-                spin_thread_5.daemon = True  # Daemonize thread to close with main program
+                test_finish = datetime.utcnow()
 
-                spin_thread_6 = threading.Thread(target=self.spin_processor, args=("spin_models/thread_working_directory/thread_6",), name="Thread 6")
-                spin_thread_6.daemon = True  # Daemonize thread to close with main program
+                self.write_transition_results(file, test_start, test_finish)
 
+                if self.transition_index is not None:
+                    self.save_transition_index()
 
-                threads = [spin_thread_1, spin_thread_2, spin_thread_3, spin_thread_4, spin_thread_5, spin_thread_6]
-                # For each thread started add a terminating None to the processing list
-                for t in threads:
-                    t.start()
-                    spin_input.put(None)
-                try:
-                    # Waits for threads to finish
-                    for t in threads:
-                        t.join()
-                except KeyboardInterrupt:
-                    print("\nInterrupt Recieved, shutting down threads...")
-                    # Set the event to notify threads to stop
-                    self.stop_threads.set()
+    # Writes the summary and verdicts of a --test_states evaluation
+    def write_state_results(self, file, test_start, test_finish):
 
-                    # Ensure all threads have been stopped
-                    for t in threads:
-                        t.join()
+        # Export the table once
+        states = self.states
 
-                test_finish = datetime.utcnow()
+        with open(f"{file}_results.txt", 'w') as output:
+            reachable_count = (states["reachable"] == True).sum()
+            content = f"Results: {reachable_count}/{len(states)} states tested were reachable.\nTest finished at {test_start}\nTest finished at {test_finish}\nTest took {test_finish-test_start}"
+            output.write(content)
 
-                with open(f"{file}_results.txt", 'w') as output:
-                    valid_count = self.transitions["valid"].sum()
-                    content = f"Results: {valid_count}/{len(self.transitions)} transitions tested were valid.\nTest finished at {test_start}\nTest finished at {test_finish}\nTest took {test_finish-test_start}"
-                    output.write(content)
+        states.to_csv(f"{file}_states.csv", index=False)
+        self.write_check_statistics(file)
 
-                self.transitions.to_csv(f"{file}_transitions.csv", index=False)
+        print(f"Evaluation of {file} complete.\n\n--------------------------------------------------------------------------------\n")
 
-                print(f"Evaluation of {file} complete.\n\n--------------------------------------------------------------------------------\n")
+    # Writes the summary and verdicts of a --test_transitions evaluation
+    def write_transition_results(self, file, test_start, test_finish):
+
+        # Export the table once
+        transitions = self.transitions
+
+        with open(f"{file}_results.txt", 'w') as output:
+            valid_count = (transitions["valid"] == True).sum()
+            content = f"Results: {valid_count}/{len(transitions)} transitions tested were valid.\nTest finished at {test_start}\nTest finished at {test_finish}\nTest took {test_finish-test_start}"
+            output.write(content)
+
+        transitions.to_csv(f"{file}_transitions.csv", index=False)
+        self.write_check_statistics(file)
+
+        print(f"Evaluation of {file} complete.\n\n--------------------------------------------------------------------------------\n")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser("SPIN Controller.")
     parser.add_argument("--check_transitions", dest='check_transitions', action='store_true', help="Run SPIN model to check transitions in 'recorded_transitions.csv' file.")
     parser.add_argument("--check_states", dest='check_states', action='store_true', help="Run SPIN model to check states in 'recorded_transitions.csv' file.")
     parser.add_argument("--test_states", dest='test_states', action='store_true', help="Check test_states.csv for false negatives")
-    parser.add_argument("--test_transitions", dest="test_transitions", action="store_true", help="Check a list of transitions using multithreading")
+    parser.add_argument("--test_transitions", dest="test_transitions", action="store_true", help="Check a list of transitions using worker processes")
+    parser.add_argument("--workers", dest="workers", type=int, default=os.cpu_count(), help="Number of worker processes running SPIN checks, defaults to the number of cores.")
+    parser.add_argument("--async_pipeline", dest="async_pipeline", action="store_true", help="Run the spin, gcc and pan stages of each check as asyncio subprocesses, --workers at a time, instead of on worker processes.")
+    parser.add_argument("--workspace_root", dest="workspace_root", type=str, default=default_workspace_root(), help="Directory for the worker workspaces, on tmpfs (/dev/shm) by default when available.")
+    parser.add_argument("--retention", dest="retention", choices=["none", "errors", "sampled", "all"], default=None, help="Which checked models to keep in the model archive, all by default or none with a --results_store.")
+    parser.add_argument("--retention_sample_rate", dest="retention_sample_rate", type=float, default=0.01, help="Fraction of checked models kept with --retention sampled.")
+    parser.add_argument("--model_archive", dest="model_archive", type=str, default="spin_models/generated_models.zip", help="Kept models are written to a new compressed archive per run, named after this path and the time the run started.")
+    parser.add_argument("--metrics_prometheus", dest="metrics_prometheus", type=str, default=None, help="Export stage timing histograms, queue depth and worker utilisation to this Prometheus text-format file.")
+    parser.add_argument("--metrics_csv", dest="metrics_csv", type=str, default=None, help="Append the stage timings, queue depth and worker utilisation to this CSV time series.")
+    parser.add_argument("--metrics_interval", dest="metrics_interval", type=float, default=15, help="Seconds between metrics exports.")
+    parser.add_argument("--precompiled", dest="precompiled", action="store_true", help="Compile one pan verifier per template and workspace, passing state values to it at run time.")
+    parser.add_argument("--profiles", dest="profiles", nargs="+", choices=PROFILE_NAMES, default=["exhaustive"], help="pan verification profiles to check with, in order: each profile after the first only verifies the checks the one before it left inconclusive, e.g. --profiles bitstate exhaustive.")
+    parser.add_argument("--hash_size", dest="hash_size", type=int, default=DEFAULT_HASH_SIZE, help="Log2 of the number of bits in a bitstate search's hash table (pan -w).")
+    parser.add_argument("--search_cores", dest="search_cores", type=str, default="1", help="Cores the pan search of each state check may use, or 'auto' to share the cores between the checks running at once.")
+    parser.add_argument("--multicore_mode", dest="multicore_mode", choices=["ncore", "swarm"], default="ncore", help="Search state checks on several cores with SPIN's multi-core pan (-DNCORE) or a swarm of differently seeded searches.")
+    parser.add_argument("--batch_size", dest="batch_size", type=int, default=0, help="Verify --test_transitions in chunks of this many transitions, one pan search per chunk.")
+    parser.add_argument("--max_pending", dest="max_pending", type=int, default=None, help="Most checks queued for the workers at once, test files are read only as fast as they are checked. Defaults to 16 per worker.")
+    parser.add_argument("--results_store", dest="results_store", type=str, default=None, help="Add the verdicts and pan statistics of each evaluation to this SQLite results store, from which any checked model can be rendered again.")
+    parser.add_argument("--work_queue", dest="work_queue", type=str, default=None, help="Hand checks to the workers of this SQLite work queue, started with work_queue.py on any machine, instead of local worker processes. --workers sets the jobs handed out at once.")
+    parser.add_argument("--serve_queue", dest="serve_queue", type=str, default=None, help="host:port to serve the --work_queue on, for workers on other machines.")
+    parser.add_argument("--queue_key", dest="queue_key", type=str, default=None, help="Key workers authenticate with to the served queue, read from HYDRO_QUEUE_KEY by default.")
+    parser.add_argument("--lease_seconds", dest="lease_seconds", type=float, default=None, help="Seconds a worker holds a job without renewing its lease before the job is given to another worker.")
+    parser.add_argument("--native_engine", dest="native_engine", action="store_true", help="Check transitions with the native implementation of the transition template instead of SPIN.")
+    parser.add_argument("--conformance", dest="conformance", action="store_true", help="Compare the native engine with SPIN on the transitions in 'recorded_transitions_A&B.csv'.")
+    parser.add_argument("--transition_index", dest="transition_index", type=str, default=None, help="Answer transition checks from this index of verified transitions, adding the valid transitions found by --check_transitions to it.")
+    parser.add_argument("--verdict_cache", dest="verdict_cache", type=str, default=None, help="Reuse and store SPIN verdicts in this SQLite database, keyed by the hash of the template that produced them.")
+    parser.add_argument("--no_projection", dest="projection", action="store_false", help="Check every state as given, rather than once per set of states that render to the same model.")
+    parser.add_argument("--symmetry_reduction", dest="symmetry_reduction", action="store_true", help="Verify a state or transition and its generator A/B swap once, for the templates proven symmetric.")
+    parser.add_argument("--resume", dest="resume", action="store_true", help="Continue interrupted evaluations from their journals, skipping the checks already recorded in them.")
+    parser.add_argument("--reachability_bitmap", dest="reachability_bitmap", type=str, default=None, help="Answer state checks from this reachability bitmap, enumerating the state template's reachable set with SPIN first if the file does not exist.")
     args = parser.parse_args()
 
-    if args.test_states or args.test_transitions:
-        spin_input = queue.Queue(maxsize=180000)
-
     controller = SpinController()
+    controller.precompiled = args.precompiled
+    controller.batch_size = args.batch_size
+    controller.max_pending = args.max_pending
+    controller.workers = args.workers
+    controller.async_pipeline = args.async_pipeline
+    controller.workspace_root = args.workspace_root
+    # The results store can render any checked model again, so models are only kept in the archive if asked for
+    controller.retention = args.retention or ("none" if args.results_store else "all")
+    controller.retention_sample_rate = args.retention_sample_rate
+    controller.use_model_archive(args.model_archive)
+
+    # Profiles are set before the verdict cache, which keeps inexact verdicts apart
+    if args.profiles != ["exhaustive"] or args.hash_size != DEFAULT_HASH_SIZE:
+        controller.use_verification_profiles(args.profiles, args.hash_size)
+
+    if args.results_store:
+        controller.use_results_store(args.results_store)
+
+    if args.work_queue:
+        controller.use_work_queue(args.work_queue, args.serve_queue, args.queue_key, args.lease_seconds)
+
+    if args.search_cores != "1":
+        controller.use_multicore_search(args.search_cores, args.multicore_mode)
+
+    if args.metrics_prometheus or args.metrics_csv:
+        controller.use_metrics(args.metrics_prometheus, args.metrics_csv, args.metrics_interval)
+
+    if args.native_engine or args.conformance:
+        controller.use_native_engine()
+
+    if args.verdict_cache:
+        controller.use_verdict_cache(args.verdict_cache)
+
+    if args.reachability_bitmap:
+        controller.use_reachability_bitmap(args.reachability_bitmap)
+
+    if args.transition_index:
+        controller.use_transition_index(args.transition_index)
+
+    controller.resume = args.resume
+    controller.projection = args.projection
+    if args.symmetry_reduction:
+        controller.use_symmetry_reduction()
+
+    if args.conformance:
+        controller.check_engine_conformance("recorded_transitions_A&B.csv")
+
     controller.run(args.check_transitions, args.check_states, args.test_states, args.test_transitions)
+    controller.close_model_archive()
+    controller.close_metrics()
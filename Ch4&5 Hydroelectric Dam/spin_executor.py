@@ -0,0 +1,522 @@
+import os
+import time
+import shutil
+import tempfile
+import heapq
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from pipeline_metrics import QUEUE_CLASSES
+
+# Controller attributes copied into the controller of every worker process
+WORKER_SETTINGS = ["transition_template_path", "state_template_path", "precompiled", "batch_size", "retention", "retention_sample_rate", "projection", "symmetric_states", "symmetric_transitions", "collect_timings", "verification_profiles", "hash_size", "search_cores", "multicore_mode"]
+
+# Controller and workspace of the current worker process, set by initialise_worker()
+worker_controller = None
+worker_workspace = None
+
+
+# Runs SPIN checks on a pool of worker processes.
+# Each worker has its own controller and workspace directory, prepared once when the process starts.
+# Workers only return verdicts, the parent's controller keeps the memoisation tables and error counts.
+# A state or transition that is already being checked is not queued again, the request shares the running job's future.
+# run_tasks() takes tasks from any iterable and keeps at most max_pending of them queued or running, so a stream of tasks
+# is only read as fast as the workers check it.
+# Checks wait in a priority queue until a worker is free, rather than in the pool's first-in first-out queue: each belongs to
+# one of pipeline_metrics.QUEUE_CLASSES, and a live check is taken before any warm-up or batch check queued ahead of it.
+class SpinExecutor:
+
+    def __init__(self, controller, workers=None, workspace_root=None, max_pending=None, work_queue=None):
+        self.controller = controller
+        self.workers = workers or os.cpu_count()
+        self.workspace_root = workspace_root or controller.workspace_root
+        self.max_pending = max_pending or 16 * self.workers
+        self.pool = None
+        # Directory holding the workspaces of this executor's worker processes, removed by shutdown()
+        self.run_workspace = None
+        # Set by shutdown(), after which no more work is accepted
+        self.closed = False
+
+        # When given, jobs go to the workers of this work queue (see work_queue.py) instead of local worker processes,
+        # and workers is the number of jobs handed to the queue at once
+        self.work_queue = work_queue
+
+        # Futures of the checks queued or running, keyed by job_key()
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        # Held while a result is merged, so it is merged once whether by callback or by run_tasks
+        self.merge_lock = threading.Lock()
+        # Number of requests answered by a job that was already in flight
+        self.shared_jobs = 0
+
+        # Number of jobs queued or running on the workers
+        self.pending_jobs = 0
+        self.pending_lock = threading.Lock()
+
+        # Jobs waiting for a worker, as [priority, sequence, queued time, queue class, task, future] entries.
+        # An entry whose future is None was replaced by a higher priority entry for the same job, see promote().
+        self.queue = []
+        self.queue_entries = {}
+        self.queue_sequence = itertools.count()
+        self.queue_lock = threading.Lock()
+        # Jobs on the pool, which never holds more than one per worker so the priority queue decides what runs next
+        self.running_jobs = 0
+
+        # Per class: number of jobs taken from the queue, total and longest seconds they waited
+        self.queue_latency = {queue_class: [0, 0.0, 0.0] for queue_class in QUEUE_CLASSES}
+
+    # Starts the worker processes, copying the controller's settings and resources into each of them
+    def start(self):
+
+        if self.closed:
+            raise RuntimeError("SpinExecutor has been shut down, no more tasks can be submitted.")
+
+        settings = {setting: getattr(self.controller, setting) for setting in WORKER_SETTINGS}
+        resources = {
+            "native_engine": self.controller.engine is not None,
+            "verdict_cache": self.controller.verdict_cache.path if self.controller.verdict_cache is not None else None,
+            "reachability_bitmap": self.controller.reachability.path if self.controller.reachability is not None else None,
+            "transition_index": self.controller.transition_index_path if self.controller.transition_index is not None else None,
+        }
+
+        if self.work_queue is not None:
+            from work_queue import WorkQueuePool
+
+            # Workers on any machine build their controllers from the published settings
+            self.work_queue.clear()
+            self.work_queue.publish("worker_settings", settings)
+            self.work_queue.publish("worker_resources", resources)
+            self.pool = WorkQueuePool(self.work_queue)
+            print(f"Handing up to {self.workers} SPIN jobs at a time to the work queue '{self.work_queue.path}'.")
+            return
+
+        # Number of checks running on the workers, shared with them so a state check's search can use the cores of idle workers
+        self.running_checks = multiprocessing.Value("i", 0)
+
+        # Each run's workers share one directory, so shutdown() can remove every worker's workspace
+        os.makedirs(self.workspace_root, exist_ok=True)
+        self.run_workspace = tempfile.mkdtemp(prefix="run_", dir=self.workspace_root)
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initialise_worker, initargs=(settings, resources, self.run_workspace, self.running_checks))
+        print(f"Started {self.workers} SPIN workers.")
+
+    # Queues a task for the workers, its verdicts are stored in the controller's tables once it completes.
+    # Tasks are ("state", state), ("transition", previous_state, next_state), ("both", previous_state, next_state) or ("batch", pairs).
+    # queue_class is one of pipeline_metrics.QUEUE_CLASSES, and decides which queued task a free worker takes first.
+    # Returns: future holding the task's verdicts, a list of the futures of its three checks for a "both" task.
+    def submit(self, task, queue_class="batch"):
+
+        futures = self.submit_jobs(task, queue_class)
+        return futures if task[0] == "both" else futures[0]
+
+    # Returns: key identifying the check a task runs, None for tasks that are not shared
+    def job_key(self, task):
+
+        if task[0] == "state":
+            return ("state", int(task[1]))
+        if task[0] == "transition":
+            return ("transition", int(task[1]), int(task[2]))
+        return None
+
+    # Splits a "both" task into its two states and transition so each check can be shared.
+    # Returns: list of the checks a task runs.
+    def split_task(self, task):
+
+        if task[0] == "both":
+            return [("state", task[1]), ("state", task[2]), ("transition", task[1], task[2])]
+        return [task]
+
+    # Queues the checks of a task.
+    # Returns: list of futures, one per check.
+    def submit_jobs(self, task, queue_class="batch"):
+        return [self.submit_job(job, queue_class) for job in self.split_task(task)]
+
+    # Queues one check unless its verdict is already known or it is in flight.
+    # A check with an equivalent canonical check (see SpinController.canonical_task) queues that instead, storing its verdict for both.
+    # A check already queued by a lower priority class is moved up to this one.
+    # Returns: future holding the check's verdicts.
+    # Raises: RuntimeError if the executor has been shut down.
+    def submit_job(self, task, queue_class="batch"):
+
+        if self.closed:
+            raise RuntimeError("SpinExecutor has been shut down, no more tasks can be submitted.")
+        if self.pool is None:
+            self.start()
+
+        key = self.job_key(task)
+        if key is None:
+            future = self.queue_job(task, queue_class)
+            future.add_done_callback(self.store_result)
+            return future
+
+        known = self.known_result(key)
+        if known is not None:
+            return known
+
+        canonical = self.controller.canonical_task(task)
+        if canonical != task:
+            future = self.submit_job(canonical, queue_class)
+            future.add_done_callback(lambda done: self.store_mirrored(task, done))
+            return future
+
+        with self.in_flight_lock:
+            # Share the job already checking this state or transition
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.shared_jobs += 1
+                self.promote(future, queue_class)
+                return future
+
+            known = self.known_result(key)
+            if known is not None:
+                return known
+
+            future = self.queue_job(task, queue_class)
+            self.in_flight[key] = future
+
+        future.add_done_callback(self.store_result)
+        future.add_done_callback(lambda done: self.finish_job(key, done))
+        return future
+
+    # Adds a job to the priority queue, counting it as pending until it finishes.
+    # Returns: the job's future, completed once a worker has run it.
+    def queue_job(self, task, queue_class="batch"):
+
+        if queue_class not in QUEUE_CLASSES:
+            raise ValueError(f"Unknown queue class '{queue_class}', expected one of {QUEUE_CLASSES}.")
+
+        with self.pending_lock:
+            self.pending_jobs += 1
+        self.report_queue()
+
+        future = Future()
+        future.add_done_callback(self.finish_pending)
+
+        entry = [QUEUE_CLASSES.index(queue_class), next(self.queue_sequence), time.monotonic(), queue_class, task, future]
+        with self.queue_lock:
+            heapq.heappush(self.queue, entry)
+            self.queue_entries[future] = entry
+
+        self.dispatch()
+        return future
+
+    # Moves a queued job up to a higher priority class, e.g. a batch check that a live check is now waiting on.
+    # The job keeps the time it was queued, so its wait is counted from its first request.
+    def promote(self, future, queue_class):
+
+        with self.queue_lock:
+            entry = self.queue_entries.get(future)
+            if entry is None or QUEUE_CLASSES.index(queue_class) >= entry[0]:
+                return
+
+            promoted = [QUEUE_CLASSES.index(queue_class), next(self.queue_sequence), entry[2], queue_class, entry[4], future]
+            entry[5] = None
+            heapq.heappush(self.queue, promoted)
+            self.queue_entries[future] = promoted
+
+    # Hands queued jobs to the pool, highest priority first, while a worker is free
+    def dispatch(self):
+
+        while True:
+            with self.queue_lock:
+                if self.pool is None or self.running_jobs >= self.workers:
+                    return
+
+                # Skip the entries replaced by promote()
+                while self.queue and self.queue[0][5] is None:
+                    heapq.heappop(self.queue)
+                if not self.queue:
+                    return
+
+                _, _, queued_time, queue_class, task, future = heapq.heappop(self.queue)
+                del self.queue_entries[future]
+                self.running_jobs += 1
+
+                pool_future = self.pool.submit(run_task, task)
+
+            self.record_queue_latency(queue_class, time.monotonic() - queued_time)
+            pool_future.add_done_callback(lambda done, future=future: self.finish_running(future, done))
+
+    # Completes a job's future with the result of its run on the pool, and gives the free worker the next queued job
+    def finish_running(self, future, pool_future):
+
+        with self.queue_lock:
+            self.running_jobs -= 1
+
+        if pool_future.cancelled():
+            future.cancel()
+        elif pool_future.exception() is not None:
+            future.set_exception(pool_future.exception())
+        else:
+            future.set_result(pool_future.result())
+
+        self.dispatch()
+
+    def record_queue_latency(self, queue_class, seconds):
+
+        with self.queue_lock:
+            latency = self.queue_latency[queue_class]
+            latency[0] += 1
+            latency[1] += seconds
+            latency[2] = max(latency[2], seconds)
+
+        if self.controller.metrics is not None:
+            self.controller.metrics.observe_queue(queue_class, seconds)
+
+    def finish_pending(self, future):
+
+        with self.pending_lock:
+            self.pending_jobs -= 1
+        self.report_queue()
+
+    # Passes the queue depth to the controller's metrics, if it has any
+    def report_queue(self):
+
+        if self.controller.metrics is not None:
+            self.controller.metrics.set_queue(self.pending_jobs, self.workers)
+
+    # Returns: a completed future holding the verdict from the controller's tables, None if the check has not been run
+    def known_result(self, key):
+
+        if key[0] == "state":
+            verdict = self.controller.state_verdicts.get(key[1])
+            result = {"states": {key[1]: verdict}, "transitions": {}, "models": []}
+        else:
+            verdict = self.controller.transition_verdicts.get(key[1], key[2])
+            result = {"states": {}, "transitions": {(key[1], key[2]): verdict}, "models": []}
+
+        if verdict is None:
+            return None
+
+        future = Future()
+        future.merged = True
+        future.set_result(result)
+        return future
+
+    # Stores the verdict of a canonical check for the task it was queued in place of
+    def store_mirrored(self, task, future):
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        result = future.result()
+        canonical = self.controller.canonical_task(task)
+        key = self.job_key(canonical)
+        verdict = result["states"].get(key[1]) if key[0] == "state" else result["transitions"].get((key[1], key[2]))
+
+        # Stored once per task, whether by callback or by run_tasks
+        with self.merge_lock:
+            stored = getattr(future, "mirrored", set())
+            if task in stored:
+                return
+            self.controller.record_equivalent(task, canonical, verdict)
+            stored.add(task)
+            future.mirrored = stored
+
+    # Stops sharing a job once its verdicts have been merged, later requests are answered from the tables
+    def finish_job(self, key, future):
+
+        with self.in_flight_lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    # Adds the verdicts of a completed task to the controller's tables, once per task
+    def store_result(self, future):
+
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"Error processing data: {future.exception()}")
+            return
+
+        with self.merge_lock:
+            if getattr(future, "merged", False):
+                return
+            self.controller.merge_verdicts(future.result())
+            future.merged = True
+
+    # Runs every task and waits for them to finish, reporting progress as they complete.
+    # Tasks are taken from the iterable as earlier ones complete, with at most max_pending checks queued or running at once.
+    # Returns: the number of checks completed.
+    def run_tasks(self, tasks, queue_class="batch"):
+
+        if self.pool is None:
+            self.start()
+
+        # The end time can only be projected when the number of tasks is known up front
+        total_jobs = sum(len(self.split_task(task)) for task in tasks) if isinstance(tasks, list) else None
+        print(f"{total_jobs if total_jobs is not None else 'Streaming'} tasks queued for {self.workers} workers, at most {self.max_pending} at a time.")
+
+        start_time = datetime.utcnow()
+        # Checks waiting on each future, tasks that repeat a check share one future
+        pending = {}
+        jobs_completed = 0
+
+        try:
+            for task in tasks:
+                for job in self.split_task(task):
+                    pending.setdefault(self.submit_job(job, queue_class), []).append(job)
+
+                # Stop reading tasks until the workers catch up
+                while len(pending) >= self.max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    jobs_completed += self.collect(done, pending)
+                    self.report_progress(jobs_completed, len(pending), start_time, total_jobs)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                jobs_completed += self.collect(done, pending)
+                self.report_progress(jobs_completed, len(pending), start_time, total_jobs)
+
+        except KeyboardInterrupt:
+            print("\nInterrupt Recieved, shutting down workers...")
+            self.shutdown(cancel=True)
+            raise
+
+        return jobs_completed
+
+    # Stores the verdicts of completed futures and of the checks waiting on them, removing them from pending.
+    # Returns: the number of checks completed.
+    def collect(self, done, pending):
+
+        jobs_completed = 0
+        for future in done:
+            # Results are also stored here, so they are all in the tables when run_tasks returns even if a callback has not run yet
+            self.store_result(future)
+
+            for job in pending.pop(future):
+                # Store the verdicts of checks answered by an equivalent canonical check, in case a callback has not run yet
+                if self.job_key(job) is not None and self.controller.canonical_task(job) != job:
+                    self.store_mirrored(job, future)
+                jobs_completed += 1
+
+        return jobs_completed
+
+    def report_progress(self, jobs_completed, jobs_in_flight, start_time, total_jobs):
+
+        # Calculate average job time and project the end time of the batch
+        elapsed_time = datetime.utcnow() - start_time
+        avg_job_time = elapsed_time / jobs_completed if jobs_completed > 0 else timedelta(0)
+
+        if total_jobs is not None:
+            projected_end_time = datetime.utcnow() + avg_job_time * (total_jobs - jobs_completed)
+            print(f"{total_jobs - jobs_completed} tasks remaining, averaging {avg_job_time.total_seconds()} seconds per task, projected to finish around {projected_end_time}.")
+        else:
+            print(f"{jobs_completed} tasks completed, {jobs_in_flight} in flight, averaging {avg_job_time.total_seconds()} seconds per task.")
+
+    # Stops the worker processes, waiting for queued tasks to finish unless they are cancelled
+    def shutdown(self, cancel=False):
+
+        self.closed = True
+
+        if self.pool is not None:
+            if cancel:
+                with self.queue_lock:
+                    queued = [entry[5] for entry in self.queue if entry[5] is not None]
+                    self.queue = []
+                    self.queue_entries = {}
+                for future in queued:
+                    future.cancel()
+
+            # Queued jobs are handed to the pool as workers free up, so wait for the queue to empty before closing it
+            while True:
+                with self.queue_lock:
+                    queued = [entry[5] for entry in self.queue if entry[5] is not None]
+                if not queued:
+                    break
+                wait(queued)
+
+            self.pool.shutdown(wait=True, cancel_futures=cancel)
+            self.pool = None
+
+        # The workers' models and pan binaries are not kept, and on tmpfs they would hold memory until reboot
+        if self.run_workspace is not None:
+            shutil.rmtree(self.run_workspace, ignore_errors=True)
+            self.run_workspace = None
+
+        if self.shared_jobs:
+            print(f"{self.shared_jobs} requests shared a check that was already in flight.")
+
+        self.print_queue_latency()
+
+    # Prints the number of jobs of each class and how long they waited for a worker
+    def print_queue_latency(self):
+
+        for queue_class, (count, total, longest) in self.queue_latency.items():
+            if count:
+                print(f"Queue latency of {queue_class} checks: {count} checks, {total / count:.3f} seconds on average, {longest:.3f} seconds at most.")
+
+
+# Builds the controller and workspace of a worker process
+def initialise_worker(settings, resources, workspace_root, running_checks=None):
+
+    global worker_controller, worker_workspace
+
+    from spin_controller import SpinController
+
+    worker_controller = SpinController()
+    for setting, value in settings.items():
+        setattr(worker_controller, setting, value)
+    worker_controller.enable_symmetry(worker_controller.symmetric_states, worker_controller.symmetric_transitions)
+    worker_controller.running_checks = running_checks
+
+    if resources["native_engine"]:
+        worker_controller.use_native_engine()
+    if resources["verdict_cache"]:
+        worker_controller.use_verdict_cache(resources["verdict_cache"])
+    if resources["reachability_bitmap"]:
+        worker_controller.use_reachability_bitmap(resources["reachability_bitmap"])
+    if resources["transition_index"]:
+        worker_controller.use_transition_index(resources["transition_index"])
+
+    worker_workspace = os.path.join(workspace_root, f"worker_{os.getpid()}")
+    if not os.path.exists(worker_workspace):
+        os.makedirs(worker_workspace)
+
+    # Parse the templates once, every check this worker runs renders from the compiled copies
+    worker_controller.compiled_template(worker_controller.transition_template_path, ["START", "END"])
+    if os.path.exists(worker_controller.state_template_path):
+        worker_controller.compiled_template(worker_controller.state_template_path, ["REACHABLE"])
+
+    # Build this worker's verifiers once before taking any work
+    if worker_controller.precompiled and not worker_controller.prepare_precompiled_workspace(worker_workspace):
+        print(f"Error: Precompiled verifiers unavailable in '{worker_workspace}', falling back to compiling each check.")
+        worker_controller.precompiled = False
+
+
+# Runs one task in a worker process.
+# Returns: dictionary with the verdicts of the "states" and "transitions" the task checked, the "models" it kept,
+# the "statistics" of its pan searches and the "timings" of its stages.
+def run_task(task):
+
+    with worker_controller.timed("job"), worker_controller.running_check():
+        result = check_task(worker_controller, task)
+
+    result["timings"] = worker_controller.take_stage_timings()
+    return result
+
+
+# Runs the checks of one task with a worker's controller
+def check_task(controller, task):
+
+    states = {}
+    transitions = {}
+
+    if task[0] == "state":
+        states[int(task[1])] = controller.check_state(controller.get_state_from_index(task[1]), worker_workspace)
+    elif task[0] == "both":
+        previous_state, next_state = int(task[1]), int(task[2])
+        states[previous_state] = controller.check_state(controller.get_state_from_index(previous_state), worker_workspace)
+        states[next_state] = controller.check_state(controller.get_state_from_index(next_state), worker_workspace)
+        transitions[(previous_state, next_state)] = controller.check_transition(controller.get_state_from_index(previous_state), controller.get_state_from_index(next_state), worker_workspace)
+    elif task[0] == "transition":
+        previous_state, next_state = int(task[1]), int(task[2])
+        transitions[(previous_state, next_state)] = controller.check_transition(controller.get_state_from_index(previous_state), controller.get_state_from_index(next_state), worker_workspace)
+    elif task[0] == "batch":
+        transitions.update(controller.check_transition_batch(task[1], worker_workspace))
+    else:
+        print(f"Unrecognised task: {task[0]}")
+
+    return {"states": states, "transitions": transitions, "models": controller.take_retained_models(), "statistics": controller.take_check_statistics()}
@@ -0,0 +1,70 @@
+import re
+
+# Placeholders are a prefix naming which state fills them, followed by the name of a state variable
+PLACEHOLDER_PATTERN = re.compile(r"\b(START|END|REACHABLE)_(\w+)\b")
+
+
+# Promela template parsed once into the text between its placeholders and the state bit each placeholder is filled from.
+# An instance is rendered in one pass by joining the text with the bits of the state ids, without searching the template again.
+# prefixes gives the placeholder prefix filled by each state id passed to render(), e.g. ["START", "END"] for a transition.
+class CompiledTemplate:
+
+    def __init__(self, text, state_columns, prefixes, name="template"):
+        self.name = name
+        self.prefixes = list(prefixes)
+        self.num_bits = len(state_columns)
+
+        bit_positions = {column: self.num_bits - 1 - i for i, column in enumerate(state_columns)}
+        id_positions = {prefix: i for i, prefix in enumerate(self.prefixes)}
+
+        # Literal text before each placeholder, plus the text after the last one
+        self.segments = []
+        # (index of the state id, bit position) of each placeholder
+        self.slots = []
+        self.placeholders = set()
+
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            prefix, column = match.group(1), match.group(2)
+
+            if column not in bit_positions:
+                raise ValueError(f"Unknown placeholder '{match.group(0)}' in {name}: '{column}' is not a state variable.")
+            if prefix not in id_positions:
+                raise ValueError(f"Placeholder '{match.group(0)}' in {name} cannot be filled, this template is rendered from {self.prefixes} states.")
+
+            self.segments.append(text[position:match.start()])
+            self.slots.append((id_positions[prefix], bit_positions[column]))
+            self.placeholders.add(match.group(0))
+            position = match.end()
+
+        self.segments.append(text[position:])
+
+    # Returns: for each state id passed to render(), the bit mask of the variables it fills placeholders with
+    def dependency_masks(self):
+
+        masks = [0] * len(self.prefixes)
+        for index, bit in self.slots:
+            masks[index] |= 1 << bit
+        return masks
+
+    @classmethod
+    def from_file(cls, template_path, state_columns, prefixes):
+        with open(template_path, 'r') as input_file:
+            return cls(input_file.read(), state_columns, prefixes, template_path)
+
+    # Fills every placeholder with the bit of its state id, one state id per prefix.
+    # Returns: the text of the instance.
+    def render(self, *state_ids):
+
+        if len(state_ids) != len(self.prefixes):
+            raise ValueError(f"{self.name} is rendered from {len(self.prefixes)} state ids, got {len(state_ids)}.")
+        for state_id in state_ids:
+            if state_id is None or not 0 <= int(state_id) < (1 << self.num_bits):
+                raise ValueError(f"Cannot fill the placeholders of {self.name} from state id {state_id}.")
+
+        state_ids = [int(state_id) for state_id in state_ids]
+        pieces = [None] * (2 * len(self.slots) + 1)
+        pieces[::2] = self.segments
+        pieces[1::2] = ["1" if (state_ids[index] >> bit) & 1 else "0" for index, bit in self.slots]
+
+        return "".join(pieces)
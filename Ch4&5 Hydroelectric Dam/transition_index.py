@@ -0,0 +1,94 @@
+import os
+import shutil
+import numpy as np
+
+# Number of bits in a state id (see SpinController.state_columns)
+NUM_BITS = 23
+
+
+# Index of the verified transition relation, stored in compressed sparse row form over state ids.
+# offsets has one entry per state id plus one, and the successors of state s are successors[offsets[s]:offsets[s + 1]], sorted.
+# Both arrays are saved as .npy files in a directory and memory-mapped on load, so opening an index does not read or parse it.
+class TransitionIndex:
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode='r')
+        self.successor_ids = np.load(os.path.join(path, "successors.npy"), mmap_mode='r')
+
+    # Writes an index holding the given transitions, replacing any existing index at the path.
+    # Returns: the index, opened for reading.
+    @classmethod
+    def create(cls, path, previous_states, next_states, num_bits=NUM_BITS):
+
+        previous_states = np.asarray(previous_states, dtype=np.int64)
+        next_states = np.asarray(next_states, dtype=np.int64)
+
+        # The -1 previous state that marks the first recorded state is not a transition, callers must leave it out
+        for name, states in (("previous", previous_states), ("next", next_states)):
+            invalid = (states < 0) | (states >= 1 << num_bits)
+            if invalid.any():
+                raise ValueError(f"Cannot index {int(invalid.sum())} transitions whose {name} state is not a {num_bits}-bit state id, e.g. {int(states[invalid][0])}.")
+
+        # Sorting the packed pairs orders them by previous state, then next state, and removes duplicates
+        pairs = np.unique((previous_states << num_bits) | next_states)
+        sources = pairs >> num_bits
+        successor_ids = (pairs & ((1 << num_bits) - 1)).astype(np.uint32)
+
+        # 32-bit offsets keep the index at 32 MiB plus 4 bytes per transition
+        offsets = np.zeros((1 << num_bits) + 1, dtype=np.uint32)
+        np.cumsum(np.bincount(sources, minlength=1 << num_bits), out=offsets[1:])
+
+        # Write to a temporary directory first so a reader never sees a partial index
+        temporary_path = f"{path}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        np.save(os.path.join(temporary_path, "offsets.npy"), offsets)
+        np.save(os.path.join(temporary_path, "successors.npy"), successor_ids)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temporary_path, path)
+
+        return cls(path)
+
+    # Returns: sorted array of the states the given state can move to
+    def successors(self, state):
+        state = int(state)
+        return np.asarray(self.successor_ids[self.offsets[state]:self.offsets[state + 1]])
+
+    # Returns: True if the transition is in the index
+    def is_valid(self, previous_state, next_state):
+        successors = self.successors(previous_state)
+        position = np.searchsorted(successors, next_state)
+        return bool(position < len(successors) and successors[position] == next_state)
+
+    # Returns: boolean array recording which of the transitions are in the index
+    def contains_many(self, previous_states, next_states):
+
+        previous_states = np.asarray(previous_states, dtype=np.int64)
+        next_states = np.asarray(next_states, dtype=np.int64)
+
+        # Binary search every transition's row of successors at the same time
+        low = self.offsets[previous_states].astype(np.int64)
+        end = self.offsets[previous_states + 1].astype(np.int64)
+        high = end.copy()
+
+        active = low < high
+        while active.any():
+            middle = (low + high) // 2
+            go_right = np.asarray(self.successor_ids[np.where(active, middle, 0)]) < next_states
+            low = np.where(active & go_right, middle + 1, low)
+            high = np.where(active & ~go_right, middle, high)
+            active = low < high
+
+        found = low < end
+        found[found] = self.successor_ids[low[found]] == next_states[found]
+        return found
+
+    # Returns: arrays of the previous and next state of every transition in the index
+    def pairs(self):
+        sources = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        return sources, np.asarray(self.successor_ids, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.successor_ids)
@@ -0,0 +1,99 @@
+import os
+import hashlib
+import sqlite3
+import threading
+
+# Verdicts kept between runs in an SQLite database.
+# Every verdict is stored with the hash of the template that produced it, so editing a template only invalidates its own entries.
+# Each thread and process opens its own connection, the database handles writers from several processes at once.
+class VerdictCache:
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+        connection = self.connection()
+        connection.executescript(
+            "CREATE TABLE IF NOT EXISTS state_verdicts ("
+            "template_hash TEXT NOT NULL, state INTEGER NOT NULL, reachable INTEGER NOT NULL, "
+            "PRIMARY KEY (template_hash, state));"
+            "CREATE TABLE IF NOT EXISTS transition_verdicts ("
+            "template_hash TEXT NOT NULL, previous_state INTEGER NOT NULL, next_state INTEGER NOT NULL, valid INTEGER NOT NULL, "
+            "PRIMARY KEY (template_hash, previous_state, next_state));"
+        )
+        connection.commit()
+
+    # Connections cannot be shared between threads or carried into a forked process, so one is opened for each
+    def connection(self):
+
+        if getattr(self.local, "pid", None) != os.getpid():
+            self.local.connection = sqlite3.connect(self.path, timeout=60)
+            self.local.connection.execute("PRAGMA journal_mode=WAL")
+            self.local.pid = os.getpid()
+
+        return self.local.connection
+
+    # The connections are not sent to other processes, they open their own
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.local = threading.local()
+
+    # Returns: the cached reachability of a state, None if it has not been verified with this template
+    def get_state(self, template_hash, state):
+        row = self.connection().execute(
+            "SELECT reachable FROM state_verdicts WHERE template_hash = ? AND state = ?",
+            (template_hash, int(state))
+        ).fetchone()
+        return None if row is None else bool(row[0])
+
+    # Returns: the cached validity of a transition, None if it has not been verified with this template
+    def get_transition(self, template_hash, previous_state, next_state):
+        row = self.connection().execute(
+            "SELECT valid FROM transition_verdicts WHERE template_hash = ? AND previous_state = ? AND next_state = ?",
+            (template_hash, int(previous_state), int(next_state))
+        ).fetchone()
+        return None if row is None else bool(row[0])
+
+    # Returns: dictionary of (previous_state, next_state) -> validity for the transitions that have been verified with this template
+    def get_transitions(self, template_hash, pairs):
+
+        connection = self.connection()
+        results = {}
+        for previous_state, next_state in pairs:
+            row = connection.execute(
+                "SELECT valid FROM transition_verdicts WHERE template_hash = ? AND previous_state = ? AND next_state = ?",
+                (template_hash, int(previous_state), int(next_state))
+            ).fetchone()
+            if row is not None:
+                results[(int(previous_state), int(next_state))] = bool(row[0])
+
+        return results
+
+    def put_state(self, template_hash, state, reachable):
+        connection = self.connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO state_verdicts VALUES (?, ?, ?)",
+            (template_hash, int(state), int(bool(reachable)))
+        )
+        connection.commit()
+
+    def put_transition(self, template_hash, previous_state, next_state, valid):
+        self.put_transitions(template_hash, {(previous_state, next_state): valid})
+
+    # Stores the validity of many transitions in one commit, from a dictionary of (previous_state, next_state) -> validity
+    def put_transitions(self, template_hash, verdicts):
+        connection = self.connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO transition_verdicts VALUES (?, ?, ?, ?)",
+            [(template_hash, int(previous_state), int(next_state), int(bool(valid))) for (previous_state, next_state), valid in verdicts.items()]
+        )
+        connection.commit()
+
+
+# Returns: hash of a template's contents, identifying the verdicts it produces
+def template_hash(template_path):
+    with open(template_path, 'rb') as template_file:
+        return hashlib.sha256(template_file.read()).hexdigest()
@@ -0,0 +1,115 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Number of bits in a state id (see SpinController.state_columns)
+NUM_BITS = 23
+
+
+# Memoisation table of verdicts keyed by one state id, or by a pair of state ids packed into a single integer.
+# Lookups and inserts are dictionary operations, the table is only turned into a DataFrame when it is exported.
+# A verdict of None marks an entry that is listed but has not been checked yet.
+class VerdictStore:
+
+    def __init__(self, key_columns, verdict_column, num_bits=NUM_BITS):
+        self.key_columns = list(key_columns)
+        self.verdict_column = verdict_column
+        self.num_bits = num_bits
+        self.verdicts = {}
+        self.lock = threading.Lock()
+
+    # Creates a store from a DataFrame with the key and verdict columns, missing verdicts are kept as unchecked
+    @classmethod
+    def from_frame(cls, frame, key_columns, verdict_column, num_bits=NUM_BITS):
+
+        store = cls(key_columns, verdict_column, num_bits)
+        if frame.empty:
+            return store
+
+        keys = store.pack_many(*(frame[column].values.astype(np.int64) for column in store.key_columns))
+        if verdict_column in frame:
+            verdicts = [None if pd.isna(verdict) else bool(verdict) for verdict in frame[verdict_column]]
+        else:
+            verdicts = [None] * len(frame)
+
+        # Earlier rows take precedence, as they did when the table was searched in order
+        for key, verdict in zip(keys.tolist(), verdicts):
+            store.verdicts.setdefault(key, verdict)
+
+        return store
+
+    # Packs the state ids of one entry into its key
+    def pack(self, *ids):
+        key = 0
+        for state_id in ids:
+            key = (key << self.num_bits) | int(state_id)
+        return key
+
+    # Packs arrays of state ids into an array of keys
+    def pack_many(self, *ids):
+        keys = np.zeros(len(ids[0]), dtype=np.int64)
+        for state_ids in ids:
+            keys = (keys << self.num_bits) | np.asarray(state_ids, dtype=np.int64)
+        return keys
+
+    # Returns: the verdict of an entry, None if it is not in the store or has not been checked
+    def get(self, *ids):
+        return self.verdicts.get(self.pack(*ids))
+
+    # Returns: True if the entry has a verdict
+    def is_checked(self, *ids):
+        return self.verdicts.get(self.pack(*ids)) is not None
+
+    # Sets the verdict of an entry, adding it if it is not in the store
+    def record(self, *ids, verdict):
+        with self.lock:
+            self.verdicts[self.pack(*ids)] = verdict
+
+    # Sets the verdicts of many entries at once from a dictionary of id tuples (or single ids) to verdicts
+    def update(self, verdicts):
+        packed = {self.pack(*ids) if isinstance(ids, tuple) else self.pack(ids): verdict for ids, verdict in verdicts.items()}
+        with self.lock:
+            self.verdicts.update(packed)
+
+    # Returns: dictionary of id tuples (single ids for a store keyed by one column) to verdicts for every checked entry
+    def checked(self):
+        with self.lock:
+            items = list(self.verdicts.items())
+        return {self.unpack(key): verdict for key, verdict in items if verdict is not None}
+
+    # Splits a key back into its state ids
+    def unpack(self, key):
+        if len(self.key_columns) == 1:
+            return key
+
+        mask = (1 << self.num_bits) - 1
+        ids = []
+        for _ in self.key_columns:
+            ids.append(key & mask)
+            key >>= self.num_bits
+        return tuple(reversed(ids))
+
+    # Returns: the store as a DataFrame with one row per entry, in the order the entries were added
+    def to_frame(self):
+
+        with self.lock:
+            keys = np.fromiter(self.verdicts.keys(), dtype=np.int64, count=len(self.verdicts))
+            verdicts = list(self.verdicts.values())
+
+        mask = (1 << self.num_bits) - 1
+        columns = {}
+        for i, column in enumerate(self.key_columns):
+            shift = self.num_bits * (len(self.key_columns) - 1 - i)
+            columns[column] = (keys >> shift) & mask
+        columns[self.verdict_column] = pd.Series(verdicts, dtype=object)
+
+        return pd.DataFrame(columns)
+
+    def to_csv(self, path, **kwargs):
+        self.to_frame().to_csv(path, **kwargs)
+
+    def __len__(self):
+        return len(self.verdicts)
+
+    def __contains__(self, ids):
+        return self.pack(*ids) in self.verdicts if isinstance(ids, tuple) else self.pack(ids) in self.verdicts
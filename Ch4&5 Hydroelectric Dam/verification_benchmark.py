@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Directory of the evaluation workloads, relative to this folder
+DATASETS_DIRECTORY = "evaluation_files/datasets"
+
+# Settings of the controller for each backend a workload can be run on
+BACKENDS = {
+    "process": {},
+    "precompiled": {"precompiled": True},
+    "batch": {"batch_size": 100},
+    "async": {"async_pipeline": True},
+    "native": {},
+}
+
+# Figures compared with the baseline, and whether a larger value is better
+BASELINE_FIGURES = {
+    "checks_per_second": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "peak_memory_mb": False,
+}
+
+# Tools replaced by pan_stub.py when benchmarking without SPIN
+STUB_TOOLS = ["spin", "gcc", "pan", "pan_state", "pan_transition"]
+
+
+# Returns: the key a benchmark's figures are stored under in the baseline
+def benchmark_key(dataset, backend, workers, sample):
+    return f"{dataset}|{backend}|{workers}|{sample if sample else 'all'}"
+
+
+# Returns: "state" for a workload of states, "transition" for one of (previous_state, next_state) pairs
+def workload_kind(dataset):
+    return "state" if "state" in pd.read_csv(os.path.join(DATASETS_DIRECTORY, dataset), nrows=0).columns else "transition"
+
+
+# Reads the checks of a workload, a fixed-size sample of them when sample is set.
+# The sample is drawn with a fixed seed, so every run of a benchmark checks the same states or transitions.
+# Returns: "state" or "transition", and the list of state ids or (previous_state, next_state) pairs.
+def load_workload(dataset, sample=None, seed=0):
+
+    workload = pd.read_csv(os.path.join(DATASETS_DIRECTORY, dataset))
+    if sample and sample < len(workload):
+        workload = workload.sample(sample, random_state=seed)
+
+    if workload_kind(dataset) == "state":
+        return "state", [int(state) for state in workload["state"]]
+    return "transition", [(int(previous_state), int(next_state)) for previous_state, next_state in zip(workload["previous_state"], workload["next_state"])]
+
+
+# Writes the executables that run pan_stub.py in place of each SPIN tool
+# Returns: the directory to put at the front of PATH.
+def install_pan_stub(directory):
+
+    os.makedirs(directory, exist_ok=True)
+    stub = os.path.abspath("pan_stub.py")
+
+    for tool in STUB_TOOLS:
+        path = os.path.join(directory, tool)
+        with open(path, 'w') as output:
+            output.write(f'#!/bin/sh\nexec "{sys.executable}" "{stub}" {tool} "$@"\n')
+        os.chmod(path, 0o755)
+
+    return directory
+
+
+# Returns: the number of checks of a workload that the controller has a verdict for
+def count_verdicts(controller, kind, checks):
+
+    if kind == "state":
+        return sum(1 for state in checks if controller.state_verdicts.get(state) is not None)
+    return sum(1 for previous_state, next_state in checks if controller.transition_verdicts.get(previous_state, next_state) is not None)
+
+
+# Runs one benchmark in this process: checks a workload on a fresh controller, with no verdict cache and no kept models.
+# Throughput only counts the checks that got a verdict, and the benchmark fails if any check has none,
+# so a run whose checks error out is never reported (or saved as a baseline) as fast.
+# Returns: dictionary of the benchmark's settings and figures.
+# Raises: RuntimeError if a check has no verdict.
+def run_benchmark(config):
+
+    from spin_controller import SpinController
+
+    kind, checks = load_workload(config["dataset"], config["sample"], config["seed"])
+
+    controller = SpinController()
+    controller.workers = config["workers"]
+    controller.workspace_root = config["workspace_root"]
+    controller.retention = "none"
+    for setting, value in BACKENDS[config["backend"]].items():
+        setattr(controller, setting, value)
+    controller.use_metrics(keep_samples=True)
+
+    start = time.perf_counter()
+
+    if config["backend"] == "native":
+        if kind != "transition":
+            raise ValueError("The native engine only checks transitions.")
+        controller.use_native_engine()
+        start = time.perf_counter()
+        pairs = np.array(checks)
+        with controller.timed("job"):
+            verdicts = controller.engine.is_transition(pairs[:, 0], pairs[:, 1], controller.engine_property_mask)
+
+    elif kind == "state":
+        controller.run_tasks([("state", state) for state in checks])
+
+    else:
+        tasks, mirrored = controller.transition_tasks(checks)
+        controller.run_tasks(tasks)
+        controller.record_mirrored_transitions(mirrored)
+
+    seconds = time.perf_counter() - start
+
+    verified = len(verdicts) if config["backend"] == "native" else count_verdicts(controller, kind, checks)
+    if verified < len(checks):
+        raise RuntimeError(f"{len(checks) - verified} of {len(checks)} checks of {config['dataset']} on {config['backend']} have no verdict.")
+
+    # The largest resident set of this process and of every worker, pan included, it waited for
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # Latency of a job: the time a worker (or, for the async pipeline, a process slot) spent on it
+    latencies = np.array(controller.metrics.samples["job"]) * 1000
+    searches = len(controller.take_check_statistics())
+
+    return {
+        "dataset": config["dataset"],
+        "backend": config["backend"],
+        "workers": config["workers"],
+        "sample": config["sample"],
+        "checks": len(checks),
+        "verified": verified,
+        "pan_searches": searches,
+        "seconds": seconds,
+        "checks_per_second": verified / seconds if seconds > 0 else None,
+        "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "latency_p90_ms": float(np.percentile(latencies, 90)) if len(latencies) else None,
+        "latency_p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        "peak_memory_mb": peak_kb / 1024,
+    }
+
+
+# Runs one benchmark in a new Python process, so its peak memory and worker pool are its own.
+# The controller's output goes to a log file in the output directory.
+# Returns: the benchmark's figures, or None if it failed.
+def run_isolated(config, output_directory, env):
+
+    name = f"{os.path.splitext(config['dataset'])[0]}_{config['backend']}_{config['workers']}_{config['repeat']}"
+    result_path = os.path.join(output_directory, f"{name}.json")
+    log_path = os.path.join(output_directory, f"{name}.log")
+
+    with open(log_path, 'w') as log:
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), "--run_one", json.dumps(config), "--result", result_path], stdout=log, stderr=subprocess.STDOUT, env=env)
+
+    if process.returncode != 0 or not os.path.exists(result_path):
+        print(f"Error: Benchmark {name} failed, see '{log_path}'.")
+        return None
+
+    with open(result_path, 'r') as input_file:
+        return json.load(input_file)
+
+
+# Compares a run's figures with the baseline, allowing each figure to be worse by the tolerance (a fraction of the baseline).
+# Returns: list of regression descriptions, empty if the run is no worse than the baseline.
+def find_regressions(results, baseline, tolerance):
+
+    regressions = []
+    for row in results.itertuples(index=False):
+        key = benchmark_key(row.dataset, row.backend, row.workers, row.sample)
+        if key not in baseline:
+            print(f"No baseline for {key}.")
+            continue
+
+        for figure, larger_is_better in BASELINE_FIGURES.items():
+            value, expected = getattr(row, figure), baseline[key].get(figure)
+            if value is None or expected is None or pd.isna(value) or pd.isna(expected):
+                continue
+
+            if larger_is_better and value < expected * (1 - tolerance):
+                regressions.append(f"{key}: {figure} fell from {expected:.4g} to {value:.4g}")
+            elif not larger_is_better and value > expected * (1 + tolerance):
+                regressions.append(f"{key}: {figure} rose from {expected:.4g} to {value:.4g}")
+
+    return regressions
+
+
+def save_baseline(results, baseline_path):
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as input_file:
+            baseline = json.load(input_file)
+
+    for row in results.itertuples(index=False):
+        key = benchmark_key(row.dataset, row.backend, row.workers, row.sample)
+        baseline[key] = {figure: None if pd.isna(getattr(row, figure)) else float(getattr(row, figure)) for figure in BASELINE_FIGURES}
+
+    os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+    with open(baseline_path, 'w') as output:
+        json.dump(baseline, output, indent=2, sort_keys=True)
+
+    print(f"Baseline of {len(results)} benchmarks saved to '{baseline_path}'.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Verification benchmark.")
+    parser.add_argument("--datasets", dest="datasets", nargs="+", default=["fn_1step.csv"], help=f"Workloads to run, files in '{DATASETS_DIRECTORY}'.")
+    parser.add_argument("--sample", dest="sample", type=int, default=500, help="Number of checks sampled from each workload, 0 runs the whole file.")
+    parser.add_argument("--seed", dest="seed", type=int, default=0, help="Seed of the workload samples.")
+    parser.add_argument("--backends", dest="backends", nargs="+", choices=list(BACKENDS), default=["process"], help="Backends each workload is run on.")
+    parser.add_argument("--workers", dest="workers", nargs="+", type=int, default=[1, os.cpu_count()], help="Worker counts each workload is run with.")
+    parser.add_argument("--repeat", dest="repeat", type=int, default=1, help="Number of runs of each benchmark, the median of each figure is reported.")
+    parser.add_argument("--pan_stub", dest="pan_stub", action="store_true", help="Run pan_stub.py in place of spin, gcc and pan, to benchmark the orchestration alone.")
+    parser.add_argument("--stub_seconds", dest="stub_seconds", nargs=3, type=float, default=[0, 0, 0], metavar=("SPIN", "GCC", "PAN"), help="Seconds the pan stub's spin, gcc and pan each take.")
+    parser.add_argument("--output", dest="output", type=str, default="evaluation_files/benchmarks", help="Directory for the results and the log of each run.")
+    parser.add_argument("--baseline", dest="baseline", type=str, default=None, help="JSON baseline to compare the results with, failing if any figure is worse by more than --tolerance.")
+    parser.add_argument("--tolerance", dest="tolerance", type=float, default=0.2, help="Fraction by which a figure may be worse than the baseline.")
+    parser.add_argument("--save_baseline", dest="save_baseline", action="store_true", help="Store the results in --baseline instead of comparing with it.")
+    parser.add_argument("--run_one", dest="run_one", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", dest="result", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Benchmarks are run from this folder, where the templates and datasets are
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.run_one:
+        result = run_benchmark(json.loads(args.run_one))
+        with open(args.result, 'w') as output:
+            json.dump(result, output)
+        sys.exit(0)
+
+    os.makedirs(args.output, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix="hydro_benchmark_")
+
+    env = dict(os.environ)
+    if args.pan_stub:
+        env["PATH"] = install_pan_stub(os.path.join(scratch, "bin")) + os.pathsep + env.get("PATH", "")
+        for tool, seconds in zip(["SPIN", "GCC", "PAN"], args.stub_seconds):
+            env[f"PAN_STUB_{tool}_SECONDS"] = str(seconds)
+
+    runs = []
+    failed = []
+    try:
+        for dataset in args.datasets:
+            for backend in args.backends:
+                if backend == "native" and workload_kind(dataset) == "state":
+                    print(f"Skipping {dataset} on native, the native engine only checks transitions.")
+                    continue
+
+                # The native engine runs in one process, whatever the worker count
+                for workers in ([1] if backend == "native" else args.workers):
+                    for repeat in range(args.repeat):
+                        config = {
+                            "dataset": dataset,
+                            "backend": backend,
+                            "workers": workers,
+                            "sample": args.sample,
+                            "seed": args.seed,
+                            "repeat": repeat,
+                            "workspace_root": os.path.join(scratch, f"workspace_{len(runs)}"),
+                        }
+                        print(f"Running {dataset} on {backend} with {workers} workers ({repeat + 1}/{args.repeat})...")
+                        result = run_isolated(config, args.output, env)
+                        if result is not None:
+                            runs.append(result)
+                        else:
+                            failed.append(config)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if not runs:
+        print("Error: No benchmark completed.")
+        sys.exit(1)
+
+    # Median of each figure over the repeats of a benchmark
+    runs = pd.DataFrame(runs)
+    results = runs.groupby(["dataset", "backend", "workers", "sample"], as_index=False, sort=False).median(numeric_only=True)
+    results["pan_stub"] = args.pan_stub
+    results["cpus"] = os.cpu_count()
+
+    results_path = os.path.join(args.output, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    results.to_csv(results_path, index=False)
+
+    pd.set_option('display.width', 200)
+    print(f"\n{results.to_string(index=False, float_format=lambda value: f'{value:.4g}')}")
+    print(f"\nResults written to '{results_path}'.")
+
+    # A failed benchmark has no figures to compare, so the run fails rather than passing on the benchmarks that did complete
+    if failed:
+        print(f"\nFAILED: {len(failed)} benchmarks crashed or left checks without a verdict, see their logs in '{args.output}'. No baseline comparison is made.")
+        sys.exit(1)
+
+    if args.baseline and args.save_baseline:
+        save_baseline(results, args.baseline)
+    elif args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"Error: Baseline '{args.baseline}' does not exist, create it with --save_baseline.")
+            sys.exit(1)
+
+        with open(args.baseline, 'r') as input_file:
+            baseline = json.load(input_file)
+
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSION: {len(regressions)} figures are worse than the baseline by more than {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"\t{regression}")
+            sys.exit(1)
+
+        print(f"\nNo regressions against '{args.baseline}'.")
@@ -0,0 +1,98 @@
+import math
+import re
+
+# Compile-time options of every profile, and the search options every profile runs pan with
+BASE_DEFINES = ["-DMEMLIM=4096"]
+BASE_OPTIONS = ["-m100000"]
+
+# Default bitstate hash size, as the log2 of the number of bits (pan -w)
+DEFAULT_HASH_SIZE = 27
+
+# Number of hash functions pan's bitstate search sets a bit with (pan -k, 3 by default)
+BITSTATE_HASH_FUNCTIONS = 3
+
+# Profiles a check can be verified with:
+#   exhaustive - the default exhaustive search
+#   collapse   - exhaustive with compressed state vectors (-DCOLLAPSE), slower but uses less memory
+#   hc4        - states compressed to 4 byte hashes (-DHC4), rarely misses a state
+#   bitstate   - one bit per state (-DBITSTATE), the fastest and smallest search but may miss states
+#   safety     - exhaustive without the checks needed for liveness properties (-DSAFETY), for safety properties only
+# A check is verified with a list of profiles, the escalation: the first is always run, and each one after it is only run
+# when the search before it was inconclusive, e.g. ["bitstate", "exhaustive"] sweeps with bitstate and confirms its misses.
+PROFILE_NAMES = ["exhaustive", "collapse", "hc4", "bitstate", "safety"]
+
+# Lines pan prints when a search stopped before covering the state space
+INCOMPLETE_SEARCH_PATTERN = re.compile(r"pan: out of memory|pan: reached -DMEMLIM bound|error: max search depth too small")
+
+
+# A pan verification profile: the options the verifier is compiled and run with, and whether a search that finds no
+# error proves there is none (exact) or only estimates it (see coverage()).
+class VerificationProfile:
+
+    def __init__(self, name, defines, options, exact):
+        self.name = name
+        self.defines = list(defines)
+        self.options = list(options)
+        self.exact = exact
+
+    # Returns: the gcc arguments that compile pan.c into the verifier, with any extra defines such as -DPROV
+    def gcc_arguments(self, output="pan", extra_defines=()):
+        return ["gcc", *BASE_DEFINES, *self.defines, *extra_defines, "-O2", "-w", "-o", output, "pan.c"]
+
+    # Returns: the options pan is run with
+    def pan_arguments(self):
+        return [*BASE_OPTIONS, *self.options]
+
+    # Estimates the fraction of the state space a search covered, from its statistics (see pan_statistics.parse_pan_output).
+    # Bitstate searches are estimated from pan's hash factor h, the bits per stored state: with k hash functions a new
+    # state is taken for one already seen with probability (1 - e^(-k/h))^k. Hash compaction keeps a 32 bit hash of each
+    # state, so a state is lost with probability about n / 2^32 for n states stored.
+    # Returns: the estimate, None if the statistics needed are missing.
+    def coverage(self, statistics):
+
+        if self.exact:
+            return 1.0
+
+        if "-DBITSTATE" in self.defines:
+            hash_factor = statistics.get("hash_factor")
+            if not hash_factor:
+                return None
+            return 1 - (1 - math.exp(-BITSTATE_HASH_FUNCTIONS / hash_factor)) ** BITSTATE_HASH_FUNCTIONS
+
+        states_stored = statistics.get("states_stored")
+        if states_stored is None:
+            return None
+        return max(0.0, 1 - states_stored / 2**32)
+
+    # A search is inconclusive if pan failed, or it found no error without covering the whole state space:
+    # an inexact profile, running out of memory or reaching the depth limit. An error found is always a real counterexample.
+    # Returns: True if the check should be verified again with the next profile.
+    def inconclusive(self, verdict, pan_stdout):
+
+        if verdict is None:
+            return True
+        if verdict:
+            return False
+        return not self.exact or INCOMPLETE_SEARCH_PATTERN.search(pan_stdout) is not None
+
+
+# Returns: dictionary of profile name -> VerificationProfile, bitstate searches using 2^hash_size bits
+def make_profiles(hash_size=DEFAULT_HASH_SIZE):
+
+    return {
+        "bitstate": VerificationProfile("bitstate", ["-DBITSTATE"], [f"-w{hash_size}"], exact=False),
+        "hc4": VerificationProfile("hc4", ["-DHC4"], [], exact=False),
+        "collapse": VerificationProfile("collapse", ["-DCOLLAPSE"], [], exact=True),
+        "safety": VerificationProfile("safety", ["-DSAFETY"], [], exact=True),
+        "exhaustive": VerificationProfile("exhaustive", [], [], exact=True),
+    }
+
+
+# A property can be checked with -DSAFETY if it only says a state predicate never (or always) holds: !<>(p) or [](p),
+# where p has no temporal operators. The templates' properties say the placeholder state is never reached.
+# Returns: True if the ltl formula is a safety property of this form.
+def is_safety_property(ltl_formula):
+
+    formula = re.sub(r"/\*.*?\*/", "", ltl_formula, flags=re.S).strip()
+    match = re.match(r"(!\s*<>|\[\])\s*\((.*)\)\s*$", formula, re.S)
+    return match is not None and re.search(r"<>|\[\]|\b[UWVX]\b", match.group(2)) is None
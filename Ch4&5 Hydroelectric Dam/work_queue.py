@@ -0,0 +1,446 @@
+import os
+import time
+import pickle
+import shutil
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing.managers import BaseManager
+
+# Seconds a worker holds a job before it is given to another worker, unless the worker renews the lease
+DEFAULT_LEASE_SECONDS = 120
+
+# Number of times a job is leased before it is marked failed, e.g. a check that kills every worker that runs it
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds between polls of the queue by idle workers and by the coordinator waiting for results
+POLL_SECONDS = 0.2
+
+# Times in a row the coordinator retries collecting results after the database was locked or busy, before failing every job
+COLLECT_RETRIES = 5
+
+# Environment variable holding the key workers and the coordinator authenticate with when the queue is served over TCP
+AUTHKEY_VARIABLE = "HYDRO_QUEUE_KEY"
+
+
+# Jobs shared by a coordinator and workers on any number of machines, kept in an SQLite database.
+# A worker leases jobs and renews the lease while it checks them. A lease that runs out, e.g. because the worker died,
+# returns the job to the queue for another worker, and a job leased max_attempts times without a result is marked failed.
+# Workers on the coordinator's machine can open the database, other machines reach it through serve_work_queue().
+# Tasks and results are stored pickled, so the database must only be writable by the campaign's own coordinator and workers.
+# The coordinator sets the lease time, which is stored with the queue for the workers.
+class WorkQueue:
+
+    def __init__(self, path, lease_seconds=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+
+        connection = self.connection()
+        connection.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, task BLOB NOT NULL, status TEXT NOT NULL DEFAULT 'queued', "
+            "worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, result BLOB, error TEXT);"
+            "CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, id);"
+            "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value BLOB NOT NULL);"
+        )
+        connection.commit()
+
+        if lease_seconds is not None:
+            self.publish("lease_seconds", lease_seconds)
+
+    # Connections cannot be shared between threads or carried into a forked process, so one is opened for each
+    def connection(self):
+
+        if getattr(self.local, "pid", None) != os.getpid():
+            self.local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self.local.connection.execute("PRAGMA journal_mode=WAL")
+            self.local.pid = os.getpid()
+
+        return self.local.connection
+
+    def __getstate__(self):
+        return {"path": self.path, "max_attempts": self.max_attempts}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    # Stores a value for every worker, e.g. the controller settings they check with
+    def publish(self, name, value):
+        self.connection().execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, pickle.dumps(value)))
+
+    # Returns: a value stored with publish(), None if there is none
+    def setting(self, name):
+        row = self.connection().execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    # Returns: the seconds a lease lasts
+    def lease_duration(self):
+        lease_seconds = self.setting("lease_seconds")
+        return DEFAULT_LEASE_SECONDS if lease_seconds is None else lease_seconds
+
+    # Returns: the id of the job queued for the task
+    def submit(self, task):
+        return self.connection().execute("INSERT INTO jobs (task) VALUES (?)", (pickle.dumps(task),)).lastrowid
+
+    # Returns jobs whose lease ran out to the queue, or marks them failed once they have been leased max_attempts times.
+    # Runs inside the caller's transaction.
+    def expire_leases(self, connection, now):
+
+        connection.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired ' || attempts || ' times' "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+        connection.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL "
+            "WHERE status = 'leased' AND lease_expires < ?", (now,))
+
+    # Leases the oldest queued jobs to a worker.
+    # Returns: list of (job id, task), empty if no job is queued.
+    def lease(self, worker, count=1):
+
+        connection = self.connection()
+        now = time.time()
+        lease_seconds = self.lease_duration()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.expire_leases(connection, now)
+            rows = connection.execute("SELECT id, task FROM jobs WHERE status = 'queued' ORDER BY id LIMIT ?", (count,)).fetchall()
+            connection.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker, now + lease_seconds, job_id) for job_id, _ in rows])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return [(job_id, pickle.loads(task)) for job_id, task in rows]
+
+    # Extends a worker's leases of its jobs, while it is still checking them.
+    # Returns: the number of leases renewed, fewer than the jobs given if a lease already ran out.
+    def renew(self, worker, job_ids):
+
+        lease_expires = time.time() + self.lease_duration()
+        return self.connection().executemany(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            [(lease_expires, job_id, worker) for job_id in job_ids]).rowcount
+
+    # Stores the result of a job. Checks are deterministic, so a worker whose lease ran out can still complete a job
+    # that has not been completed by another worker since.
+    # Returns: True if the result was stored.
+    def complete(self, worker, job_id, result):
+
+        return self.connection().execute(
+            "UPDATE jobs SET status = 'done', worker = ?, result = ? WHERE id = ? AND status IN ('queued', 'leased')",
+            (worker, pickle.dumps(result), job_id)).rowcount == 1
+
+    # Returns a job a worker could not check to the queue, or marks it failed once it has been leased max_attempts times
+    def release(self, worker, job_id, error):
+
+        self.connection().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, worker = NULL, lease_expires = NULL, error = ? "
+            "WHERE id = ? AND worker = ? AND status = 'leased'", (self.max_attempts, error, job_id, worker))
+
+    # Takes the jobs that finished since the last call, also expiring the leases of dead workers when none are left to do it.
+    # Returns: list of (job id, True and the result, or False and the error).
+    def collect(self, limit=1000):
+
+        connection = self.connection()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.expire_leases(connection, time.time())
+            rows = connection.execute(
+                "SELECT id, status, result, error FROM jobs WHERE status IN ('done', 'failed') ORDER BY id LIMIT ?", (limit,)).fetchall()
+            connection.executemany("UPDATE jobs SET status = 'collected', result = NULL WHERE id = ?", [(row[0],) for row in rows])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return [(job_id, status == "done", pickle.loads(result) if status == "done" else error) for job_id, status, result, error in rows]
+
+    # Removes jobs that no worker has leased yet.
+    # Returns: the ids of the jobs removed.
+    def cancel(self, job_ids):
+
+        connection = self.connection()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            cancelled = [job_id for job_id in job_ids
+                         if connection.execute("DELETE FROM jobs WHERE id = ? AND status = 'queued'", (job_id,)).rowcount == 1]
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return cancelled
+
+    # Removes every job, e.g. those left by a coordinator that stopped, whose results nothing is waiting for
+    def clear(self):
+        self.connection().execute("DELETE FROM jobs")
+
+    # Returns: dictionary of job status -> number of jobs
+    def counts(self):
+        return dict(self.connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+# Serves a work queue over TCP, to workers on other machines
+class WorkQueueManager(BaseManager):
+    pass
+
+
+# Queue of this process served by serve_work_queue()
+served_queue = None
+
+
+def get_served_queue():
+    return served_queue
+
+
+WorkQueueManager.register("work_queue", callable=get_served_queue)
+
+
+# Returns: (host, port) of an address given as "host:port"
+def parse_address(address):
+
+    host, _, port = address.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+# Returns: the authentication key of the queue service, from the key given or the HYDRO_QUEUE_KEY environment variable
+def queue_authkey(authkey=None):
+
+    authkey = authkey or os.environ.get(AUTHKEY_VARIABLE)
+    if not authkey:
+        raise ValueError(f"Serving or connecting to a work queue over TCP needs a key, given with --queue_key or {AUTHKEY_VARIABLE}.")
+    return authkey.encode()
+
+
+# Serves a work queue at "host:port" from a background thread of this process, for as long as the process runs
+def serve_work_queue(queue, address, authkey=None):
+
+    global served_queue
+
+    served_queue = queue
+    server = WorkQueueManager(address=parse_address(address), authkey=queue_authkey(authkey)).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving work queue '{queue.path}' at {address}.")
+
+
+# Returns: a proxy of the work queue served at "host:port", with the same methods as WorkQueue
+def connect_work_queue(address, authkey=None):
+
+    manager = WorkQueueManager(address=parse_address(address), authkey=queue_authkey(authkey))
+    manager.connect()
+    return manager.work_queue()
+
+
+# Runs the jobs handed to it on the workers of a work queue, with the same submit() and shutdown() as the process pool
+# SpinExecutor otherwise uses. A thread collects the results and completes the futures of their jobs.
+# If results can no longer be collected, every outstanding future fails with the error and the pool takes no more jobs.
+class WorkQueuePool:
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.closing = threading.Event()
+        # Error that stopped the collector, None while it runs
+        self.broken = None
+
+        self.collector = threading.Thread(target=self.collect_results, daemon=True)
+        self.collector.start()
+
+    # Queues a task for the workers, which check it with spin_executor.run_task.
+    # The job's future is registered in the same step as it is queued, so its result cannot be collected before there is a future for it.
+    # Returns: the future of its result.
+    def submit(self, fn, task):
+
+        future = Future()
+        with self.lock:
+            if self.broken is not None:
+                raise RuntimeError(f"Results can no longer be collected from the work queue: {self.broken!r}")
+            self.futures[self.queue.submit(task)] = future
+        return future
+
+    # Completes the futures of finished jobs until the pool is shut down and every job has a result.
+    # A locked or busy database is retried, any other error fails every outstanding future.
+    def collect_results(self):
+
+        retries = 0
+        while True:
+            with self.lock:
+                if self.closing.is_set() and not self.futures:
+                    return
+
+            try:
+                finished = self.queue.collect()
+                retries = 0
+            except sqlite3.OperationalError as e:
+                retries += 1
+                if retries > COLLECT_RETRIES:
+                    self.fail_pending(e)
+                    return
+                print(f"Could not collect results from the work queue ({e}), retrying.")
+                time.sleep(POLL_SECONDS * 2 ** retries)
+                continue
+            except Exception as e:
+                self.fail_pending(e)
+                return
+
+            for job_id, completed, value in finished:
+                with self.lock:
+                    future = self.futures.pop(job_id, None)
+                if future is None or future.done():
+                    continue
+
+                if completed:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(f"Job {job_id} failed on the work queue: {value}"))
+
+            if not finished:
+                time.sleep(POLL_SECONDS)
+
+    # Fails the future of every job without a result, after the collector stopped on an error
+    def fail_pending(self, error):
+
+        print(f"Error: Stopped collecting results from the work queue: {error!r}")
+        with self.lock:
+            self.broken = error
+            futures = list(self.futures.values())
+            self.futures = {}
+
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Results can no longer be collected from the work queue: {error!r}"))
+
+    # Stops collecting results once every job has one, cancelling the jobs no worker has leased if cancel_futures is set
+    def shutdown(self, wait=True, cancel_futures=False):
+
+        if cancel_futures:
+            with self.lock:
+                job_ids = list(self.futures)
+            for job_id in self.queue.cancel(job_ids):
+                with self.lock:
+                    future = self.futures.pop(job_id, None)
+                if future is not None:
+                    future.cancel()
+
+        self.closing.set()
+        if wait:
+            self.collector.join()
+
+
+# Renews a worker's lease of a job three times per lease while the job runs
+class LeaseRenewal:
+
+    def __init__(self, queue, worker, job_id, lease_seconds):
+        self.queue = queue
+        self.worker = worker
+        self.job_id = job_id
+        self.interval = lease_seconds / 3
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.renew, daemon=True)
+
+    def renew(self):
+        while not self.stopped.wait(self.interval):
+            if self.queue.renew(self.worker, [self.job_id]) == 0:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+# Returns: the work queue at a path, or the proxy of the queue served at an address
+def open_work_queue(path=None, address=None, authkey=None):
+
+    if address:
+        return connect_work_queue(address, authkey)
+    return WorkQueue(path)
+
+
+# Checks jobs from a work queue until stopped, or until the coordinator serving it stops, with the settings the coordinator published.
+# Resources the coordinator uses, e.g. its verdict cache, are only opened if they are at the same path on this machine.
+def run_worker(path=None, address=None, authkey=None, workspace_root=None):
+
+    from spin_controller import default_workspace_root
+    from spin_executor import initialise_worker, run_task
+
+    queue = open_work_queue(path, address, authkey)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    # The coordinator publishes its settings when it starts, workers may be started before it
+    while queue.setting("worker_settings") is None:
+        time.sleep(POLL_SECONDS)
+
+    settings = queue.setting("worker_settings")
+    resources = {name: value if not isinstance(value, str) or os.path.exists(value) else None for name, value in queue.setting("worker_resources").items()}
+    initialise_worker(settings, resources, workspace_root or default_workspace_root())
+    lease_seconds = queue.lease_duration()
+
+    print(f"Worker {worker} checking jobs from {address or path}.")
+
+    try:
+        while True:
+            leased = queue.lease(worker)
+            if not leased:
+                time.sleep(POLL_SECONDS)
+                continue
+
+            for job_id, task in leased:
+                try:
+                    with LeaseRenewal(queue, worker, job_id, lease_seconds):
+                        result = run_task(task)
+                except Exception as e:
+                    print(f"Job {job_id} failed on {worker}: {e!r}")
+                    queue.release(worker, job_id, repr(e))
+                    continue
+
+                queue.complete(worker, job_id, result)
+
+    except (EOFError, ConnectionError):
+        print(f"Work queue at {address} closed, worker {worker} stopping.")
+
+    finally:
+        # The worker's models and pan binaries are not kept, and on tmpfs they would hold memory until reboot
+        import spin_executor
+        shutil.rmtree(spin_executor.worker_workspace, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Work queue worker.")
+    parser.add_argument("--queue", dest="queue", type=str, default=None, help="SQLite work queue to take jobs from, on this machine.")
+    parser.add_argument("--connect", dest="connect", type=str, default=None, help="host:port of a work queue served by a coordinator with --serve_queue.")
+    parser.add_argument("--queue_key", dest="queue_key", type=str, default=None, help=f"Key of the served work queue, read from {AUTHKEY_VARIABLE} by default.")
+    parser.add_argument("--workers", dest="workers", type=int, default=os.cpu_count(), help="Number of worker processes on this machine, defaults to the number of cores.")
+    parser.add_argument("--workspace_root", dest="workspace_root", type=str, default=None, help="Directory for the worker workspaces, on tmpfs (/dev/shm) by default when available.")
+    args = parser.parse_args()
+
+    if not args.queue and not args.connect:
+        parser.error("one of --queue or --connect is required")
+
+    queue_path = os.path.abspath(args.queue) if args.queue else None
+
+    # Workers run from this folder, where the templates are
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(queue_path, args.connect, args.queue_key, args.workspace_root))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()